@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""Statically audit composed trees, and installer ISOs and qcow2 images at the media level."""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from dataclasses import asdict
+from pathlib import Path
+from typing import Iterable
+
+if __package__ in (None, ""):  # pragma: no cover - direct script execution
+    sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from evergreen_os_image.audit import audit_artifacts
+
+RESULT_NAME = "audit.json"
+
+
+def audit_images(artifacts: Iterable[Path], output: Path) -> Path:
+    """Audit every artifact and write the findings to ``output``."""
+
+    reports = audit_artifacts(artifacts)
+    output.mkdir(parents=True, exist_ok=True)
+    result_path = output / RESULT_NAME
+    results = {
+        "passed": all(report.passed for report in reports.values()),
+        "artifacts": {
+            name: {
+                "kind": report.kind,
+                "passed": report.passed,
+                "findings": [asdict(finding) for finding in report.findings],
+            }
+            for name, report in reports.items()
+        },
+    }
+    result_path.write_text(json.dumps(results, indent=2))
+    return result_path
+
+
+def parse_args(argv: Iterable[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("artifacts", nargs="+", type=Path, help="tree directory, ISO or qcow2 image")
+    parser.add_argument("--output", required=True, type=Path)
+    return parser.parse_args(argv)
+
+
+def main(argv: Iterable[str] | None = None) -> int:
+    args = parse_args(argv)
+    result_path = audit_images(args.artifacts, args.output)
+    results = json.loads(result_path.read_text())
+    for name, report in results["artifacts"].items():
+        for finding in report["findings"]:
+            if not finding["passed"]:
+                print(f"{name}: {finding['check']}: {finding['details']}", file=sys.stderr)
+    return 0 if results["passed"] else 1
+
+
+if __name__ == "__main__":  # pragma: no cover
+    raise SystemExit(main())
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""Compile EvergreenOS firewall policy into an atomic ruleset batch file."""
+
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+from typing import Iterable
+
+if __package__ in (None, ""):  # pragma: no cover - direct script execution
+    sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from evergreen_os_image.configuration import SecurityPolicies
+from evergreen_os_image.firewall import FirewallRuleset
+
+OUTPUT_NAMES = {"iptables": "evergreen-firewall.rules", "nftables": "evergreen-firewall.nft"}
+IP6TABLES_NAME = "evergreen-firewall6.rules"
+
+
+def compile_firewall(policies: Path, output: Path, fmt: str = "nftables", strict: bool = False) -> Path:
+    """Write the compiled ruleset for ``policies`` into ``output``.
+
+    Diagnostics for duplicate or shadowed rules are printed to stderr; with
+    ``strict`` they abort the build instead.  The ``iptables`` format also
+    writes the ``ip6tables-restore`` batch next to the returned IPv4 one.
+    """
+
+    if not policies.is_file():
+        raise FileNotFoundError(f"Security policies not found: {policies}")
+    if fmt not in OUTPUT_NAMES:
+        raise ValueError(f"Unknown firewall output format: {fmt}")
+
+    ruleset = FirewallRuleset.compile(SecurityPolicies.load(policies))
+    for diagnostic in ruleset.diagnostics:
+        print(f"firewall: {diagnostic.kind}: {diagnostic.message}", file=sys.stderr)
+    if strict and ruleset.diagnostics:
+        raise ValueError(f"{len(ruleset.diagnostics)} firewall rule(s) can never match")
+
+    output.mkdir(parents=True, exist_ok=True)
+    rules_path = output / OUTPUT_NAMES[fmt]
+    rendered = ruleset.to_nftables() if fmt == "nftables" else ruleset.to_iptables_restore()
+    rules_path.write_text(rendered)
+    if fmt == "iptables":
+        (output / IP6TABLES_NAME).write_text(ruleset.to_iptables_restore(family=6))
+    return rules_path
+
+
+def parse_args(argv: Iterable[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--policies", required=True, type=Path)
+    parser.add_argument("--output", required=True, type=Path)
+    parser.add_argument("--format", choices=sorted(OUTPUT_NAMES), default="nftables")
+    parser.add_argument("--strict", action="store_true")
+    return parser.parse_args(argv)
+
+
+def main(argv: Iterable[str] | None = None) -> int:
+    args = parse_args(argv)
+    compile_firewall(args.policies, args.output, args.format, args.strict)
+    return 0
+
+
+if __name__ == "__main__":  # pragma: no cover
+    raise SystemExit(main())
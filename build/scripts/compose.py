@@ -6,8 +6,25 @@ from __future__ import annotations
 import argparse
 import hashlib
 import json
+import sys
+from datetime import timedelta
 from pathlib import Path
-from typing import Iterable
+from typing import Dict, Iterable
+
+if __package__ in (None, ""):  # pragma: no cover - direct script execution
+    sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from evergreen_os_image.configuration import ComposeManifest
+from evergreen_os_image.enrollment import (
+    DEFAULT_PRESEED_LIFETIME,
+    PRESEED_PAYLOAD_PATH,
+    EnrollmentPayload,
+    preseed_files,
+)
+from evergreen_os_image.profiles import ComposeProfiles
+
+from build.scripts.prefetch_rpms import cached_packages
+from build.scripts.reproducible import build_time, build_timestamp, dump_json, normalize_tree, write_artifact
 
 
 def _checksum_manifest(manifest: Path) -> str:
@@ -15,8 +32,38 @@ def _checksum_manifest(manifest: Path) -> str:
     return hashlib.sha256(content).hexdigest()
 
 
-def compose(manifest: Path, output: Path) -> Path:
-    """Create a placeholder rpm-ostree commit description."""
+PRESEED_TREE = "rootfs"
+
+
+def compose(
+    manifest: Path,
+    output: Path,
+    profile: str | None = None,
+    profiles: Path | None = None,
+    preseed: Path | None = None,
+    preseed_key: Path | None = None,
+    preseed_lifetime: timedelta = DEFAULT_PRESEED_LIFETIME,
+    rpm_cache: Path | None = None,
+    build_id: str | None = None,
+) -> Path:
+    """Create a placeholder rpm-ostree commit description.
+
+    With ``profile`` the manifest is derived through the named compose profile
+    and the resulting ref, package sets, units, kernel arguments and Flatpak
+    refs are recorded.  With ``preseed`` the enrollment payload is signed with
+    the key in ``preseed_key``, bound to this image's id and set to expire
+    ``preseed_lifetime`` after the build, and the files that skip the
+    interactive greeter are written under ``rootfs/`` for inclusion in the
+    commit.  With ``rpm_cache`` every composed package must be in the
+    ``prefetch_rpms.py`` record for this manifest and profile; the cache
+    becomes the compose ``cachedir`` and the verified RPM of each prefetched
+    package, dependencies included, is recorded.
+
+    Every compose records a ``build_id``: ``build_id`` when given, otherwise a
+    digest of the composed content and the build time.  The preseed image id
+    is derived from it, so a payload signed for one build is not accepted by a
+    rebuild of the same manifest.
+    """
 
     if not manifest.is_file():
         raise FileNotFoundError(f"Manifest not found: {manifest}")
@@ -28,12 +75,66 @@ def compose(manifest: Path, output: Path) -> Path:
         "checksum": _checksum_manifest(manifest),
         "packages": _extract_packages(manifest.read_text()),
     }
+    if profile is not None:
+        data.update(_profile_details(manifest, profile, profiles))
+    if rpm_cache is not None:
+        rpms = cached_packages(rpm_cache, data["packages"], data["checksum"], profile)
+        data["rpm_cache"] = {"cachedir": str(rpm_cache), "rpms": {name: str(path) for name, path in rpms.items()}}
+    data["build_id"] = build_id or _build_id(data)
+    if preseed is not None:
+        image_id = f"evergreenos-{profile or 'base'}-{data['build_id']}"
+        data["preseed"] = _write_preseed(output / PRESEED_TREE, preseed, preseed_key, image_id, preseed_lifetime)
 
     artifact_path = output / "compose.json"
-    artifact_path.write_text(json.dumps(data, indent=2))
+    write_artifact(artifact_path, dump_json(data))
+    normalize_tree(output)
     return artifact_path
 
 
+def _build_id(data: Dict[str, object]) -> str:
+    digest = hashlib.sha256(json.dumps(data, sort_keys=True).encode())
+    digest.update(build_timestamp().encode())
+    return digest.hexdigest()[:16]
+
+
+def _profile_details(manifest: Path, profile: str, profiles: Path | None) -> Dict[str, object]:
+    derived = ComposeProfiles.load(profiles).get(profile).apply(ComposeManifest.load(manifest))
+    return {
+        "profile": profile,
+        "ref": derived.ref,
+        "packages": list(derived.packages_install),
+        "packages_remove": list(derived.packages_remove),
+        "systemd": {"enable": list(derived.systemd_enable), "mask": list(derived.systemd_mask)},
+        "default_kargs": list(derived.default_kargs),
+        "flatpak_refs": {remote.name: list(remote.default_refs) for remote in derived.flatpak_remotes},
+    }
+
+
+def _write_preseed(
+    root: Path, payload_path: Path, key_path: Path | None, image_id: str, lifetime: timedelta
+) -> Dict[str, object]:
+    if not payload_path.is_file():
+        raise FileNotFoundError(f"Enrollment payload not found: {payload_path}")
+    if key_path is None:
+        raise ValueError("A preseeded enrollment payload needs --preseed-key to sign it")
+    payload = EnrollmentPayload.load(payload_path)
+    expires = build_time() + lifetime
+
+    files = preseed_files(payload, key_path.read_bytes().strip(), image_id, expires)
+    for relative, contents in sorted(files.items()):
+        target = root / relative
+        target.parent.mkdir(parents=True, exist_ok=True)
+        write_artifact(target, contents)
+    return {
+        "backend_url": payload.backend_url,
+        "tenant": payload.tenant,
+        "image_id": image_id,
+        "expires": json.loads(files[PRESEED_PAYLOAD_PATH])["expires"],
+        "tree": str(root),
+        "files": sorted(files),
+    }
+
+
 def _extract_packages(manifest_text: str) -> list[str]:
     try:
         data = json.loads(manifest_text)
@@ -55,12 +156,36 @@ def parse_args(argv: Iterable[str] | None = None) -> argparse.Namespace:
     parser = argparse.ArgumentParser(description=__doc__)
     parser.add_argument("--manifest", required=True, type=Path)
     parser.add_argument("--output", required=True, type=Path)
+    parser.add_argument("--profile", default=None)
+    parser.add_argument("--profiles", type=Path, default=None)
+    parser.add_argument("--preseed", type=Path, default=None, help="enrollment payload to embed")
+    parser.add_argument("--preseed-key", type=Path, default=None, help="file holding the HMAC signing key")
+    parser.add_argument("--rpm-cache", type=Path, default=None, help="prefetch_rpms.py cache to install RPMs from")
+    parser.add_argument(
+        "--build-id", default=None, help="id of this build; defaults to a digest of the composed content and build time"
+    )
+    parser.add_argument(
+        "--preseed-lifetime-days",
+        type=int,
+        default=DEFAULT_PRESEED_LIFETIME.days,
+        help="days after the build until the signed enrollment payload expires",
+    )
     return parser.parse_args(argv)
 
 
 def main(argv: Iterable[str] | None = None) -> int:
     args = parse_args(argv)
-    compose(args.manifest, args.output)
+    compose(
+        args.manifest,
+        args.output,
+        args.profile,
+        args.profiles,
+        args.preseed,
+        args.preseed_key,
+        timedelta(days=args.preseed_lifetime_days),
+        args.rpm_cache,
+        args.build_id,
+    )
     return 0
 
 
@@ -4,10 +4,15 @@
 from __future__ import annotations
 
 import argparse
-from datetime import datetime
+import sys
 from pathlib import Path
 from typing import Iterable
 
+if __package__ in (None, ""):  # pragma: no cover - direct script execution
+    sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from build.scripts.reproducible import build_timestamp, write_artifact
+
 
 ISO_NAME = "EvergreenOS.iso"
 
@@ -19,14 +24,13 @@ def create_iso(kickstart: Path, output: Path) -> Path:
     output.mkdir(parents=True, exist_ok=True)
     iso_path = output / ISO_NAME
 
-    timestamp = datetime.utcnow().isoformat() + "Z"
+    timestamp = build_timestamp()
     contents = (
         "EvergreenOS ISO placeholder\n"
         f"Kickstart: {kickstart}\n"
         f"Generated: {timestamp}\n"
     )
-    iso_path.write_text(contents)
-    return iso_path
+    return write_artifact(iso_path, contents)
 
 
 def parse_args(argv: Iterable[str] | None = None) -> argparse.Namespace:
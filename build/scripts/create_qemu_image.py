@@ -4,10 +4,15 @@
 from __future__ import annotations
 
 import argparse
-from datetime import datetime
+import sys
 from pathlib import Path
 from typing import Iterable
 
+if __package__ in (None, ""):  # pragma: no cover - direct script execution
+    sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from build.scripts.reproducible import build_timestamp, write_artifact
+
 
 QCOW_NAME = "evergreenos.qcow2"
 
@@ -19,14 +24,13 @@ def create_qemu_image(ostree: Path, output: Path) -> Path:
     output.mkdir(parents=True, exist_ok=True)
     image_path = output / QCOW_NAME
 
-    timestamp = datetime.utcnow().isoformat() + "Z"
+    timestamp = build_timestamp()
     contents = (
         "EvergreenOS QEMU image placeholder\n"
         f"OSTree source: {ostree}\n"
         f"Generated: {timestamp}\n"
     )
-    image_path.write_text(contents)
-    return image_path
+    return write_artifact(image_path, contents)
 
 
 def parse_args(argv: Iterable[str] | None = None) -> argparse.Namespace:
@@ -0,0 +1,502 @@
+#!/usr/bin/env python3
+"""Load test the enrollment flow against a local stand-in backend.
+
+Devices either go through the interactive path (a ``--greeter-delay`` wait
+standing in for the user at the greeter, then the real
+``write_agent_config.sh`` and its ``jq`` calls) or, with ``--preseeded``, start
+from an image that already carries a signed enrollment payload and a rendered
+``agent.yaml``.  In that case they enroll straight away and the backend checks
+the payload signature.  ``--compare-preseeded`` runs both paths and reports the
+measured agent-config time the preseeded path skips, separately from the
+greeter delay, which is an input rather than a measurement.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterable, List, Mapping, Sequence, Tuple
+from urllib.parse import urlsplit
+
+if __package__ in (None, ""):  # pragma: no cover - direct script execution
+    sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from evergreen_os_image.configuration import AgentDefaults, SecurityPolicies
+from evergreen_os_image.enrollment import (
+    DEFAULT_PRESEED_LIFETIME,
+    EnrollmentPayload,
+    render_agent_config,
+    sign_payload,
+    verify_payload,
+)
+from evergreen_os_image.prd import EvergreenOSPRD
+
+RESULT_NAME = "enrollment-load.json"
+WRITE_AGENT_CONFIG = Path(__file__).resolve().with_name("write_agent_config.sh")
+MEASURED_METRICS = ("enrollment_completion_seconds", "policy_application_seconds")
+HISTOGRAM_EDGES = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+# Signing key and image id shared by the stand-in backend and simulated preseeded images.
+PRESEED_KEY = b"evergreen-load-test"
+PRESEED_IMAGE_ID = "evergreenos-load-test"
+
+Message = Tuple[str, Dict[str, str], bytes]
+
+
+async def _read_message(reader: asyncio.StreamReader) -> Message | None:
+    start_line = await reader.readline()
+    if not start_line:
+        return None
+    headers: Dict[str, str] = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get("content-length", "0"))
+    body = await reader.readexactly(length) if length else b""
+    return start_line.decode("latin-1").strip(), headers, body
+
+
+def _encode_message(start_line: str, payload: object | None, headers: Mapping[str, str] | None = None) -> bytes:
+    body = json.dumps(payload).encode() if payload is not None else b""
+    lines = [start_line, f"Content-Length: {len(body)}"]
+    if payload is not None:
+        lines.append("Content-Type: application/json")
+    lines.extend(f"{name}: {value}" for name, value in (headers or {}).items())
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body
+
+
+class EnrollmentBackend:
+    """Minimal HTTP/1.1 stand-in for the enrollment and policy endpoints.
+
+    ``enroll_delay`` and ``policy_delay`` model server-side processing time and
+    ``workers`` caps how many requests are processed at once, so the stand-in
+    can approximate a backend of a given capacity.
+    """
+
+    def __init__(
+        self,
+        tenant: str,
+        policy: Mapping[str, object],
+        enroll_delay: float = 0.0,
+        policy_delay: float = 0.0,
+        workers: int | None = None,
+        preseed_key: bytes | None = None,
+        preseed_image_id: str = PRESEED_IMAGE_ID,
+    ) -> None:
+        self.tenant = tenant
+        self.policy = dict(policy)
+        self.enroll_delay = enroll_delay
+        self.policy_delay = policy_delay
+        self.workers = workers
+        self.preseed_key = preseed_key
+        self.preseed_image_id = preseed_image_id
+        self.tokens: Dict[str, str] = {}
+        self.applied: set[str] = set()
+        self._server: asyncio.base_events.Server | None = None
+        self._limiter: asyncio.Semaphore | None = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Start serving and return the backend base URL."""
+
+        self._limiter = asyncio.Semaphore(self.workers) if self.workers else None
+        self._server = await asyncio.start_server(self._serve, host, port, backlog=4096)
+        bound_host, bound_port = self._server.sockets[0].getsockname()[:2]
+        return f"http://{bound_host}:{bound_port}"
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                message = await _read_message(reader)
+                if message is None:
+                    break
+                if self._limiter is None:
+                    status, payload = await self._dispatch(*message)
+                else:
+                    async with self._limiter:
+                        status, payload = await self._dispatch(*message)
+                writer.write(_encode_message(f"HTTP/1.1 {status}", payload))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, start_line: str, headers: Mapping[str, str], body: bytes) -> Tuple[str, object]:
+        method, path, _ = start_line.split(" ", 2)
+        parts = path.strip("/").split("/")
+
+        if method == "POST" and parts == ["v1", "enroll"]:
+            try:
+                request = json.loads(body or b"{}")
+            except ValueError:
+                return "400 Bad Request", {"error": "malformed JSON body"}
+            if not isinstance(request, dict):
+                return "400 Bad Request", {"error": "request body must be a JSON object"}
+            if request.get("tenant") != self.tenant:
+                return "403 Forbidden", {"error": "unknown tenant"}
+            if "preseed" in request:
+                try:
+                    verify_payload(json.dumps(request["preseed"]), self.preseed_key or b"", self.preseed_image_id)
+                except ValueError:
+                    return "403 Forbidden", {"error": "preseed signature rejected"}
+            await asyncio.sleep(self.enroll_delay)
+            device_id = str(request.get("device_id", ""))
+            token = f"token-{device_id}"
+            self.tokens[device_id] = token
+            return "200 OK", {"token": token, "policy": f"/v1/devices/{device_id}/policy"}
+
+        if len(parts) >= 4 and parts[:2] == ["v1", "devices"] and parts[3] == "policy":
+            device_id = parts[2]
+            if headers.get("authorization") != f"Bearer {self.tokens.get(device_id)}":
+                return "401 Unauthorized", {"error": "device not enrolled"}
+            if method == "GET" and len(parts) == 4:
+                await asyncio.sleep(self.policy_delay)
+                return "200 OK", self.policy
+            if method == "POST" and parts[4:] == ["ack"]:
+                self.applied.add(device_id)
+                return "200 OK", {"status": "applied"}
+
+        return "404 Not Found", {"error": "no such endpoint"}
+
+
+class _DeviceConnection:
+    """Keep-alive HTTP client used by a single simulated device."""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, host: str) -> None:
+        self.reader = reader
+        self.writer = writer
+        self.host = host
+
+    @classmethod
+    async def open(cls, base_url: str) -> "_DeviceConnection":
+        parts = urlsplit(base_url)
+        reader, writer = await asyncio.open_connection(parts.hostname, parts.port)
+        return cls(reader, writer, parts.netloc)
+
+    async def request(
+        self, method: str, path: str, payload: object | None = None, token: str | None = None
+    ) -> Tuple[int, Dict[str, object]]:
+        headers = {"Host": self.host}
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        self.writer.write(_encode_message(f"{method} {path} HTTP/1.1", payload, headers))
+        await self.writer.drain()
+        message = await _read_message(self.reader)
+        if message is None:
+            raise ConnectionError(f"Backend closed the connection during {method} {path}")
+        start_line, _, body = message
+        return int(start_line.split(" ", 2)[1]), json.loads(body or b"{}")
+
+    async def close(self) -> None:
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except ConnectionError:
+            pass
+
+
+async def _write_agent_config(payload: EnrollmentPayload, root: Path) -> float:
+    """Run ``write_agent_config.sh`` for ``payload`` under ``root`` and time it."""
+
+    state_dir = root / "state"
+    config_dir = root / "agent"
+    state_dir.mkdir(parents=True)
+    (state_dir / "enrollment.json").write_text(payload.to_json())
+    env = {**os.environ, "EVERGREEN_STATE_DIR": str(state_dir), "EVERGREEN_AGENT_CONFIG_DIR": str(config_dir)}
+
+    started = time.perf_counter()
+    process = await asyncio.create_subprocess_exec(
+        "bash", str(WRITE_AGENT_CONFIG), env=env, stderr=asyncio.subprocess.PIPE
+    )
+    _, stderr = await process.communicate()
+    elapsed = time.perf_counter() - started
+
+    if process.returncode != 0:
+        raise RuntimeError(f"write_agent_config.sh exited with {process.returncode}: {stderr.decode().strip()}")
+    if (config_dir / "agent.yaml").read_text() != render_agent_config(payload):
+        raise RuntimeError("write_agent_config.sh rendered an unexpected agent.yaml")
+    if not (state_dir / "enrollment.complete").exists():
+        raise RuntimeError("write_agent_config.sh did not mark enrollment complete")
+    return elapsed
+
+
+async def _simulate_device(
+    device_id: str,
+    base_url: str,
+    tenant: str,
+    greeter_delay: float,
+    limiter: asyncio.Semaphore,
+    preseed: str | None = None,
+    scratch: Path | None = None,
+) -> Tuple[float, float, float | None]:
+    """Run greeter -> agent config -> enrollment -> policy for one device.
+
+    The interactive path waits ``greeter_delay`` and then runs
+    ``write_agent_config.sh`` in a per-device directory under ``scratch``;
+    its measured run time is returned as the third element.  ``preseed`` is
+    the signed payload baked into a preseeded image; such a device skips the
+    greeter and the script and enrolls with it.  The clock starts before
+    ``limiter`` is acquired, so time spent queued for a slot counts towards
+    enrollment.
+    """
+
+    started = time.perf_counter()
+    async with limiter:
+        request: Dict[str, object] = {"device_id": device_id, "tenant": tenant}
+        agent_config: float | None = None
+        if preseed is None:
+            if scratch is None:
+                raise ValueError("The interactive path needs a scratch directory for write_agent_config.sh")
+            payload = EnrollmentPayload(backend_url=base_url, tenant=tenant)
+            await asyncio.sleep(greeter_delay)
+            agent_config = await _write_agent_config(payload, scratch / device_id)
+        else:
+            request["preseed"] = json.loads(preseed)
+
+        connection = await _DeviceConnection.open(base_url)
+        try:
+            status, enrollment = await connection.request("POST", "/v1/enroll", request)
+            if status != 200:
+                raise RuntimeError(f"{device_id}: enrollment failed with HTTP {status}")
+            enrolled = time.perf_counter()
+
+            token = str(enrollment["token"])
+            policy_path = str(enrollment["policy"])
+            status, _ = await connection.request("GET", policy_path, token=token)
+            if status != 200:
+                raise RuntimeError(f"{device_id}: policy fetch failed with HTTP {status}")
+            status, _ = await connection.request("POST", f"{policy_path}/ack", {}, token=token)
+            if status != 200:
+                raise RuntimeError(f"{device_id}: policy acknowledgement failed with HTTP {status}")
+            applied = time.perf_counter()
+        finally:
+            await connection.close()
+
+    return enrolled - started, applied - enrolled, agent_config
+
+
+def _percentile(samples: Sequence[float], quantile: float) -> float | None:
+    if not samples:
+        return None
+    index = min(len(samples) - 1, max(0, math.ceil(quantile * len(samples)) - 1))
+    return samples[index]
+
+
+def summarise_latencies(samples: Iterable[float]) -> Dict[str, object]:
+    """Return percentiles and a cumulative-bucket histogram for latencies."""
+
+    ordered = sorted(samples)
+    histogram: List[Dict[str, object]] = []
+    position = 0
+    for edge in HISTOGRAM_EDGES:
+        while position < len(ordered) and ordered[position] <= edge:
+            position += 1
+        histogram.append({"le": edge, "count": position})
+    histogram.append({"le": "+Inf", "count": len(ordered)})
+
+    return {
+        "count": len(ordered),
+        "p50": _percentile(ordered, 0.50),
+        "p95": _percentile(ordered, 0.95),
+        "p99": _percentile(ordered, 0.99),
+        "max": ordered[-1] if ordered else None,
+        "histogram": histogram,
+    }
+
+
+async def run_load(
+    devices: int,
+    concurrency: int,
+    tenant: str | None = None,
+    greeter_delay: float = 0.0,
+    enroll_delay: float = 0.0,
+    policy_delay: float = 0.0,
+    backend_workers: int | None = None,
+    percentile: int = 95,
+    preseeded: bool = False,
+) -> Dict[str, object]:
+    """Drive ``devices`` simulated devices through a fresh stand-in backend.
+
+    The interactive path needs ``bash`` and ``jq`` on ``PATH`` to run
+    ``write_agent_config.sh``; a ``RuntimeError`` is raised without them.
+    """
+
+    if not preseeded:
+        missing = [tool for tool in ("bash", "jq") if shutil.which(tool) is None]
+        if missing:
+            raise RuntimeError(f"The interactive enrollment path needs {', '.join(missing)} on PATH")
+    tenant = tenant or AgentDefaults.load().tenant
+    security = SecurityPolicies.load()
+    backend = EnrollmentBackend(
+        tenant=tenant,
+        policy={
+            "selinux": security.selinux_mode,
+            "usbguard": security.usbguard_default_policy,
+            "firewall_allowed_services": list(security.firewall_allowed_services),
+        },
+        enroll_delay=enroll_delay,
+        policy_delay=policy_delay,
+        workers=backend_workers,
+        preseed_key=PRESEED_KEY,
+    )
+    base_url = await backend.start()
+    limiter = asyncio.Semaphore(concurrency)
+    preseed = None
+    if preseeded:
+        expires = datetime.now(timezone.utc) + DEFAULT_PRESEED_LIFETIME
+        preseed = sign_payload(EnrollmentPayload(base_url, tenant), PRESEED_KEY, PRESEED_IMAGE_ID, expires)
+
+    started = time.perf_counter()
+    try:
+        with tempfile.TemporaryDirectory(prefix="evergreen-enrollment-") as scratch:
+            outcomes = await asyncio.gather(
+                *(
+                    _simulate_device(
+                        f"device-{index:06d}", base_url, tenant, greeter_delay, limiter, preseed, Path(scratch)
+                    )
+                    for index in range(devices)
+                ),
+                return_exceptions=True,
+            )
+    finally:
+        await backend.close()
+    elapsed = time.perf_counter() - started
+
+    timings = [outcome for outcome in outcomes if not isinstance(outcome, BaseException)]
+    errors = [str(outcome) for outcome in outcomes if isinstance(outcome, BaseException)]
+    latencies = {
+        "enrollment_completion_seconds": summarise_latencies(timing[0] for timing in timings),
+        "policy_application_seconds": summarise_latencies(timing[1] for timing in timings),
+    }
+    if not preseeded:
+        latencies["agent_config_seconds"] = summarise_latencies(timing[2] for timing in timings)
+
+    observed = {metric: latencies[metric][f"p{percentile}"] for metric in MEASURED_METRICS}
+    failures = [
+        metric
+        for metric in EvergreenOSPRD.default().validate_success_metrics(observed)
+        if metric in MEASURED_METRICS
+    ]
+
+    return {
+        "devices": devices,
+        "concurrency": concurrency,
+        "mode": "preseeded" if preseeded else "interactive",
+        "greeter_delay_seconds": 0.0 if preseeded else greeter_delay,
+        "completed": len(timings),
+        "errors": errors[:20],
+        "error_count": len(errors),
+        "elapsed_seconds": elapsed,
+        "devices_per_second": len(timings) / elapsed if elapsed else None,
+        "percentile": percentile,
+        "latency": latencies,
+        "threshold_failures": failures,
+        "status": "passed" if not failures and not errors else "failed",
+    }
+
+
+def compare_preseeded(interactive: Mapping[str, object], preseeded: Mapping[str, object]) -> Dict[str, object]:
+    """Enrollment time the preseeded path saves over the interactive one.
+
+    ``agent_config_measured`` is the timed ``write_agent_config.sh`` run that
+    preseeding removes.  ``greeter_delay_input`` is the configured greeter
+    wait, echoed back as an input, and ``end_to_end`` is the difference in
+    enrollment completion, which includes that input.
+    """
+
+    latency = interactive["latency"]
+    metric = "enrollment_completion_seconds"
+    end_to_end: Dict[str, object] = {}
+    for key in ("p50", "p95", "p99"):
+        before = latency[metric][key]  # type: ignore[index]
+        after = preseeded["latency"][metric][key]  # type: ignore[index]
+        end_to_end[key] = before - after if before is not None and after is not None else None
+    return {
+        "agent_config_measured": {
+            key: latency["agent_config_seconds"][key] for key in ("p50", "p95", "p99")  # type: ignore[index]
+        },
+        "greeter_delay_input": interactive["greeter_delay_seconds"],
+        "end_to_end": end_to_end,
+    }
+
+
+def run_load_test(
+    devices: int, concurrency: int, output: Path, compare: bool = False, **options: object
+) -> Path:
+    """Run :func:`run_load` and write the results next to other CI artifacts.
+
+    With ``compare`` the load is run on the interactive and the preseeded path
+    and the preseeded results and time saved are added to the interactive ones.
+    """
+
+    output.mkdir(parents=True, exist_ok=True)
+    if compare:
+        options.pop("preseeded", None)
+        results = asyncio.run(run_load(devices, concurrency, **options))
+        preseeded = asyncio.run(run_load(devices, concurrency, preseeded=True, **options))
+        results["preseeded"] = preseeded
+        results["enrollment_time_saved_seconds"] = compare_preseeded(results, preseeded)
+        if preseeded["status"] != "passed":
+            results["status"] = "failed"
+    else:
+        results = asyncio.run(run_load(devices, concurrency, **options))
+    result_path = output / RESULT_NAME
+    result_path.write_text(json.dumps(results, indent=2))
+    return result_path
+
+
+def parse_args(argv: Iterable[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--devices", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=256)
+    parser.add_argument("--output", required=True, type=Path)
+    parser.add_argument("--tenant", default=None)
+    parser.add_argument("--greeter-delay", type=float, default=0.0)
+    parser.add_argument("--enroll-delay", type=float, default=0.0)
+    parser.add_argument("--policy-delay", type=float, default=0.0)
+    parser.add_argument("--backend-workers", type=int, default=None)
+    parser.add_argument("--percentile", type=int, choices=(50, 95, 99), default=95)
+    parser.add_argument("--preseeded", action="store_true", help="devices boot with a preseeded payload")
+    parser.add_argument("--compare-preseeded", action="store_true", help="run both paths and report time saved")
+    return parser.parse_args(argv)
+
+
+def main(argv: Iterable[str] | None = None) -> int:
+    args = parse_args(argv)
+    result_path = run_load_test(
+        args.devices,
+        args.concurrency,
+        args.output,
+        compare=args.compare_preseeded,
+        tenant=args.tenant,
+        greeter_delay=args.greeter_delay,
+        enroll_delay=args.enroll_delay,
+        policy_delay=args.policy_delay,
+        backend_workers=args.backend_workers,
+        percentile=args.percentile,
+        preseeded=args.preseeded,
+    )
+    results = json.loads(result_path.read_text())
+    return 0 if results["status"] == "passed" else 1
+
+
+if __name__ == "__main__":  # pragma: no cover
+    raise SystemExit(main())
@@ -0,0 +1,335 @@
+"""Append-only, per-channel publish history for the OSTree update repository.
+
+Each published version is stored once under ``commits/<version>/``.  Each
+channel directory holds one immutable record per publish under
+``history/NNNNNNNN.json`` and a small ``HEAD.json`` naming the current and
+previous versions together with the oldest retained sequence number::
+
+    update-repo/
+      .publish.lock
+      summary.json
+      commits/1.0.0/...
+      commits/1.1.0/...
+      stable/
+        HEAD.json
+        history/00000001.json
+        history/00000002.json
+
+Clients only fetch ``HEAD.json``; any older record is a single direct read by
+sequence number.  Writers serialise on an exclusive ``flock`` of
+``.publish.lock``, and every file is written to a temporary name and moved into
+place so readers never observe a partial document.  History records are linked
+into place exclusively and are never rewritten.  Commits and records are
+normalised under ``SOURCE_DATE_EPOCH``; ``HEAD.json`` keeps its real mtime so
+clients can poll it.
+"""
+
+from __future__ import annotations
+
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Iterable, Iterator, List, Mapping
+
+from build.scripts.reproducible import dump_json, normalize_tree, write_artifact
+
+LOCK_NAME = ".publish.lock"
+HEAD_NAME = "HEAD.json"
+HISTORY_DIR = "history"
+COMMITS_DIR = "commits"
+DEFAULT_RETAIN = 50
+
+
+@dataclass(frozen=True)
+class HistoryEntry:
+    """One publish of a version into a channel."""
+
+    sequence: int
+    version: str
+    timestamp: str
+    source: str
+    gpg_key: str | None = None
+    commit: str | None = None
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, object]) -> "HistoryEntry":
+        return cls(
+            sequence=int(data["sequence"]),  # type: ignore[arg-type]
+            version=str(data["version"]),
+            timestamp=str(data["timestamp"]),
+            source=str(data["source"]),
+            gpg_key=data.get("gpg_key"),  # type: ignore[arg-type]
+            commit=data.get("commit"),  # type: ignore[arg-type]
+        )
+
+
+@dataclass(frozen=True)
+class ChannelHead:
+    """Contents of a channel's ``HEAD.json``."""
+
+    channel: str
+    current: HistoryEntry
+    previous: HistoryEntry | None
+    oldest: int
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, object]) -> "ChannelHead":
+        previous = data.get("previous")
+        return cls(
+            channel=str(data["channel"]),
+            current=HistoryEntry.from_dict(data["current"]),  # type: ignore[arg-type]
+            previous=HistoryEntry.from_dict(previous) if previous else None,  # type: ignore[arg-type]
+            oldest=int(data["oldest"]),  # type: ignore[arg-type]
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            "channel": self.channel,
+            "current": asdict(self.current),
+            "previous": asdict(self.previous) if self.previous else None,
+            "oldest": self.oldest,
+        }
+
+
+def _record_name(sequence: int) -> str:
+    return f"{sequence:08d}.json"
+
+
+def _temporary(path: Path, contents: str, normalize: bool = False) -> Path:
+    handle, name = tempfile.mkstemp(prefix=f".{path.name}.", dir=path.parent)
+    os.fchmod(handle, 0o644)
+    os.close(handle)
+    if normalize:
+        return write_artifact(Path(name), contents)
+    Path(name).write_text(contents)
+    return Path(name)
+
+
+def atomic_write(path: Path, contents: str) -> Path:
+    """Replace ``path`` with ``contents`` via a temporary file and rename.
+
+    Used for index files that change on every publish, so the mtime is left
+    alone even under ``SOURCE_DATE_EPOCH``.
+    """
+
+    os.replace(_temporary(path, contents), path)
+    return path
+
+
+def _append_record(path: Path, contents: str) -> None:
+    """Create ``path`` atomically, failing if the record already exists."""
+
+    temporary = _temporary(path, contents, normalize=True)
+    try:
+        os.link(temporary, path)
+    finally:
+        temporary.unlink()
+
+
+@contextmanager
+def publish_lock(destination: Path) -> Iterator[None]:
+    """Hold the repository-wide exclusive publish lock."""
+
+    destination.mkdir(parents=True, exist_ok=True)
+    with open(destination / LOCK_NAME, "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def commit_path(destination: Path, version: str) -> Path:
+    """Directory holding the published tree of ``version``."""
+
+    if not version or "/" in version or version.startswith("."):
+        raise ValueError(f"Invalid version for an update repository: {version!r}")
+    return destination / COMMITS_DIR / version
+
+
+def tree_digest(root: Path) -> str:
+    """Digest of the paths, file contents and symlink targets under ``root``.
+
+    Modes and mtimes are left out, so a tree and its normalised copy agree.
+    """
+
+    digest = hashlib.sha256()
+    for directory, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        base = Path(directory)
+        for name in sorted([*dirnames, *filenames]):
+            path = base / name
+            relative = str(path.relative_to(root)).encode()
+            if path.is_symlink():
+                digest.update(b"L" + relative + b"\0" + os.readlink(path).encode() + b"\0")
+            elif path.is_dir():
+                digest.update(b"D" + relative + b"\0")
+            else:
+                digest.update(b"F" + relative + b"\0" + hashlib.sha256(path.read_bytes()).digest())
+    return digest.hexdigest()
+
+
+def store_commit(destination: Path, version: str, source: Path) -> Path:
+    """Copy ``source`` into the repository as ``version`` unless already stored.
+
+    The caller must hold :func:`publish_lock`.  The tree is copied to a
+    temporary directory, normalised and renamed into place, so a crash never
+    leaves a partial commit under the version's name.  Re-publishing a stored
+    version is only allowed with the same content; a different tree raises
+    ``ValueError`` rather than being silently dropped.
+    """
+
+    target = commit_path(destination, version)
+    if target.is_dir():
+        if tree_digest(source) != tree_digest(target):
+            raise ValueError(f"Version {version} is already published with different content")
+        return target
+    target.parent.mkdir(parents=True, exist_ok=True)
+    staging = Path(tempfile.mkdtemp(prefix=f".{version}.", dir=target.parent))
+    try:
+        staging.chmod(0o755)
+        shutil.copytree(source, staging, symlinks=True, dirs_exist_ok=True)
+        normalize_tree(staging)
+        os.rename(staging, target)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    return target
+
+
+def published_commit(destination: Path, entry: HistoryEntry) -> Path:
+    """Return the stored tree of a history entry."""
+
+    if entry.commit is None:
+        raise FileNotFoundError(f"Version {entry.version} was published without storing its commit")
+    path = destination / entry.commit
+    if not path.is_dir():
+        raise FileNotFoundError(f"Published commit of {entry.version} not found: {path}")
+    return path
+
+
+def prune_commits(destination: Path, channels: Iterable[str]) -> List[str]:
+    """Remove stored commits no retained record of ``channels`` refers to.
+
+    The caller must hold :func:`publish_lock`.  Returns the removed versions.
+    """
+
+    commits = destination / COMMITS_DIR
+    if not commits.is_dir():
+        return []
+    referenced = {entry.commit for channel in channels for entry in history(destination, channel)}
+    removed = []
+    for path in sorted(commits.iterdir()):
+        if f"{COMMITS_DIR}/{path.name}" in referenced:
+            continue
+        shutil.rmtree(path)
+        if not path.name.startswith("."):
+            removed.append(path.name)
+    return removed
+
+
+def read_head(destination: Path, channel: str) -> ChannelHead | None:
+    """Return the channel head, or ``None`` if nothing was published yet."""
+
+    try:
+        return ChannelHead.from_dict(json.loads((destination / channel / HEAD_NAME).read_text()))
+    except FileNotFoundError:
+        return None
+
+
+def read_entry(destination: Path, channel: str, sequence: int) -> HistoryEntry:
+    """Return a retained history record by sequence number."""
+
+    path = destination / channel / HISTORY_DIR / _record_name(sequence)
+    try:
+        return HistoryEntry.from_dict(json.loads(path.read_text()))
+    except FileNotFoundError as error:
+        raise FileNotFoundError(f"No retained {channel} history record {sequence}") from error
+
+
+def history(destination: Path, channel: str) -> List[HistoryEntry]:
+    """Return every retained record of ``channel``, newest first."""
+
+    head = read_head(destination, channel)
+    if head is None:
+        return []
+    return [
+        read_entry(destination, channel, sequence)
+        for sequence in range(head.current.sequence, head.oldest - 1, -1)
+    ]
+
+
+def append(
+    destination: Path,
+    channel: str,
+    version: str,
+    timestamp: str,
+    source: str,
+    gpg_key: str | None = None,
+    retain: int = DEFAULT_RETAIN,
+    commit: str | None = None,
+) -> ChannelHead:
+    """Record ``version`` as the channel's current version.
+
+    The caller must hold :func:`publish_lock`.  Re-publishing the current
+    version is a no-op so retried CI runs do not grow the history.  Records
+    older than the newest ``retain`` are pruned, including any a crash left
+    behind after ``HEAD.json`` moved past them.  A record left behind by a
+    publish that crashed before updating ``HEAD.json`` was never visible to
+    clients and is discarded.
+    """
+
+    if retain < 2:
+        raise ValueError("retain must keep at least the current and previous versions")
+
+    channel_dir = destination / channel
+    records = channel_dir / HISTORY_DIR
+    records.mkdir(parents=True, exist_ok=True)
+
+    head = read_head(destination, channel)
+    if head is not None and head.current.version == version:
+        return head
+
+    sequence = head.current.sequence + 1 if head else 1
+    for stale in (records / _record_name(sequence), *records.glob(".*"), *channel_dir.glob(f".{HEAD_NAME}.*")):
+        stale.unlink(missing_ok=True)
+
+    entry = HistoryEntry(sequence, version, timestamp, source, gpg_key, commit)
+    _append_record(records / _record_name(sequence), dump_json(asdict(entry)))
+
+    oldest = head.oldest if head else sequence
+    cutoff = max(oldest, sequence - retain + 1)
+    new_head = ChannelHead(channel, entry, head.current if head else None, cutoff)
+    atomic_write(channel_dir / HEAD_NAME, dump_json(new_head.to_dict()))
+
+    for record in records.glob("[0-9]*.json"):
+        if record.stem.isdigit() and int(record.stem) < cutoff:
+            record.unlink(missing_ok=True)
+    return new_head
+
+
+__all__ = [
+    "COMMITS_DIR",
+    "DEFAULT_RETAIN",
+    "HEAD_NAME",
+    "LOCK_NAME",
+    "ChannelHead",
+    "HistoryEntry",
+    "append",
+    "atomic_write",
+    "commit_path",
+    "history",
+    "prune_commits",
+    "publish_lock",
+    "published_commit",
+    "read_entry",
+    "read_head",
+    "store_commit",
+    "tree_digest",
+]
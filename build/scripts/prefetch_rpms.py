@@ -0,0 +1,606 @@
+#!/usr/bin/env python3
+"""Prefetch the RPMs a compose installs into a shared, content-addressed cache.
+
+Package locations and checksums come from local ``repodata`` (``repomd.xml``
+and the primary metadata it references).  The requested packages are closed
+over their ``Requires``.  Each requirement is matched against the
+``Provides`` of the newest build of every package, and file requirements
+against the files listed in primary metadata and then in ``filelists``.
+Boolean (rich) dependencies and ``rpmlib()`` requirements are left to
+rpm-ostree.  Downloads run on a bounded thread pool.  Each thread borrows a
+keep-alive HTTP connection from a shared pool.
+Interrupted downloads resume with a ``Range`` request whose ``Content-Range``
+must start at the requested offset. Connection errors and 5xx responses are
+retried a bounded number of times. Every file is verified against its
+repodata checksum before it enters the cache, and packages that are already
+cached are not fetched again::
+
+    cache/
+      sha256/ab/ab12...ef.rpm     verified packages, named by checksum
+      partial/ab12...ef.rpm.part  interrupted downloads
+      prefetch/<sha256>-<profile>.json
+                                  package -> cache path, one record per
+                                  manifest checksum and profile
+
+``compose.py --rpm-cache`` resolves the composed package set through
+:func:`cached_packages` and records the verified RPMs it will install.
+Records are replaced atomically, so composes sharing a cache never read a
+half-written one.
+"""
+
+from __future__ import annotations
+
+import argparse
+import fcntl
+import gzip
+import hashlib
+import http.client
+import json
+import os
+import queue
+import re
+import sys
+import threading
+import time
+import xml.etree.ElementTree as ElementTree
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Collection, Dict, Iterable, Iterator, List, Sequence, Tuple
+from urllib.parse import urljoin, urlsplit
+
+if __package__ in (None, ""):  # pragma: no cover - direct script execution
+    sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from build.scripts.ostree_history import atomic_write
+from evergreen_os_image.configuration import ComposeManifest
+from evergreen_os_image.profiles import ComposeProfiles
+
+RECORDS_DIR = "prefetch"
+CHUNK_SIZE = 1 << 16
+DEFAULT_CONCURRENCY = 8
+DEFAULT_ATTEMPTS = 3
+
+_REPO_NS = "{http://linux.duke.edu/metadata/repo}"
+_COMMON_NS = "{http://linux.duke.edu/metadata/common}"
+_RPM_NS = "{http://linux.duke.edu/metadata/rpm}"
+_FILELISTS_NS = "{http://linux.duke.edu/metadata/filelists}"
+_COMPARISONS = {"EQ": {0}, "LT": {-1}, "LE": {-1, 0}, "GT": {1}, "GE": {0, 1}}
+_VERSION_PART = re.compile(r"\d+|[A-Za-z]+")
+_CONTENT_RANGE = re.compile(r"bytes (\d+)-\d+/(?:\d+|\*)")
+
+
+def _version_parts(value: str) -> Tuple:
+    return tuple((0, int(part)) if part.isdigit() else (-1, part) for part in _VERSION_PART.findall(value))
+
+
+@dataclass(frozen=True)
+class Dependency:
+    """A ``Requires`` or ``Provides`` entry, optionally bound to a version."""
+
+    name: str
+    flags: str = ""
+    epoch: str = ""
+    version: str = ""
+    release: str = ""
+
+    def satisfied_by(self, provide: "Dependency") -> bool:
+        """Whether ``provide`` satisfies this requirement.
+
+        Unversioned requirements and provides always match.  A ranged provide
+        is assumed to overlap; only ``EQ`` provides are compared.  The release
+        is compared only when the requirement names one.
+        """
+
+        if provide.name != self.name:
+            return False
+        if self.flags not in _COMPARISONS or not provide.version or provide.flags != "EQ":
+            return True
+        provided = (int(provide.epoch or 0), _version_parts(provide.version))
+        required = (int(self.epoch or 0), _version_parts(self.version))
+        if self.release:
+            provided += (_version_parts(provide.release),)
+            required += (_version_parts(self.release),)
+        return (provided > required) - (provided < required) in _COMPARISONS[self.flags]
+
+    def __str__(self) -> str:
+        if not self.flags:
+            return self.name
+        epoch = f"{self.epoch}:" if self.epoch not in {"", "0"} else ""
+        release = f"-{self.release}" if self.release else ""
+        return f"{self.name} {self.flags} {epoch}{self.version}{release}"
+
+
+@dataclass(frozen=True)
+class RpmPackage:
+    """A package entry from primary repodata."""
+
+    name: str
+    arch: str
+    epoch: str
+    version: str
+    release: str
+    checksum_type: str
+    checksum: str
+    location: str
+    size: int
+    requires: Tuple[Dependency, ...] = ()
+    provides: Tuple[Dependency, ...] = ()
+    files: Tuple[str, ...] = ()
+
+    @property
+    def nevra(self) -> str:
+        epoch = f"{self.epoch}:" if self.epoch not in {"", "0"} else ""
+        return f"{self.name}-{epoch}{self.version}-{self.release}.{self.arch}"
+
+    def sort_key(self) -> Tuple:
+        return (int(self.epoch or 0), _version_parts(self.version), _version_parts(self.release))
+
+
+def _metadata_location(repodata: Path, kind: str) -> Path:
+    root = ElementTree.parse(repodata / "repomd.xml").getroot()
+    for data in root.iter(f"{_REPO_NS}data"):
+        if data.get("type") == kind:
+            location = data.find(f"{_REPO_NS}location")
+            if location is not None and location.get("href"):
+                return repodata.parent / str(location.get("href"))
+    raise ValueError(f"{repodata / 'repomd.xml'} does not reference {kind} metadata")
+
+
+def _open_metadata(path: Path):
+    return gzip.open(path, "rb") if path.suffix == ".gz" else open(path, "rb")
+
+
+def _dependencies(format_element: ElementTree.Element | None, kind: str) -> Tuple[Dependency, ...]:
+    if format_element is None:
+        return ()
+    return tuple(
+        Dependency(
+            name=entry.get("name", ""),
+            flags=entry.get("flags", ""),
+            epoch=entry.get("epoch", ""),
+            version=entry.get("ver", ""),
+            release=entry.get("rel", ""),
+        )
+        for entry in format_element.iterfind(f"{_RPM_NS}{kind}/{_RPM_NS}entry")
+    )
+
+
+def iter_primary(repodata: Path) -> Iterator[RpmPackage]:
+    """Stream the package entries of the primary metadata in ``repodata``."""
+
+    with _open_metadata(_metadata_location(repodata, "primary")) as stream:
+        for _, element in ElementTree.iterparse(stream):
+            if element.tag != f"{_COMMON_NS}package" or element.get("type") != "rpm":
+                continue
+            version = element.find(f"{_COMMON_NS}version")
+            checksum = element.find(f"{_COMMON_NS}checksum")
+            location = element.find(f"{_COMMON_NS}location")
+            size = element.find(f"{_COMMON_NS}size")
+            format_element = element.find(f"{_COMMON_NS}format")
+            yield RpmPackage(
+                name=element.findtext(f"{_COMMON_NS}name", ""),
+                arch=element.findtext(f"{_COMMON_NS}arch", ""),
+                epoch=version.get("epoch", "0") if version is not None else "0",
+                version=version.get("ver", "") if version is not None else "",
+                release=version.get("rel", "") if version is not None else "",
+                checksum_type=checksum.get("type", "") if checksum is not None else "",
+                checksum=(checksum.text or "").strip() if checksum is not None else "",
+                location=location.get("href", "") if location is not None else "",
+                size=int(size.get("package", 0)) if size is not None else 0,
+                requires=_dependencies(format_element, "requires"),
+                provides=_dependencies(format_element, "provides"),
+                files=tuple(
+                    (file.text or "").strip()
+                    for file in (format_element.iterfind(f"{_COMMON_NS}file") if format_element is not None else ())
+                ),
+            )
+            element.clear()
+
+
+def _file_owners(repodata: Path, paths: Collection[str], packages: Dict[str, RpmPackage]) -> Dict[str, RpmPackage]:
+    """Find which of ``packages`` own ``paths`` according to the filelists metadata."""
+
+    by_checksum = {package.checksum: package for package in packages.values()}
+    owners: Dict[str, RpmPackage] = {}
+    with _open_metadata(_metadata_location(repodata, "filelists")) as stream:
+        for _, element in ElementTree.iterparse(stream):
+            if element.tag != f"{_FILELISTS_NS}package":
+                continue
+            package = by_checksum.get(element.get("pkgid", ""))
+            if package is not None:
+                for file in element.iterfind(f"{_FILELISTS_NS}file"):
+                    path = (file.text or "").strip()
+                    if path in paths:
+                        owners.setdefault(path, package)
+            element.clear()
+    return owners
+
+
+def _best_provider(candidates: Iterable[RpmPackage], name: str) -> RpmPackage:
+    # Prefer the package named like the requirement, then the shortest name.
+    return min(candidates, key=lambda package: (package.name != name, len(package.name), package.name))
+
+
+def resolve_packages(names: Sequence[str], repodata: Path, arch: str = "x86_64") -> List[RpmPackage]:
+    """Resolve ``names`` and their dependency closure to ``arch`` or ``noarch`` builds.
+
+    Only the newest build of each package is considered.  The requested
+    packages come first, in order, followed by their dependencies in the order
+    they were pulled in.
+    """
+
+    newest: Dict[str, RpmPackage] = {}
+    for package in iter_primary(repodata):
+        if package.arch not in {arch, "noarch"}:
+            continue
+        current = newest.get(package.name)
+        if current is None or package.sort_key() > current.sort_key():
+            newest[package.name] = package
+
+    missing = sorted(set(names) - set(newest))
+    if missing:
+        raise ValueError(f"Packages not found in {repodata}: {', '.join(missing)}")
+
+    providers: Dict[str, List[Tuple[Dependency, RpmPackage]]] = {}
+    file_owners: Dict[str, RpmPackage] = {}
+    for package in newest.values():
+        own = Dependency(package.name, "EQ", package.epoch, package.version, package.release)
+        for provide in (own, *package.provides):
+            providers.setdefault(provide.name, []).append((provide, package))
+        for path in package.files:
+            file_owners.setdefault(path, package)
+
+    selected: Dict[str, RpmPackage] = {}
+    pending: deque[RpmPackage] = deque()
+
+    def select(package: RpmPackage) -> None:
+        if package.name not in selected:
+            selected[package.name] = package
+            pending.append(package)
+
+    for name in names:
+        select(newest[name])
+    searched_files: set[str] = set()
+    while pending:
+        deferred: List[Tuple[RpmPackage, str]] = []
+        while pending:
+            package = pending.popleft()
+            for requirement in package.requires:
+                if requirement.name.startswith(("rpmlib(", "(")):
+                    continue
+                if requirement.name.startswith("/"):
+                    owner = file_owners.get(requirement.name)
+                    if owner is not None:
+                        select(owner)
+                    elif requirement.name in searched_files:
+                        raise ValueError(f"{package.nevra}: nothing provides {requirement}")
+                    else:
+                        deferred.append((package, requirement.name))
+                    continue
+                candidates = [
+                    provider
+                    for provide, provider in providers.get(requirement.name, ())
+                    if requirement.satisfied_by(provide)
+                ]
+                if not candidates:
+                    raise ValueError(f"{package.nevra}: nothing provides {requirement}")
+                if not any(candidate.name in selected for candidate in candidates):
+                    select(_best_provider(candidates, requirement.name))
+        if deferred:
+            paths = {path for _, path in deferred}
+            file_owners.update(_file_owners(repodata, paths, newest))
+            searched_files.update(paths)
+            for package, path in deferred:
+                if path not in file_owners:
+                    raise ValueError(f"{package.nevra}: nothing provides {path}")
+                select(file_owners[path])
+
+    for package in selected.values():
+        if package.checksum_type != "sha256":
+            raise ValueError(f"{package.nevra}: unsupported checksum type {package.checksum_type!r}")
+    return list(selected.values())
+
+
+class ConnectionPool:
+    """Bounded pool of keep-alive connections to a single mirror."""
+
+    def __init__(self, base_url: str, size: int, timeout: float = 30.0) -> None:
+        parts = urlsplit(base_url)
+        if parts.scheme not in {"http", "https"}:
+            raise ValueError(f"Unsupported mirror URL: {base_url}")
+        self.base_url = base_url if base_url.endswith("/") else base_url + "/"
+        self._factory = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+        self._host = parts.netloc
+        self._timeout = timeout
+        self._idle: "queue.LifoQueue[http.client.HTTPConnection]" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self.opened = 0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> http.client.HTTPConnection:
+        self._slots.acquire()
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                self.opened += 1
+            return self._factory(self._host, timeout=self._timeout)
+
+    def release(self, connection: http.client.HTTPConnection, reusable: bool = True) -> None:
+        if reusable:
+            self._idle.put(connection)
+        else:
+            connection.close()
+        self._slots.release()
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+def cache_path(cache: Path, package: RpmPackage) -> Path:
+    return cache / "sha256" / package.checksum[:2] / f"{package.checksum}.rpm"
+
+
+def _cached(package: RpmPackage, target: Path) -> Dict[str, object]:
+    return {"package": package.nevra, "path": str(target), "downloaded": 0, "resumed": False, "cached": True}
+
+
+def _download(pool: ConnectionPool, package: RpmPackage, cache: Path, attempts: int) -> Dict[str, object]:
+    target = cache_path(cache, package)
+    if target.exists():
+        return _cached(package, target)
+
+    partial = cache / "partial" / f"{package.checksum}.rpm.part"
+    partial.parent.mkdir(parents=True, exist_ok=True)
+    lock_path = partial.with_suffix(".lock")
+    # Composes sharing the cache serialise per package on the lock file.  The
+    # holder removes it when done, so a waiter that wakes up holding a removed
+    # file retries on the current one.
+    while True:
+        with open(lock_path, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            if not _holds(lock.fileno(), lock_path):
+                continue
+            try:
+                if target.exists():
+                    return _cached(package, target)
+                return _fetch(pool, package, partial, target, attempts)
+            finally:
+                lock_path.unlink(missing_ok=True)
+
+
+def _holds(descriptor: int, path: Path) -> bool:
+    try:
+        return os.stat(path).st_ino == os.fstat(descriptor).st_ino
+    except FileNotFoundError:
+        return False
+
+
+def _range_start(header: str | None) -> int | None:
+    match = _CONTENT_RANGE.fullmatch((header or "").strip())
+    return int(match.group(1)) if match else None
+
+
+def _fetch(
+    pool: ConnectionPool, package: RpmPackage, partial: Path, target: Path, attempts: int
+) -> Dict[str, object]:
+    """Download ``package`` into ``partial`` and move it to ``target`` once verified.
+
+    Connection errors and 5xx responses are retried up to ``attempts`` times
+    in total.  A ``206`` whose ``Content-Range`` does not start at the
+    requested offset is never appended; the partial file is discarded and the
+    next attempt starts from scratch.
+    """
+
+    url_path = urlsplit(urljoin(pool.base_url, package.location)).path
+    downloaded = 0
+    resumed = False
+
+    for attempt in range(1, attempts + 1):
+        offset = partial.stat().st_size if partial.exists() else 0
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        connection = pool.acquire()
+        reusable = False
+        try:
+            connection.request("GET", url_path, headers=headers)
+            response = connection.getresponse()
+            if response.status == 416 and offset:
+                response.read()
+                reusable = not response.will_close
+                partial.unlink()
+                continue
+            if response.status >= 500:
+                response.read()
+                reusable = not response.will_close
+                if attempt == attempts:
+                    raise RuntimeError(
+                        f"{package.nevra}: mirror returned HTTP {response.status} after {attempts} attempts"
+                    )
+                time.sleep(0.1 * attempt)
+                continue
+            if response.status not in {200, 206}:
+                response.read()
+                reusable = not response.will_close
+                raise RuntimeError(f"{package.nevra}: mirror returned HTTP {response.status}")
+            append = response.status == 206
+            if append and _range_start(response.getheader("Content-Range")) != offset:
+                partial.unlink(missing_ok=True)
+                continue
+            resumed = resumed or append
+            with partial.open("ab" if append else "wb") as stream:
+                while chunk := response.read(CHUNK_SIZE):
+                    stream.write(chunk)
+                    downloaded += len(chunk)
+            reusable = not response.will_close
+            break
+        except (OSError, http.client.HTTPException) as error:
+            if attempt == attempts:
+                raise RuntimeError(f"{package.nevra}: download failed after {attempts} attempts: {error}") from error
+            time.sleep(0.1 * attempt)
+        finally:
+            pool.release(connection, reusable)
+    else:
+        raise RuntimeError(f"{package.nevra}: mirror rejected every resume attempt")
+
+    digest = hashlib.sha256()
+    with partial.open("rb") as stream:
+        while chunk := stream.read(1 << 20):
+            digest.update(chunk)
+    if digest.hexdigest() != package.checksum:
+        partial.unlink()
+        raise ValueError(f"{package.nevra}: sha256 mismatch, discarded download")
+
+    target.parent.mkdir(parents=True, exist_ok=True)
+    os.replace(partial, target)
+    return {
+        "package": package.nevra,
+        "path": str(target),
+        "downloaded": downloaded,
+        "resumed": resumed,
+        "cached": False,
+    }
+
+
+def prefetch(
+    packages: Sequence[RpmPackage],
+    mirror: str,
+    cache: Path,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    attempts: int = DEFAULT_ATTEMPTS,
+) -> Dict[str, object]:
+    """Download ``packages`` from ``mirror`` into ``cache`` and summarise the run."""
+
+    if concurrency < 1:
+        raise ValueError("concurrency must be at least 1")
+    cache.mkdir(parents=True, exist_ok=True)
+    pool = ConnectionPool(mirror, concurrency)
+    started = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(lambda package: _download(pool, package, cache, attempts), packages))
+    finally:
+        pool.close()
+    elapsed = time.perf_counter() - started
+
+    downloaded = sum(int(result["downloaded"]) for result in results)
+    return {
+        "mirror": mirror,
+        "cache": str(cache),
+        "concurrency": concurrency,
+        "connections_opened": pool.opened,
+        "packages": {package.name: result["path"] for package, result in zip(packages, results)},
+        "fetched": sum(1 for result in results if not result["cached"]),
+        "reused": sum(1 for result in results if result["cached"]),
+        "resumed": sum(1 for result in results if result["resumed"]),
+        "bytes_downloaded": downloaded,
+        "elapsed_seconds": elapsed,
+    }
+
+
+def record_path(cache: Path, manifest_checksum: str, profile: str | None = None) -> Path:
+    """Location of the prefetch record for a manifest checksum and profile."""
+
+    return cache / RECORDS_DIR / f"{manifest_checksum}-{profile or 'base'}.json"
+
+
+def prefetch_manifest(
+    manifest: Path,
+    repodata: Path,
+    mirror: str,
+    cache: Path,
+    arch: str = "x86_64",
+    concurrency: int = DEFAULT_CONCURRENCY,
+    profile: str | None = None,
+    profiles: Path | None = None,
+) -> Path:
+    """Prefetch ``packages.install`` of a compose manifest and its dependencies.
+
+    With ``profile`` the package set of the derived manifest is prefetched,
+    matching what ``compose.py --profile`` installs.  The summary is recorded
+    under the manifest's checksum and the profile name.
+    """
+
+    derived = ComposeManifest.load(manifest)
+    if profile is not None:
+        derived = ComposeProfiles.load(profiles).get(profile).apply(derived)
+    packages = resolve_packages(derived.packages_install, repodata, arch)
+    summary = prefetch(packages, mirror, cache, concurrency)
+    summary["requested"] = list(derived.packages_install)
+    result_path = record_path(cache, hashlib.sha256(manifest.read_bytes()).hexdigest(), profile)
+    result_path.parent.mkdir(parents=True, exist_ok=True)
+    return atomic_write(result_path, json.dumps(summary, indent=2))
+
+
+def cached_packages(
+    cache: Path, names: Sequence[str], manifest_checksum: str, profile: str | None = None
+) -> Dict[str, Path]:
+    """Map every package prefetched for a compose to its verified RPM.
+
+    The record for ``manifest_checksum`` and ``profile`` must cover each of
+    ``names``; the dependencies it recorded are returned as well.  Raises
+    ``FileNotFoundError`` when there is no such record or a recorded file is
+    gone, and ``ValueError`` when a package was not prefetched or its contents
+    no longer match the checksum it is named by.
+    """
+
+    record = record_path(cache, manifest_checksum, profile)
+    if not record.is_file():
+        raise FileNotFoundError(f"No prefetch record for this manifest in {cache}; run prefetch_rpms.py first")
+    recorded = json.loads(record.read_text()).get("packages", {})
+    missing = [name for name in names if name not in recorded]
+    if missing:
+        raise ValueError(f"Packages not prefetched into {cache}: {', '.join(missing)}")
+
+    resolved: Dict[str, Path] = {}
+    for name in recorded:
+        filename = Path(str(recorded[name])).name
+        checksum = filename.removesuffix(".rpm")
+        path = cache / "sha256" / checksum[:2] / filename
+        if not path.is_file():
+            raise FileNotFoundError(f"{name}: cached RPM missing: {path}")
+        digest = hashlib.sha256()
+        with path.open("rb") as stream:
+            while chunk := stream.read(1 << 20):
+                digest.update(chunk)
+        if digest.hexdigest() != checksum:
+            raise ValueError(f"{name}: cached RPM {path} does not match its checksum")
+        resolved[name] = path
+    return resolved
+
+
+def parse_args(argv: Iterable[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--manifest", required=True, type=Path)
+    parser.add_argument("--repodata", required=True, type=Path, help="local repodata/ directory")
+    parser.add_argument("--mirror", required=True, help="base URL package locations are relative to")
+    parser.add_argument("--cache", required=True, type=Path)
+    parser.add_argument("--arch", default="x86_64")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--profile", default=None, help="prefetch the packages of a compose profile")
+    parser.add_argument("--profiles", type=Path, default=None)
+    return parser.parse_args(argv)
+
+
+def main(argv: Iterable[str] | None = None) -> int:
+    args = parse_args(argv)
+    prefetch_manifest(
+        args.manifest,
+        args.repodata,
+        args.mirror,
+        args.cache,
+        args.arch,
+        args.concurrency,
+        args.profile,
+        args.profiles,
+    )
+    return 0
+
+
+if __name__ == "__main__":  # pragma: no cover
+    raise SystemExit(main())
@@ -1,40 +1,70 @@
-"""Publish EvergreenOS OSTree commits into release channels."""
+"""Publish EvergreenOS OSTree commits into release channels.
+
+Every publish stores the tree under ``commits/<version>/`` and appends to each
+channel's history (see :mod:`build.scripts.ostree_history`) under an exclusive
+repository lock, so concurrent CI runs serialise instead of clobbering each
+other.  Only the newly stored commit is normalised for reproducible builds;
+commits no retained record refers to are removed.
+"""
 
 from __future__ import annotations
 
 import argparse
-import json
-from datetime import datetime
+import sys
 from pathlib import Path
 from typing import Iterable
 
+if __package__ in (None, ""):  # pragma: no cover - direct script execution
+    sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from build.scripts import ostree_history
+from build.scripts.reproducible import build_timestamp, dump_json
+
 CHANNELS = ("stable", "beta", "dev")
+SUMMARY_NAME = "summary.json"
+# Index files rewritten by every publish; their mtimes are live, not pinned.
+INDEX_NAMES = frozenset({SUMMARY_NAME, ostree_history.HEAD_NAME, ostree_history.LOCK_NAME})
 
 
-def publish(source: Path, destination: Path, version: str, gpg_key: str | None = None) -> Path:
+def publish(
+    source: Path,
+    destination: Path,
+    version: str,
+    gpg_key: str | None = None,
+    retain: int = ostree_history.DEFAULT_RETAIN,
+) -> Path:
     if not source.exists():
         raise FileNotFoundError(f"OSTree source directory not found: {source}")
 
-    destination.mkdir(parents=True, exist_ok=True)
-    summary_path = destination / "summary.json"
+    summary_path = destination / SUMMARY_NAME
+    timestamp = build_timestamp()
+    commit = f"{ostree_history.COMMITS_DIR}/{version}"
 
     payload = {
         "version": version,
-        "timestamp": datetime.utcnow().isoformat() + "Z",
+        "timestamp": timestamp,
         "source": str(source),
+        "commit": commit,
         "channels": {},
         "gpg_key": gpg_key,
     }
 
-    for channel in CHANNELS:
-        channel_dir = destination / channel
-        channel_dir.mkdir(exist_ok=True)
-        payload["channels"][channel] = {
-            "path": str(channel_dir),
-            "published": True,
-        }
+    with ostree_history.publish_lock(destination):
+        ostree_history.store_commit(destination, version, source)
+        for channel in CHANNELS:
+            channel_dir = destination / channel
+            head = ostree_history.append(
+                destination, channel, version, timestamp, str(source), gpg_key, retain, commit
+            )
+            payload["channels"][channel] = {
+                "path": str(channel_dir),
+                "published": True,
+                "sequence": head.current.sequence,
+                "head": str(channel_dir / ostree_history.HEAD_NAME),
+            }
 
-    summary_path.write_text(json.dumps(payload, indent=2))
+        ostree_history.prune_commits(destination, CHANNELS)
+        ostree_history.atomic_write(summary_path, dump_json(payload))
     return summary_path
 
 
@@ -44,12 +74,13 @@ def parse_args(argv: Iterable[str] | None = None) -> argparse.Namespace:
     parser.add_argument("--destination", required=True, type=Path)
     parser.add_argument("--version", required=True)
     parser.add_argument("--gpg-key", default=None)
+    parser.add_argument("--retain", type=int, default=ostree_history.DEFAULT_RETAIN)
     return parser.parse_args(argv)
 
 
 def main(argv: Iterable[str] | None = None) -> int:
     args = parse_args(argv)
-    publish(args.source, args.destination, args.version, args.gpg_key)
+    publish(args.source, args.destination, args.version, args.gpg_key, args.retain)
     return 0
 
 
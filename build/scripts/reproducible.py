@@ -0,0 +1,108 @@
+"""Helpers for bit-reproducible EvergreenOS build artifacts.
+
+Setting ``SOURCE_DATE_EPOCH`` (see https://reproducible-builds.org/specs/source-date-epoch/)
+switches the build scripts into reproducible mode: embedded timestamps come
+from the variable instead of the wall clock, JSON keys are sorted, and file
+modes and modification times of everything written are normalised.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+
+SOURCE_DATE_EPOCH = "SOURCE_DATE_EPOCH"
+FILE_MODE = 0o644
+EXECUTABLE_MODE = 0o755
+DIRECTORY_MODE = 0o755
+
+
+def source_date_epoch() -> int | None:
+    """Return ``SOURCE_DATE_EPOCH`` as an integer, or ``None`` when unset."""
+
+    value = os.environ.get(SOURCE_DATE_EPOCH, "").strip()
+    if not value:
+        return None
+    try:
+        epoch = int(value)
+    except ValueError as error:
+        raise ValueError(f"{SOURCE_DATE_EPOCH} must be an integer, got {value!r}") from error
+    if epoch < 0:
+        raise ValueError(f"{SOURCE_DATE_EPOCH} must not be negative, got {value!r}")
+    return epoch
+
+
+def reproducible() -> bool:
+    """Whether the build runs in reproducible mode."""
+
+    return source_date_epoch() is not None
+
+
+def build_time() -> datetime:
+    """Timezone-aware UTC build time: ``SOURCE_DATE_EPOCH`` or the wall clock."""
+
+    epoch = source_date_epoch()
+    return datetime.now(timezone.utc) if epoch is None else datetime.fromtimestamp(epoch, timezone.utc)
+
+
+def build_timestamp() -> str:
+    """UTC timestamp to embed in artifacts, e.g. ``2024-01-01T00:00:00Z``."""
+
+    return build_time().replace(tzinfo=None).isoformat() + "Z"
+
+
+def dump_json(payload: object) -> str:
+    """Serialise ``payload`` with stable key order in reproducible mode."""
+
+    return json.dumps(payload, indent=2, sort_keys=reproducible())
+
+
+def write_artifact(path: Path, contents: str) -> Path:
+    """Write ``contents`` to ``path`` and normalise its metadata if reproducible."""
+
+    path.write_text(contents)
+    epoch = source_date_epoch()
+    if epoch is not None:
+        path.chmod(FILE_MODE)
+        os.utime(path, (epoch, epoch))
+    return path
+
+
+def normalize_tree(root: Path) -> None:
+    """Normalise modes and clamp mtimes under ``root`` to ``SOURCE_DATE_EPOCH``.
+
+    Files with any execute bit become 0755 and other files 0644, so scripts
+    stay executable.  Directories become 0755.  Entries are visited in sorted
+    order, deepest first, so directory mtimes are set after their contents have
+    been touched.
+    """
+
+    epoch = source_date_epoch()
+    if epoch is None or not root.exists():
+        return
+    entries = sorted(root.rglob("*"), key=lambda entry: (-len(entry.parts), str(entry)))
+    for entry in [*entries, root]:
+        if entry.is_symlink():
+            continue
+        if entry.is_dir():
+            entry.chmod(DIRECTORY_MODE)
+        else:
+            entry.chmod(EXECUTABLE_MODE if entry.stat().st_mode & 0o111 else FILE_MODE)
+        os.utime(entry, (epoch, epoch))
+
+
+__all__ = [
+    "DIRECTORY_MODE",
+    "EXECUTABLE_MODE",
+    "FILE_MODE",
+    "SOURCE_DATE_EPOCH",
+    "build_time",
+    "build_timestamp",
+    "dump_json",
+    "normalize_tree",
+    "reproducible",
+    "source_date_epoch",
+    "write_artifact",
+]
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""Exercise an OSTree update followed by an automatic rollback.
+
+The harness reads the current (B) and previous (A) versions of a channel from
+a local update repository written by ``publish_ostree.py``.  It deploys A into
+a scratch sysroot and boots it, then stages B and reboots into it with a boot
+failure injected.  Once the greenboot-style boot counter is exhausted the
+bootloader falls back to A.  The staging, reboot and rollback phases are timed
+separately.
+
+Deployments are written in chunks with an ``fsync`` after each one.
+``--write-mbps`` and ``--sync-latency-ms`` throttle those writes to model slow
+eMMC storage, and ``--boot-seconds`` stands in for each boot.  Nothing is
+booted: the failure is injected by the harness's health check and the
+bootloader fallback is modelled in-process, so the results report the phase
+timings as modelled.  ``update_rollback_verified`` is reported true only when
+``--rpm-ostree-status`` supplies ``rpm-ostree status --json`` captured from a
+device that really fell back from the update.
+
+Both versions are staged from the commits stored in the update repository, not
+from the build directories they were published from.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Mapping
+
+if __package__ in (None, ""):  # pragma: no cover - direct script execution
+    sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from build.scripts import ostree_history
+
+RESULT_NAME = "rollback-results.json"
+CHUNK_SIZE = 1 << 20
+DEFAULT_BOOT_ATTEMPTS = 3
+
+
+@dataclass(frozen=True)
+class StorageModel:
+    """Write throughput and flush latency of the device's storage."""
+
+    write_mbps: float | None = None
+    sync_latency_ms: float = 0.0
+
+    def copy(self, source: Path, target: Path) -> int:
+        """Copy ``source`` to ``target`` at this storage's speed; return bytes written."""
+
+        written = 0
+        with source.open("rb") as reader, target.open("wb") as writer:
+            while chunk := reader.read(CHUNK_SIZE):
+                started = time.perf_counter()
+                writer.write(chunk)
+                writer.flush()
+                os.fsync(writer.fileno())
+                written += len(chunk)
+                floor = self.sync_latency_ms / 1000
+                if self.write_mbps:
+                    floor += len(chunk) / (self.write_mbps * 1_000_000)
+                remaining = floor - (time.perf_counter() - started)
+                if remaining > 0:
+                    time.sleep(remaining)
+        return written
+
+
+class Sysroot:
+    """Scratch rpm-ostree sysroot with an ordered list of boot entries.
+
+    ``entries[0]`` is the default boot entry and ``entries[1]`` the rollback
+    target.  A newly staged deployment gets ``boot_attempts`` tries to pass its
+    health check.  When a boot fails and no tries remain, the bootloader drops
+    the entry and falls back to the next one.
+    """
+
+    def __init__(self, root: Path, storage: StorageModel, boot_attempts: int) -> None:
+        self.root = root
+        self.storage = storage
+        self.boot_attempts = boot_attempts
+        self.entries: List[str] = []
+        self.boot_counter: int | None = None
+        self.bytes_written = 0
+
+    def deploy(self, version: str, source: Path) -> Path:
+        """Write ``source`` into a new deployment and make it the default entry."""
+
+        if not source.is_dir():
+            raise FileNotFoundError(f"OSTree source for {version} not found: {source}")
+        target = self.root / "ostree" / "deploy" / version
+        if target.exists():
+            shutil.rmtree(target)
+        for path in sorted(source.rglob("*")):
+            destination = target / path.relative_to(source)
+            if path.is_dir():
+                destination.mkdir(parents=True, exist_ok=True)
+            else:
+                destination.parent.mkdir(parents=True, exist_ok=True)
+                self.bytes_written += self.storage.copy(path, destination)
+        target.mkdir(parents=True, exist_ok=True)
+        self.entries = [version, *[entry for entry in self.entries if entry != version]]
+        self.boot_counter = self.boot_attempts if len(self.entries) > 1 else None
+        self._write_bootloader()
+        return target
+
+    def boot(self, boot: Callable[[], None], healthy: Callable[[str], bool]) -> Dict[str, object]:
+        """Boot the default entry once and apply the boot-counting outcome."""
+
+        version = self.entries[0]
+        boot()
+        passed = healthy(version)
+        if passed:
+            self.boot_counter = None
+        elif self.boot_counter is not None:
+            self.boot_counter -= 1
+            if self.boot_counter <= 0 and len(self.entries) > 1:
+                self.entries.pop(0)
+                self.boot_counter = None
+        self._write_bootloader()
+        return {"version": version, "healthy": passed}
+
+    @property
+    def default(self) -> str:
+        return self.entries[0]
+
+    def _write_bootloader(self) -> None:
+        state = {"entries": self.entries, "boot_counter": self.boot_counter}
+        (self.root / "bootloader.json").write_text(json.dumps(state, indent=2))
+
+
+def rollback_observed(status: Mapping[str, object], from_version: str, to_version: str) -> bool:
+    """Whether ``rpm-ostree status --json`` shows a device that rolled back.
+
+    The booted default deployment must be ``from_version`` with the update to
+    ``to_version`` kept behind it as the rollback entry.  A staged but not yet
+    booted update has the update first and does not count.
+    """
+
+    deployments = status.get("deployments")
+    if not isinstance(deployments, list) or not deployments:
+        return False
+    default, *others = deployments
+    return (
+        bool(default.get("booted"))
+        and default.get("version") == from_version
+        and any(entry.get("version") == to_version and not entry.get("staged") for entry in others)
+    )
+
+
+def run_rollback_test(
+    update_repo: Path,
+    output: Path,
+    channel: str = "stable",
+    storage: StorageModel | None = None,
+    boot_seconds: float = 0.0,
+    boot_attempts: int = DEFAULT_BOOT_ATTEMPTS,
+    max_rollback_seconds: float | None = None,
+    rpm_ostree_status: Path | None = None,
+) -> Path:
+    """Update from the channel's previous version to its current one and roll back."""
+
+    head = ostree_history.read_head(update_repo, channel)
+    if head is None or head.previous is None:
+        raise ValueError(f"Channel {channel!r} in {update_repo} needs at least two published versions")
+    if boot_attempts < 1:
+        raise ValueError("boot_attempts must be at least 1")
+    version_a, version_b = head.previous, head.current
+    commit_a = ostree_history.published_commit(update_repo, version_a)
+    commit_b = ostree_history.published_commit(update_repo, version_b)
+    storage = storage or StorageModel()
+
+    def boot() -> None:
+        time.sleep(boot_seconds)
+
+    def healthy(version: str) -> bool:
+        return version != version_b.version
+
+    output.mkdir(parents=True, exist_ok=True)
+    sysroot_dir = output / "sysroot"
+    if sysroot_dir.exists():
+        shutil.rmtree(sysroot_dir)
+    sysroot = Sysroot(sysroot_dir, storage, boot_attempts)
+
+    sysroot.deploy(version_a.version, commit_a)
+    initial_boot = sysroot.boot(boot, healthy)
+
+    written_before = sysroot.bytes_written
+    started = time.perf_counter()
+    staged = sysroot.deploy(version_b.version, commit_b)
+    staging_seconds = time.perf_counter() - started
+    staged_bytes = sysroot.bytes_written - written_before
+    staged_intact = ostree_history.tree_digest(staged) == ostree_history.tree_digest(commit_b)
+
+    started = time.perf_counter()
+    failed_boots = []
+    while sysroot.default == version_b.version:
+        failed_boots.append(sysroot.boot(boot, healthy))
+    reboot_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    recovery_boot = sysroot.boot(boot, healthy)
+    rollback_seconds = time.perf_counter() - started
+
+    simulation_passed = (
+        bool(initial_boot["healthy"])
+        and staged_intact
+        and len(failed_boots) == boot_attempts
+        and recovery_boot["version"] == version_a.version
+        and bool(recovery_boot["healthy"])
+    )
+    within_budget = max_rollback_seconds is None or reboot_seconds + rollback_seconds <= max_rollback_seconds
+    observed = rpm_ostree_status is not None and rollback_observed(
+        json.loads(rpm_ostree_status.read_text()), version_a.version, version_b.version
+    )
+
+    results = {
+        "channel": channel,
+        "update_repo": str(update_repo),
+        "from_version": version_a.version,
+        "to_version": version_b.version,
+        "timing": "modelled",
+        "storage": {"write_mbps": storage.write_mbps, "sync_latency_ms": storage.sync_latency_ms},
+        "boot_seconds": boot_seconds,
+        "boot_attempts": boot_attempts,
+        "modelled_phases": {
+            "staging_seconds": staging_seconds,
+            "reboot_seconds": reboot_seconds,
+            "rollback_seconds": rollback_seconds,
+        },
+        "staged_bytes": staged_bytes,
+        "staged_intact": staged_intact,
+        "boots": [initial_boot, *failed_boots, recovery_boot],
+        "booted_version": sysroot.default,
+        "max_rollback_seconds": max_rollback_seconds,
+        "simulation_passed": simulation_passed,
+        "rollback_evidence": "rpm-ostree status" if observed else "simulated",
+        "metrics": {"update_rollback_verified": observed},
+        "status": "passed" if simulation_passed and within_budget else "failed",
+    }
+
+    result_path = output / RESULT_NAME
+    result_path.write_text(json.dumps(results, indent=2))
+    return result_path
+
+
+def parse_args(argv: Iterable[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--update-repo", required=True, type=Path)
+    parser.add_argument("--output", required=True, type=Path)
+    parser.add_argument("--channel", default="stable")
+    parser.add_argument("--write-mbps", type=float, default=None)
+    parser.add_argument("--sync-latency-ms", type=float, default=0.0)
+    parser.add_argument("--boot-seconds", type=float, default=0.0)
+    parser.add_argument("--boot-attempts", type=int, default=DEFAULT_BOOT_ATTEMPTS)
+    parser.add_argument("--max-rollback-seconds", type=float, default=None)
+    parser.add_argument(
+        "--rpm-ostree-status", type=Path, default=None, help="rpm-ostree status --json from the rolled-back device"
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: Iterable[str] | None = None) -> int:
+    args = parse_args(argv)
+    result_path = run_rollback_test(
+        args.update_repo,
+        args.output,
+        channel=args.channel,
+        storage=StorageModel(args.write_mbps, args.sync_latency_ms),
+        boot_seconds=args.boot_seconds,
+        boot_attempts=args.boot_attempts,
+        max_rollback_seconds=args.max_rollback_seconds,
+        rpm_ostree_status=args.rpm_ostree_status,
+    )
+    return 0 if json.loads(result_path.read_text())["status"] == "passed" else 1
+
+
+if __name__ == "__main__":  # pragma: no cover
+    raise SystemExit(main())
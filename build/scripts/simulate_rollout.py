@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""Project mirror egress, uplink load and rollback exposure of a rollout.
+
+The payload size defaults to the commit currently published on the channel in
+``--update-repo``, as stored in that repository; ``--payload-mb`` overrides
+it.  Requires NumPy.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from dataclasses import replace
+from pathlib import Path
+from typing import Iterable
+
+if __package__ in (None, ""):  # pragma: no cover - direct script execution
+    sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from build.scripts.ostree_history import published_commit, read_head
+from evergreen_os_image.rollout import RolloutScenario, simulate_rollout
+
+RESULT_NAME = "rollout-projection.json"
+
+
+def payload_bytes_from_artifacts(update_repo: Path, channel: str = "stable") -> int:
+    """Size of the commit currently published on ``channel`` in ``update_repo``."""
+
+    head = read_head(update_repo, channel)
+    if head is None:
+        raise FileNotFoundError(f"Nothing published on {channel!r} in {update_repo}")
+    commit = published_commit(update_repo, head.current)
+    return sum(path.stat().st_size for path in commit.rglob("*") if path.is_file())
+
+
+def run_simulation(
+    output: Path,
+    scenario_path: Path | None = None,
+    update_repo: Path | None = None,
+    channel: str = "stable",
+    payload_mb: float | None = None,
+    devices: int | None = None,
+    seed: int = 0,
+) -> Path:
+    scenario = RolloutScenario.load(scenario_path)
+    if devices is not None:
+        scenario = replace(scenario, devices=devices)
+
+    payload_bytes = None
+    if payload_mb is not None:
+        payload_bytes = int(payload_mb * 1_000_000)
+    elif update_repo is not None:
+        payload_bytes = payload_bytes_from_artifacts(update_repo, channel)
+
+    projection, _ = simulate_rollout(scenario, payload_bytes, seed=seed)
+    results = projection.to_dict()
+    results["status"] = "failed" if results["mirror_overloaded"] else "passed"
+
+    output.mkdir(parents=True, exist_ok=True)
+    result_path = output / RESULT_NAME
+    result_path.write_text(json.dumps(results, indent=2))
+    return result_path
+
+
+def parse_args(argv: Iterable[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--output", required=True, type=Path)
+    parser.add_argument("--scenario", type=Path, default=None)
+    parser.add_argument("--update-repo", type=Path, default=None)
+    parser.add_argument("--channel", default="stable")
+    parser.add_argument("--payload-mb", type=float, default=None)
+    parser.add_argument("--devices", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args(argv)
+
+
+def main(argv: Iterable[str] | None = None) -> int:
+    args = parse_args(argv)
+    result_path = run_simulation(
+        args.output,
+        args.scenario,
+        args.update_repo,
+        args.channel,
+        args.payload_mb,
+        args.devices,
+        args.seed,
+    )
+    return 0 if json.loads(result_path.read_text())["status"] == "passed" else 1
+
+
+if __name__ == "__main__":  # pragma: no cover
+    raise SystemExit(main())
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""Benchmark indexed USBGuard allowlist matching against sequential evaluation."""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import sys
+from dataclasses import asdict
+from pathlib import Path
+from typing import Iterable, List, Tuple
+
+if __package__ in (None, ""):  # pragma: no cover - direct script execution
+    sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from evergreen_os_image.usbguard import UsbDevice, UsbGuardPolicy, benchmark_matching, parse_rules
+
+RESULT_NAME = "usbguard-benchmark.json"
+INTERFACE_CLASSES = ("03", "08", "09", "0e", "01", "02", "e0")
+
+
+def synthetic_allowlist(rules: int, seed: int = 0) -> Tuple[str, List[UsbDevice]]:
+    """Generate an allowlist resembling a district's approved peripherals.
+
+    Returns the ``rules.conf`` text and a device sample containing approved
+    peripherals, unknown devices and devices that only match by interface.
+    """
+
+    generator = random.Random(seed)
+    lines = ["# Synthetic EvergreenOS allowlist"]
+    approved: List[UsbDevice] = []
+    for index in range(rules):
+        vendor = f"{generator.randrange(0x10000):04x}"
+        product = f"{generator.randrange(0x10000):04x}"
+        interface = f"{generator.choice(INTERFACE_CLASSES)}:{generator.randrange(256):02x}:00"
+        device = UsbDevice(vendor, product, name=f"Peripheral {index}", hash=f"{index:032x}", interfaces=(interface,))
+        approved.append(device)
+        if index % 10 == 0:
+            lines.append(f'allow hash "{device.hash}"')
+        else:
+            lines.append(f'allow id {vendor}:{product} name "{device.name}" with-interface {interface}')
+    lines.append("allow with-interface one-of { 03:00:01 03:01:01 03:01:02 }")
+    lines.append("reject with-interface all-of { 08:*:* 03:*:* }")
+
+    devices = list(approved)
+    for _ in range(rules):
+        vendor = f"{generator.randrange(0x10000):04x}"
+        interface = f"{generator.choice(INTERFACE_CLASSES)}:01:01"
+        devices.append(UsbDevice(vendor, "ffff", hash="unknown", interfaces=(interface,)))
+    generator.shuffle(devices)
+    return "\n".join(lines) + "\n", devices
+
+
+def run_benchmark(output: Path, rules: int = 5000, devices: int = 500, policy: Path | None = None) -> Path:
+    """Benchmark ``policy`` (or a synthetic allowlist) and write the timings."""
+
+    text, sample = synthetic_allowlist(rules)
+    if policy is not None:
+        text = policy.read_text()
+    compiled = UsbGuardPolicy.compile(parse_rules(text), "block")
+    result = benchmark_matching(compiled, sample[:devices])
+
+    output.mkdir(parents=True, exist_ok=True)
+    result_path = output / RESULT_NAME
+    result_path.write_text(json.dumps({**asdict(result), "speedup": result.speedup}, indent=2))
+    return result_path
+
+
+def parse_args(argv: Iterable[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--output", required=True, type=Path)
+    parser.add_argument("--rules", type=int, default=5000)
+    parser.add_argument("--devices", type=int, default=500)
+    parser.add_argument("--policy", type=Path, default=None)
+    return parser.parse_args(argv)
+
+
+def main(argv: Iterable[str] | None = None) -> int:
+    args = parse_args(argv)
+    run_benchmark(args.output, args.rules, args.devices, args.policy)
+    return 0
+
+
+if __name__ == "__main__":  # pragma: no cover
+    raise SystemExit(main())
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""Build EvergreenOS artifacts twice and report any byte differences."""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List
+
+if __package__ in (None, ""):  # pragma: no cover - direct script execution
+    sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from build.scripts.compose import compose
+from build.scripts.create_iso import create_iso
+from build.scripts.create_qemu_image import create_qemu_image
+from build.scripts.publish_ostree import INDEX_NAMES, publish
+from build.scripts.reproducible import SOURCE_DATE_EPOCH
+
+RESULT_NAME = "reproducibility.json"
+UPDATE_REPO = "update-repo"
+
+
+def build_all(root: Path, manifest: Path, kickstart: Path, version: str, gpg_key: str | None) -> None:
+    """Run every artifact stage with output paths relative to ``root``.
+
+    Artifacts record the paths they were built from, so the stages run inside
+    ``root`` with relative paths, the same way CI invokes them.
+    """
+
+    previous = Path.cwd()
+    os.chdir(root)
+    try:
+        ostree = Path("artifacts/ostree")
+        compose(manifest, ostree)
+        create_iso(kickstart, Path("artifacts/iso"))
+        create_qemu_image(ostree, Path("artifacts/qemu"))
+        publish(ostree, Path("artifacts") / UPDATE_REPO, version, gpg_key)
+    finally:
+        os.chdir(previous)
+
+
+def _live_mtime(name: str, path: Path) -> bool:
+    """Whether ``name`` is update repository state whose mtime tracks publishes.
+
+    Directories and index files of the update repository change on every
+    publish; only the stored commits and history records are pinned.
+    """
+
+    in_repo = name == UPDATE_REPO or name.startswith(f"{UPDATE_REPO}/")
+    return in_repo and (path.is_dir() or path.name in INDEX_NAMES)
+
+
+def compare_trees(first: Path, second: Path) -> List[Dict[str, object]]:
+    """Return one entry per path whose bytes or metadata differ."""
+
+    def listing(root: Path) -> Dict[str, Path]:
+        return {str(path.relative_to(root)): path for path in sorted(root.rglob("*"))}
+
+    left, right = listing(first), listing(second)
+    differences: List[Dict[str, object]] = []
+    for name in sorted(set(left) | set(right)):
+        if name not in left or name not in right:
+            differences.append({"path": name, "reason": "missing from " + ("first" if name not in left else "second")})
+            continue
+        a, b = left[name], right[name]
+        if a.is_dir() != b.is_dir():
+            differences.append({"path": name, "reason": "file type differs"})
+            continue
+        stat_a, stat_b = a.stat(), b.stat()
+        if stat_a.st_mode != stat_b.st_mode or (
+            not _live_mtime(name, a) and int(stat_a.st_mtime) != int(stat_b.st_mtime)
+        ):
+            differences.append({"path": name, "reason": "mode or mtime differs"})
+        if a.is_dir():
+            continue
+        data_a, data_b = a.read_bytes(), b.read_bytes()
+        if data_a != data_b:
+            offset = next(
+                (index for index, (x, y) in enumerate(zip(data_a, data_b)) if x != y),
+                min(len(data_a), len(data_b)),
+            )
+            differences.append(
+                {
+                    "path": name,
+                    "reason": "content differs",
+                    "first_difference_offset": offset,
+                    "sizes": [len(data_a), len(data_b)],
+                }
+            )
+    return differences
+
+
+def verify_reproducible(
+    manifest: Path,
+    kickstart: Path,
+    version: str,
+    output: Path,
+    gpg_key: str | None = None,
+    epoch: int | None = None,
+    workdir: Path | None = None,
+) -> Path:
+    """Build twice under one ``SOURCE_DATE_EPOCH`` and write a comparison report."""
+
+    if epoch is None:
+        epoch = int(os.environ.get(SOURCE_DATE_EPOCH) or time.time())
+    manifest, kickstart = manifest.resolve(), kickstart.resolve()
+
+    previous_epoch = os.environ.get(SOURCE_DATE_EPOCH)
+    os.environ[SOURCE_DATE_EPOCH] = str(epoch)
+    try:
+        with tempfile.TemporaryDirectory(dir=workdir) as scratch:
+            roots = [Path(scratch) / "first", Path(scratch) / "second"]
+            for root in roots:
+                root.mkdir()
+                build_all(root, manifest, kickstart, version, gpg_key)
+            differences = compare_trees(roots[0] / "artifacts", roots[1] / "artifacts")
+    finally:
+        if previous_epoch is None:
+            os.environ.pop(SOURCE_DATE_EPOCH, None)
+        else:
+            os.environ[SOURCE_DATE_EPOCH] = previous_epoch
+
+    output.mkdir(parents=True, exist_ok=True)
+    report_path = output / RESULT_NAME
+    report_path.write_text(
+        json.dumps(
+            {
+                "source_date_epoch": epoch,
+                "reproducible": not differences,
+                "differences": differences,
+            },
+            indent=2,
+        )
+    )
+    return report_path
+
+
+def parse_args(argv: Iterable[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--manifest", required=True, type=Path)
+    parser.add_argument("--kickstart", required=True, type=Path)
+    parser.add_argument("--version", required=True)
+    parser.add_argument("--output", required=True, type=Path)
+    parser.add_argument("--gpg-key", default=None)
+    parser.add_argument("--source-date-epoch", type=int, default=None)
+    return parser.parse_args(argv)
+
+
+def main(argv: Iterable[str] | None = None) -> int:
+    args = parse_args(argv)
+    report_path = verify_reproducible(
+        args.manifest,
+        args.kickstart,
+        args.version,
+        args.output,
+        args.gpg_key,
+        args.source_date_epoch,
+    )
+    report = json.loads(report_path.read_text())
+    for difference in report["differences"]:
+        print(f"{difference['path']}: {difference['reason']}", file=sys.stderr)
+    return 0 if report["reproducible"] else 1
+
+
+if __name__ == "__main__":  # pragma: no cover
+    raise SystemExit(main())
@@ -1,8 +1,10 @@
 #!/usr/bin/env bash
 set -euo pipefail
 
-enrollment_payload="/var/lib/evergreen/enrollment.json"
-config_dir="/etc/evergreen/agent"
+# The directories can be overridden so build tooling can run the script unprivileged.
+state_dir="${EVERGREEN_STATE_DIR:-/var/lib/evergreen}"
+enrollment_payload="${state_dir}/enrollment.json"
+config_dir="${EVERGREEN_AGENT_CONFIG_DIR:-/etc/evergreen/agent}"
 config_file="${config_dir}/agent.yaml"
 
 mkdir -p "${config_dir}"
@@ -26,4 +28,4 @@ telemetry:
   enabled: true
 CONFIG
 
-touch /var/lib/evergreen/enrollment.complete
+touch "${state_dir}/enrollment.complete"
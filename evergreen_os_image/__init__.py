@@ -1,26 +1,70 @@
-"""Utilities describing the EvergreenOS image product requirements."""
-
-from .ci import GitHubWorkflow, WorkflowJob, WorkflowStep
-from .compliance import PRDComplianceReport, RequirementStatus
-from .configuration import (
-    ComposeManifest,
-    EnrollmentGreeterSource,
-    FlatpakRemote,
-    FlatpakRemoteConfig,
-    SecurityPolicies,
-)
-from .prd import EvergreenOSPRD
-
-__all__ = [
-    "EvergreenOSPRD",
-    "PRDComplianceReport",
-    "RequirementStatus",
-    "GitHubWorkflow",
-    "WorkflowJob",
-    "WorkflowStep",
-    "ComposeManifest",
-    "EnrollmentGreeterSource",
-    "FlatpakRemote",
-    "FlatpakRemoteConfig",
-    "SecurityPolicies",
-]
+"""Utilities describing the EvergreenOS image product requirements.
+
+Public names are resolved lazily on first access so that tools which only need
+one submodule (such as the ``evergreen-image`` CLI) do not pay for importing
+the whole package.
+"""
+
+from __future__ import annotations
+
+import importlib
+from typing import TYPE_CHECKING, Dict
+
+_EXPORTS: Dict[str, str] = {
+    "EvergreenOSPRD": "prd",
+    "PRDComplianceReport": "compliance",
+    "RequirementStatus": "compliance",
+    "GitHubWorkflow": "ci",
+    "WorkflowJob": "ci",
+    "WorkflowStep": "ci",
+    "AgentDefaults": "configuration",
+    "ComposeManifest": "configuration",
+    "EnrollmentGreeterSource": "configuration",
+    "FlatpakRemote": "configuration",
+    "FlatpakRemoteConfig": "configuration",
+    "SecurityPolicies": "configuration",
+    "FirewallRule": "firewall",
+    "FirewallDiagnostic": "firewall",
+    "FirewallRuleset": "firewall",
+    "EnrollmentPayload": "enrollment",
+    "render_agent_config": "enrollment",
+    "sign_payload": "enrollment",
+    "verify_payload": "enrollment",
+    "ComposeProfile": "profiles",
+    "ComposeProfiles": "profiles",
+    "UsbDevice": "usbguard",
+    "UsbGuardRule": "usbguard",
+    "UsbGuardPolicy": "usbguard",
+}
+
+__all__ = list(_EXPORTS)
+
+if TYPE_CHECKING:  # pragma: no cover - static analysers see eager imports
+    from .ci import GitHubWorkflow, WorkflowJob, WorkflowStep
+    from .compliance import PRDComplianceReport, RequirementStatus
+    from .configuration import (
+        AgentDefaults,
+        ComposeManifest,
+        EnrollmentGreeterSource,
+        FlatpakRemote,
+        FlatpakRemoteConfig,
+        SecurityPolicies,
+    )
+    from .enrollment import EnrollmentPayload, render_agent_config, sign_payload, verify_payload
+    from .firewall import FirewallDiagnostic, FirewallRule, FirewallRuleset
+    from .prd import EvergreenOSPRD
+    from .profiles import ComposeProfile, ComposeProfiles
+    from .usbguard import UsbDevice, UsbGuardPolicy, UsbGuardRule
+
+
+def __getattr__(name: str) -> object:
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module_name}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted(set(globals()) | set(__all__))
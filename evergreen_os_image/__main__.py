@@ -0,0 +1,5 @@
+"""Allow ``python -m evergreen_os_image`` to run the ``evergreen-image`` CLI."""
+
+from .cli import main
+
+raise SystemExit(main())
@@ -0,0 +1,629 @@
+"""Audit EvergreenOS artifacts statically, without booting them.
+
+A composed tree, an installer ISO and a QEMU qcow2 image are opened directly.
+Trees and ISOs are represented by an :class:`ImageIndex` of their file table,
+which is only built when a check first needs it.  ISOs are read through a
+memory map, so indexing walks just the directory extents and reads only the
+files a check actually opens, however large the image is.  The index of a
+tree, or of an ISO whose root is the OS root, is checked against
+:class:`ComposeManifest`, :class:`SecurityPolicies` and the unit files under
+``configs/services``.
+
+The OS in an installer ISO lives in ``images/install.img`` or
+``LiveOS/squashfs.img`` and in the ostree commit it deploys.  Those payloads
+are not unpacked, so installer ISOs are only checked for the files the media
+itself carries: the kickstart and what it copies from ``/run/install/repo``.
+qcow2 images are likewise audited at the container level only (header,
+backing file, encryption and consistency flags).  The OS contents of both are
+covered by auditing the composed tree they are built from.  A truncated or
+malformed ISO is reported as an ``iso_structure`` finding.
+"""
+
+from __future__ import annotations
+
+import fnmatch
+import mmap
+import os
+import sqlite3
+import struct
+import tempfile
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from functools import cached_property
+from pathlib import Path, PurePosixPath
+from typing import Dict, Iterable, Iterator, List, Mapping, Tuple
+
+from .configuration import REPO_ROOT, ComposeManifest, SecurityPolicies
+
+SECTOR_SIZE = 2048
+QCOW2_MAGIC = b"QFI\xfb"
+RPMDB_PATHS = (
+    "/usr/lib/sysimage/rpm/rpmdb.sqlite",
+    "/usr/share/rpm/rpmdb.sqlite",
+    "/var/lib/rpm/rpmdb.sqlite",
+)
+UNIT_DIRECTORIES = ("/etc/systemd/system", "/usr/lib/systemd/system")
+# In order of precedence: a preset file overrides one of the same name in a later directory.
+PRESET_DIRECTORIES = (
+    "/etc/systemd/system-preset",
+    "/usr/local/lib/systemd/system-preset",
+    "/usr/lib/systemd/system-preset",
+)
+INSTALLER_PAYLOADS = ("/images/install.img", "/liveos/squashfs.img")
+# Files on installer media, keyed by ISO path, and the repository copy each must match.
+INSTALLER_MEDIA_FILES = {
+    "/ks.cfg": "build/iso/evergreen.ks",
+    "/configs/defaults/evergreen-agent.yaml": "configs/defaults/evergreen-agent.yaml",
+    "/build/scripts/write_agent_config.sh": "build/scripts/write_agent_config.sh",
+}
+
+
+@dataclass(frozen=True)
+class FileEntry:
+    """One entry of an image's file table."""
+
+    path: str
+    size: int
+    is_dir: bool = False
+    symlink: str | None = None
+    offset: int = 0
+
+
+class ImageIndex(ABC):
+    """Lazily built file table of an artifact, keyed by absolute path."""
+
+    def __init__(self, source: Path) -> None:
+        self.source = source
+
+    @cached_property
+    def entries(self) -> Mapping[str, FileEntry]:
+        return {entry.path: entry for entry in self._scan()}
+
+    @abstractmethod
+    def _scan(self) -> Iterator[FileEntry]:
+        """Yield every entry of the artifact's file table."""
+
+    @abstractmethod
+    def read(self, path: str) -> bytes:
+        """Return the contents of the file at ``path``."""
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self) -> "ImageIndex":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def get(self, path: str) -> FileEntry | None:
+        return self.entries.get(path)
+
+    def find(self, path: str) -> str | None:
+        """The indexed path equal to ``path`` ignoring case, for plain ISO 9660 names."""
+
+        if path in self.entries:
+            return path
+        folded = path.lower()
+        return next((candidate for candidate in self.entries if candidate.lower() == folded), None)
+
+    def exists(self, path: str) -> bool:
+        return path in self.entries
+
+    def glob(self, pattern: str) -> List[str]:
+        return sorted(path for path in self.entries if fnmatch.fnmatchcase(path, pattern))
+
+    def read_text(self, path: str) -> str:
+        return self.read(path).decode("utf-8", errors="replace")
+
+    def packages(self) -> Tuple[str, ...] | None:
+        """Installed package names from the RPM database, else from ``*.rpm`` files."""
+
+        for path in RPMDB_PATHS:
+            if self.exists(path):
+                return _rpmdb_names(self, path)
+        rpm_files = [path for path in self.entries if path.endswith(".rpm")]
+        if not rpm_files:
+            return None
+        return tuple(sorted({PurePosixPath(path).name.rsplit("-", 2)[0] for path in rpm_files}))
+
+
+class DirectoryIndex(ImageIndex):
+    """File table of a composed tree on disk."""
+
+    def _scan(self) -> Iterator[FileEntry]:
+        root = self.source
+        for directory, dirnames, filenames in os.walk(root):
+            relative = os.path.relpath(directory, root)
+            base = "" if relative == "." else "/" + relative.replace(os.sep, "/")
+            for name in sorted(dirnames + filenames):
+                full = os.path.join(directory, name)
+                path = f"{base}/{name}"
+                if os.path.islink(full):
+                    yield FileEntry(path, 0, symlink=os.readlink(full))
+                elif name in dirnames:
+                    yield FileEntry(path, 0, is_dir=True)
+                else:
+                    yield FileEntry(path, os.path.getsize(full))
+
+    def read(self, path: str) -> bytes:
+        return self.local_path(path).read_bytes()
+
+    def local_path(self, path: str) -> Path:
+        return self.source / path.lstrip("/")
+
+
+class Iso9660Index(ImageIndex):
+    """File table of an ISO 9660 image, read through a memory map.
+
+    Rock Ridge ``NM`` (long names) and ``SL`` (symlinks) entries are honoured.
+    Plain ISO 9660 names are lower-cased and lose their ``;1`` version.
+    Building the table raises ``ValueError`` if the image is truncated or a
+    directory record is malformed.
+    """
+
+    @cached_property
+    def _map(self) -> mmap.mmap:
+        with self.source.open("rb") as stream:
+            return mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self) -> None:
+        if "_map" in self.__dict__:
+            self.__dict__.pop("_map").close()
+
+    def _scan(self) -> Iterator[FileEntry]:
+        if not is_iso9660(self.source):
+            raise ValueError(f"{self.source} is not an ISO 9660 image")
+        view = self._map
+        descriptor = 16 * SECTOR_SIZE
+        while True:
+            if descriptor + SECTOR_SIZE > len(view):
+                raise ValueError(f"{self.source} is truncated before its primary volume descriptor")
+            if view[descriptor] == 1:
+                break
+            if view[descriptor] == 255:
+                raise ValueError(f"{self.source} has no primary volume descriptor")
+            descriptor += SECTOR_SIZE
+        root = view[descriptor + 156 : descriptor + 190]
+        extent, size = struct.unpack_from("<I", root, 2)[0], struct.unpack_from("<I", root, 10)[0]
+
+        pending = [("", extent, size)]
+        seen = set()
+        while pending:
+            parent, extent, size = pending.pop()
+            if extent in seen:
+                continue
+            seen.add(extent)
+            for entry, child_extent in self._directory(parent, extent, size):
+                yield entry
+                if entry.is_dir:
+                    pending.append((entry.path, child_extent, entry.size))
+
+    def _directory(self, parent: str, extent: int, size: int) -> Iterator[Tuple[FileEntry, int]]:
+        view = self._map
+        position, end = extent * SECTOR_SIZE, extent * SECTOR_SIZE + size
+        if end > len(view):
+            raise ValueError(f"{self.source} is truncated: directory {parent or '/'} extends past the end of the image")
+        while position < end:
+            length = view[position]
+            if length == 0:
+                position = (position // SECTOR_SIZE + 1) * SECTOR_SIZE
+                continue
+            if length < 34 or position + length > end:
+                raise ValueError(f"{self.source} has a malformed directory record at byte {position}")
+            record = view[position : position + length]
+            position += length
+
+            name_length = record[32]
+            raw_name = record[33 : 33 + name_length]
+            if raw_name in (b"\x00", b"\x01"):
+                continue
+            system_use = record[33 + name_length + (1 - name_length % 2) :]
+            name, symlink = _rock_ridge(system_use)
+            if name is None:
+                name = raw_name.decode("ascii", errors="replace").split(";")[0].rstrip(".").lower()
+
+            child_extent = struct.unpack_from("<I", record, 2)[0]
+            data_length = struct.unpack_from("<I", record, 10)[0]
+            entry = FileEntry(
+                path=f"{parent}/{name}",
+                size=data_length,
+                is_dir=bool(record[25] & 0x02),
+                symlink=symlink,
+                offset=child_extent * SECTOR_SIZE,
+            )
+            if not entry.is_dir and entry.symlink is None and entry.offset + entry.size > len(view):
+                raise ValueError(f"{self.source} is truncated: {entry.path} extends past the end of the image")
+            yield entry, child_extent
+
+    def read(self, path: str) -> bytes:
+        entry = self.entries.get(path)
+        if entry is None or entry.is_dir:
+            raise FileNotFoundError(f"{path} not found in {self.source}")
+        return self._map[entry.offset : entry.offset + entry.size]
+
+
+def _rock_ridge(system_use: bytes) -> Tuple[str | None, str | None]:
+    """Extract the Rock Ridge name and symlink target from a system use area."""
+
+    name_parts: List[bytes] = []
+    link_parts: List[str] = []
+    position = 0
+    while position + 4 <= len(system_use):
+        signature = system_use[position : position + 2]
+        length = system_use[position + 2]
+        if length < 4:
+            break
+        data = system_use[position + 4 : position + length]
+        if signature == b"NM" and data and not data[0] & 0x06:
+            name_parts.append(data[1:])
+        elif signature == b"SL" and data:
+            components = data[1:]
+            while len(components) >= 2:
+                flags, size = components[0], components[1]
+                text = components[2 : 2 + size].decode("utf-8", errors="replace")
+                link_parts.append("" if flags & 0x08 else ".." if flags & 0x04 else "." if flags & 0x02 else text)
+                components = components[2 + size :]
+        elif signature == b"ST":
+            break
+        position += length
+
+    name = b"".join(name_parts).decode("utf-8", errors="replace") if name_parts else None
+    link = "/".join(link_parts) if link_parts else None
+    if link == "":
+        link = "/"
+    return name, link
+
+
+def _rpmdb_names(index: ImageIndex, path: str) -> Tuple[str, ...]:
+    """Package names from an rpm sqlite database's ``Name`` index table."""
+
+    if isinstance(index, DirectoryIndex):
+        return _query_names(index.local_path(path))
+    with tempfile.NamedTemporaryFile(suffix=".sqlite") as copy:
+        copy.write(index.read(path))
+        copy.flush()
+        return _query_names(Path(copy.name))
+
+
+def _query_names(database: Path) -> Tuple[str, ...]:
+    connection = sqlite3.connect(f"file:{database}?mode=ro", uri=True)
+    try:
+        rows = connection.execute("SELECT DISTINCT key FROM Name").fetchall()
+    finally:
+        connection.close()
+    return tuple(sorted(str(row[0]) for row in rows))
+
+
+def is_iso9660(path: Path) -> bool:
+    with path.open("rb") as stream:
+        stream.seek(16 * SECTOR_SIZE + 1)
+        return stream.read(5) == b"CD001"
+
+
+@dataclass(frozen=True)
+class Qcow2Header:
+    """Fields of a qcow2 header relevant to a release audit."""
+
+    version: int
+    virtual_size: int
+    cluster_bits: int
+    crypt_method: int
+    backing_file: str | None
+    incompatible_features: int = 0
+
+    @classmethod
+    def read(cls, path: Path) -> "Qcow2Header":
+        with path.open("rb") as stream, mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            if len(view) < 72 or view[:4] != QCOW2_MAGIC:
+                raise ValueError(f"{path} is not a qcow2 image")
+            version, backing_offset, backing_size, cluster_bits, size, crypt = struct.unpack_from(
+                ">IQIIQI", view, 4
+            )
+            features = struct.unpack_from(">Q", view, 72)[0] if version >= 3 and len(view) >= 80 else 0
+            backing = (
+                view[backing_offset : backing_offset + backing_size].decode("utf-8", errors="replace")
+                if backing_offset
+                else None
+            )
+        return cls(version, size, cluster_bits, crypt, backing, features)
+
+
+@dataclass(frozen=True)
+class AuditFinding:
+    """Outcome of one static check."""
+
+    check: str
+    passed: bool
+    details: str
+
+
+@dataclass(frozen=True)
+class AuditReport:
+    """All findings for one artifact."""
+
+    artifact: str
+    kind: str
+    findings: Tuple[AuditFinding, ...]
+
+    @property
+    def passed(self) -> bool:
+        return all(finding.passed for finding in self.findings)
+
+    def failures(self) -> Tuple[AuditFinding, ...]:
+        return tuple(finding for finding in self.findings if not finding.passed)
+
+
+def _unit_paths(unit: str) -> Tuple[str, ...]:
+    return tuple(f"{directory}/{unit}" for directory in UNIT_DIRECTORIES)
+
+
+def _preset_files(index: ImageIndex) -> List[str]:
+    """Preset files in the order systemd reads them: by file name, earlier directories winning."""
+
+    by_name: Dict[str, str] = {}
+    for directory in PRESET_DIRECTORIES:
+        for path in index.glob(f"{directory}/*.preset"):
+            by_name.setdefault(PurePosixPath(path).name, path)
+    return [by_name[name] for name in sorted(by_name)]
+
+
+def _preset_rule(index: ImageIndex, unit: str) -> Tuple[str, str] | None:
+    """The first preset line matching ``unit``, as ``(verb, file)``."""
+
+    for path in _preset_files(index):
+        for line in index.read_text(path).splitlines():
+            words = line.split()
+            if len(words) < 2 or words[0].startswith(("#", ";")):
+                continue
+            if fnmatch.fnmatchcase(unit, words[1]):
+                return words[0], path
+    return None
+
+
+def _unit_enabled(index: ImageIndex, unit: str) -> Tuple[bool, str]:
+    """Whether ``unit`` starts at boot, with the reason.
+
+    A ``.wants``/``.requires`` link in ``/etc`` or ``/usr/lib`` enables the
+    unit.  Otherwise the first matching preset rule across all preset files
+    decides; a unit no rule matches is enabled, as ``systemctl preset`` does.
+    """
+
+    if _masked(index, unit):
+        return False, "Masked."
+    for directory in UNIT_DIRECTORIES:
+        links = index.glob(f"{directory}/*.wants/{unit}") + index.glob(f"{directory}/*.requires/{unit}")
+        if links:
+            return True, f"Enabled by {links[0]}."
+    rule = _preset_rule(index, unit)
+    if rule is None:
+        return True, "Enabled by default; no preset rule matches."
+    verb, path = rule
+    if verb == "enable":
+        return True, f"Enabled by {path}."
+    return False, f"Not enabled: first matching preset rule is {verb!r} in {path}."
+
+
+def _masked(index: ImageIndex, unit: str) -> bool:
+    entry = index.get(f"/etc/systemd/system/{unit}")
+    return entry is not None and (entry.symlink == "/dev/null" or (entry.size == 0 and not entry.is_dir))
+
+
+def _config_value(text: str, key: str) -> str | None:
+    for line in text.splitlines():
+        name, separator, value = line.partition("=")
+        if separator and name.strip() == key:
+            return value.strip()
+    return None
+
+
+def audit_index(
+    index: ImageIndex,
+    manifest: ComposeManifest | None = None,
+    policies: SecurityPolicies | None = None,
+    services_dir: Path | None = None,
+    kind: str = "tree",
+) -> AuditReport:
+    """Check an image's file table against the manifest, policies and units."""
+
+    manifest = manifest or ComposeManifest.load()
+    policies = policies or SecurityPolicies.load()
+    services_dir = services_dir or REPO_ROOT / "configs" / "services"
+    findings: List[AuditFinding] = []
+
+    packages = index.packages()
+    if packages is None:
+        findings.append(AuditFinding("packages", False, "No RPM database or RPM files found."))
+    else:
+        installed = set(packages)
+        missing = [name for name in manifest.packages_install if name not in installed]
+        present = [name for name in manifest.packages_remove if name in installed]
+        findings.append(
+            AuditFinding(
+                "packages_installed",
+                not missing,
+                f"Missing: {', '.join(missing)}" if missing else "All manifest packages are installed.",
+            )
+        )
+        findings.append(
+            AuditFinding(
+                "packages_removed",
+                not present,
+                f"Still present: {', '.join(present)}" if present else "Removed packages are absent.",
+            )
+        )
+
+    for unit_file in sorted(services_dir.glob("*.service")):
+        unit = unit_file.name
+        shipped = next((path for path in _unit_paths(unit) if index.exists(path)), None)
+        if shipped is None:
+            findings.append(AuditFinding(f"unit:{unit}", False, "Unit file is missing from the image."))
+            continue
+        matches = index.read(shipped) == unit_file.read_bytes()
+        findings.append(
+            AuditFinding(
+                f"unit:{unit}",
+                matches,
+                f"{shipped} matches configs/services." if matches else f"{shipped} differs from configs/services.",
+            )
+        )
+
+    for unit in manifest.systemd_enable:
+        enabled, details = _unit_enabled(index, unit)
+        findings.append(AuditFinding(f"enabled:{unit}", enabled, details))
+
+    masked_units = list(manifest.systemd_mask)
+    if not policies.ssh_enabled and "sshd.service" not in masked_units:
+        masked_units.append("sshd.service")
+    for unit in masked_units:
+        masked = _masked(index, unit)
+        findings.append(
+            AuditFinding(f"masked:{unit}", masked, "Masked." if masked else "Not masked to /dev/null.")
+        )
+
+    selinux = index.read_text("/etc/selinux/config") if index.exists("/etc/selinux/config") else ""
+    mode = _config_value(selinux, "SELINUX")
+    findings.append(
+        AuditFinding(
+            "selinux",
+            mode == policies.selinux_mode,
+            f"SELINUX={mode}" if mode else "/etc/selinux/config does not set SELINUX.",
+        )
+    )
+
+    usbguard_config = "/etc/usbguard/usbguard-daemon.conf"
+    target = (
+        _config_value(index.read_text(usbguard_config), "ImplicitPolicyTarget")
+        if index.exists(usbguard_config)
+        else None
+    )
+    findings.append(
+        AuditFinding(
+            "usbguard",
+            index.exists(policies.usbguard_policy_path) and target == policies.usbguard_default_policy,
+            f"Rules at {policies.usbguard_policy_path}: {index.exists(policies.usbguard_policy_path)};"
+            f" ImplicitPolicyTarget={target}",
+        )
+    )
+
+    return AuditReport(artifact=str(index.source), kind=kind, findings=tuple(findings))
+
+
+def installer_payload(index: ImageIndex) -> str | None:
+    """Path of the installer or live payload in an ISO index, if it has one."""
+
+    return next((found for path in INSTALLER_PAYLOADS if (found := index.find(path)) is not None), None)
+
+
+def audit_installer_media(index: ImageIndex, payload: str, repo_root: Path | None = None) -> AuditReport:
+    """Check the files an installer ISO carries outside its OS payload.
+
+    The kickstart and the files it copies from the media must match their
+    repository copies.  ``payload`` itself is not unpacked; the OS it installs
+    is audited from the composed tree.
+    """
+
+    repo_root = repo_root or REPO_ROOT
+    findings = [
+        AuditFinding(
+            "installer_payload",
+            True,
+            f"Found {payload}; its contents are audited from the composed tree, not from the ISO.",
+        )
+    ]
+    for path, relative in INSTALLER_MEDIA_FILES.items():
+        shipped = index.find(path)
+        if shipped is None:
+            findings.append(AuditFinding(f"media:{path}", False, "Missing from the installer media."))
+            continue
+        matches = index.read(shipped) == (repo_root / relative).read_bytes()
+        findings.append(
+            AuditFinding(f"media:{path}", matches, f"Matches {relative}." if matches else f"Differs from {relative}.")
+        )
+    return AuditReport(artifact=str(index.source), kind="installer-iso", findings=tuple(findings))
+
+
+def audit_qcow2(path: Path) -> AuditReport:
+    """Check that a qcow2 image is self-contained, unencrypted and consistent.
+
+    Only the qcow2 header is read; the guest filesystems are not audited.
+    """
+
+    try:
+        header = Qcow2Header.read(path)
+    except ValueError as error:
+        return AuditReport(str(path), "qcow2", (AuditFinding("qcow2_header", False, str(error)),))
+
+    findings = (
+        AuditFinding("qcow2_header", header.version in (2, 3), f"qcow2 version {header.version}."),
+        AuditFinding(
+            "qcow2_backing_file",
+            header.backing_file is None,
+            "Self-contained." if header.backing_file is None else f"Depends on {header.backing_file}.",
+        ),
+        AuditFinding(
+            "qcow2_encryption",
+            header.crypt_method == 0,
+            "Unencrypted; disk encryption happens in the guest via LUKS2."
+            if header.crypt_method == 0
+            else f"qcow2-level encryption method {header.crypt_method}.",
+        ),
+        AuditFinding(
+            "qcow2_consistency",
+            not header.incompatible_features & 0b11,
+            "Clean." if not header.incompatible_features & 0b11 else "Image is marked dirty or corrupt.",
+        ),
+        AuditFinding(
+            "qcow2_virtual_size",
+            header.virtual_size > 0 and 9 <= header.cluster_bits <= 21,
+            f"{header.virtual_size} bytes in {1 << header.cluster_bits}-byte clusters.",
+        ),
+    )
+    return AuditReport(str(path), "qcow2", findings)
+
+
+def audit_artifact(path: Path, **options: object) -> AuditReport:
+    """Audit a tree, ISO or qcow2 image, detected from its contents."""
+
+    if path.is_dir():
+        return audit_index(DirectoryIndex(path), kind="tree", **options)  # type: ignore[arg-type]
+    if not path.is_file():
+        raise FileNotFoundError(f"Artifact not found: {path}")
+    with path.open("rb") as stream:
+        magic = stream.read(4)
+    if magic == QCOW2_MAGIC:
+        return audit_qcow2(path)
+    if path.stat().st_size > 16 * SECTOR_SIZE and is_iso9660(path):
+        with Iso9660Index(path) as index:
+            try:
+                payload = installer_payload(index)
+            except ValueError as error:
+                return AuditReport(str(path), "iso", (AuditFinding("iso_structure", False, str(error)),))
+            if payload is not None:
+                return audit_installer_media(index, payload)
+            return audit_index(index, kind="iso", **options)  # type: ignore[arg-type]
+    return AuditReport(
+        str(path), "unknown", (AuditFinding("format", False, "Not a directory, ISO 9660 or qcow2 image."),)
+    )
+
+
+def audit_artifacts(paths: Iterable[Path], **options: object) -> Dict[str, AuditReport]:
+    return {str(path): audit_artifact(path, **options) for path in paths}
+
+
+__all__ = [
+    "AuditFinding",
+    "AuditReport",
+    "DirectoryIndex",
+    "FileEntry",
+    "ImageIndex",
+    "Iso9660Index",
+    "Qcow2Header",
+    "audit_artifact",
+    "audit_artifacts",
+    "audit_index",
+    "audit_installer_media",
+    "audit_qcow2",
+    "installer_payload",
+    "is_iso9660",
+]
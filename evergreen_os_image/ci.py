@@ -7,7 +7,7 @@ from dataclasses import dataclass
 from pathlib import Path
 from typing import Dict, Mapping, Tuple
 
-from .configuration import REPO_ROOT
+from .configuration import REPO_ROOT, cached_loader
 
 
 @dataclass(frozen=True)
@@ -38,11 +38,11 @@ class GitHubWorkflow:
     jobs: Mapping[str, WorkflowJob]
 
     @classmethod
-    def load_default(cls, path: Path | None = None) -> "GitHubWorkflow":
+    @cached_loader
+    def load_default(cls, path: Path = REPO_ROOT / ".github" / "workflows" / "build.yml") -> "GitHubWorkflow":
         """Load the default EvergreenOS workflow from disk."""
 
-        workflow_path = path or REPO_ROOT / ".github" / "workflows" / "build.yml"
-        data = json.loads(workflow_path.read_text())
+        data = json.loads(path.read_text())
 
         jobs: Dict[str, WorkflowJob] = {}
         for identifier, job_data in data.get("jobs", {}).items():
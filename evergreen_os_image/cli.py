@@ -0,0 +1,296 @@
+"""Single ``evergreen-image`` entry point for the EvergreenOS build tooling.
+
+Every subcommand maps to the ``main`` function of an existing build script,
+which is imported only when that subcommand runs.  ``evergreen-image serve``
+starts a daemon on a Unix socket that keeps those modules imported and parsed
+configuration cached; ``--daemon SOCKET`` (or ``EVERGREEN_IMAGE_DAEMON``)
+forwards a command to it and falls back to running in-process when no daemon
+is listening.
+"""
+
+from __future__ import annotations
+
+import argparse
+import importlib
+import io
+import json
+import os
+import socket
+import socketserver
+import stat
+import sys
+import time
+from contextlib import redirect_stderr, redirect_stdout
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Mapping, Sequence, Tuple
+
+from .configuration import REPO_ROOT, enable_config_cache
+
+PROG = "evergreen-image"
+DAEMON_ENV = "EVERGREEN_IMAGE_DAEMON"
+# Client environment variables that change build output and must therefore
+# apply to commands executed by the daemon.
+FORWARDED_ENV = ("SOURCE_DATE_EPOCH",)
+
+COMMANDS: Mapping[str, Tuple[str, str]] = {
+    "compose": ("build.scripts.compose:main", "Compose the rpm-ostree tree"),
+    "prefetch": ("build.scripts.prefetch_rpms:main", "Prefetch compose RPMs into the cache"),
+    "iso": ("build.scripts.create_iso:main", "Generate installer media"),
+    "qemu-image": ("build.scripts.create_qemu_image:main", "Produce the QEMU test image"),
+    "publish": ("build.scripts.publish_ostree:main", "Publish OSTree update channels"),
+    "smoke": ("build.scripts.qemu_smoke:main", "Run the QEMU smoke test"),
+    "rollback-test": ("build.scripts.rollback_harness:main", "Time an update and automatic rollback"),
+    "verify-reproducible": ("build.scripts.verify_reproducible:main", "Build twice and compare bytes"),
+    "audit": ("build.scripts.audit_image:main", "Audit artifacts without booting them"),
+    "firewall": ("build.scripts.compile_firewall:main", "Compile the firewall ruleset"),
+    "enrollment-load": ("build.scripts.enrollment_load:main", "Load test enrollment"),
+    "usbguard-benchmark": ("build.scripts.usbguard_benchmark:main", "Benchmark USBGuard matching"),
+    "rollout": ("build.scripts.simulate_rollout:main", "Simulate a fleet update rollout"),
+    "compliance": ("evergreen_os_image.cli:compliance_main", "Report PRD compliance"),
+}
+
+
+def compliance_main(argv: Iterable[str] | None = None) -> int:
+    """Print the PRD compliance report; ``--strict`` fails on any gap."""
+
+    parser = argparse.ArgumentParser(prog=f"{PROG} compliance", description="Report PRD compliance")
+    parser.add_argument("--strict", action="store_true")
+    parser.add_argument(
+        "--low-memory-smoke", type=Path, default=None, help="smoke-results.json of the chromebook-lowmem boot"
+    )
+    args = parser.parse_args(argv)
+
+    from .compliance import PRDComplianceReport
+
+    report = PRDComplianceReport.current_state(args.low_memory_smoke)
+    for status in report.statuses:
+        marker = "ok" if status.implemented else "missing"
+        print(f"{marker:8} {status.identifier}: {status.details}")
+    return 1 if args.strict and not report.fully_compliant else 0
+
+
+def _resolve(command: str) -> Tuple[Callable[[List[str]], int], float]:
+    """Import the command implementation, returning it with the import time."""
+
+    target, _ = COMMANDS[command]
+    module_name, _, attribute = target.partition(":")
+    if module_name.startswith("build.") and str(REPO_ROOT) not in sys.path:
+        sys.path.append(str(REPO_ROOT))
+    started = time.perf_counter()
+    module = importlib.import_module(module_name)
+    return getattr(module, attribute), time.perf_counter() - started
+
+
+def run_command(command: str, args: Sequence[str]) -> Tuple[int, Dict[str, float]]:
+    """Run one subcommand in-process and return its exit code and timings."""
+
+    entry_point, import_seconds = _resolve(command)
+    started = time.perf_counter()
+    try:
+        exit_code = entry_point(list(args))
+    except SystemExit as exit_:
+        exit_code = exit_.code if isinstance(exit_.code, int) else (0 if exit_.code is None else 1)
+        if isinstance(exit_.code, str):
+            print(exit_.code, file=sys.stderr)
+    except (OSError, KeyError, ValueError, RuntimeError) as error:
+        print(f"{PROG} {command}: error: {error}", file=sys.stderr)
+        exit_code = 1
+    timings = {
+        "import_ms": import_seconds * 1000,
+        "command_ms": (time.perf_counter() - started) * 1000,
+    }
+    return int(exit_code or 0), timings
+
+
+def _error_response(message: str, exit_code: int = 2) -> Dict[str, object]:
+    return {"exit_code": exit_code, "stdout": "", "stderr": f"{PROG}: {message}\n", "timings": {}}
+
+
+class _DaemonHandler(socketserver.StreamRequestHandler):
+    def handle(self) -> None:
+        # Every request gets a JSON reply, so clients never see a bare EOF.
+        try:
+            request = json.loads(self.rfile.readline() or b"{}")
+            if not isinstance(request, dict):
+                raise ValueError("request must be a JSON object")
+            if request.get("shutdown"):
+                self.server.stopping = True  # type: ignore[attr-defined]
+                response: Dict[str, object] = {"exit_code": 0, "stdout": "", "stderr": "", "timings": {}}
+            elif "command" not in request:
+                response = _error_response("request has no command")
+            else:
+                response = _run_captured(
+                    str(request["command"]), request.get("args", []), request.get("cwd"), request.get("env", {})
+                )
+        except ValueError as error:
+            response = _error_response(f"malformed request: {error}")
+        except Exception as error:  # the daemon must outlive a failing command
+            response = _error_response(f"daemon error: {type(error).__name__}: {error}", exit_code=1)
+        try:
+            self.wfile.write(json.dumps(response).encode() + b"\n")
+        except OSError:
+            pass
+
+
+def _run_captured(
+    command: str, args: Sequence[str], cwd: str | None, env: Mapping[str, str]
+) -> Dict[str, object]:
+    stdout, stderr = io.StringIO(), io.StringIO()
+    previous = os.getcwd()
+    previous_env = {name: os.environ.get(name) for name in FORWARDED_ENV}
+    try:
+        if cwd:
+            os.chdir(cwd)
+        for name in FORWARDED_ENV:
+            if name in env:
+                os.environ[name] = env[name]
+            else:
+                os.environ.pop(name, None)
+        with redirect_stdout(stdout), redirect_stderr(stderr):
+            if command not in COMMANDS:
+                print(f"{PROG}: unknown command {command!r}", file=sys.stderr)
+                exit_code, timings = 2, {}
+            else:
+                exit_code, timings = run_command(command, args)
+    finally:
+        os.chdir(previous)
+        for name, value in previous_env.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+    return {"exit_code": exit_code, "stdout": stdout.getvalue(), "stderr": stderr.getvalue(), "timings": timings}
+
+
+def serve(socket_path: Path) -> None:
+    """Serve commands on ``socket_path`` until a shutdown request arrives.
+
+    Requests are handled one at a time because commands run in-process and
+    share the working directory and standard streams.
+    """
+
+    enable_config_cache()
+    for command in COMMANDS:
+        _resolve(command)
+
+    _remove_stale_socket(socket_path)
+    # Create the socket owner-only; commands run with the daemon's privileges.
+    previous_umask = os.umask(0o177)
+    try:
+        server = socketserver.UnixStreamServer(str(socket_path), _DaemonHandler)
+    finally:
+        os.umask(previous_umask)
+    os.chmod(socket_path, 0o600)
+    with server:
+        server.stopping = False  # type: ignore[attr-defined]
+        try:
+            while not server.stopping:  # type: ignore[attr-defined]
+                server.handle_request()
+        finally:
+            socket_path.unlink(missing_ok=True)
+
+
+def _remove_stale_socket(socket_path: Path) -> None:
+    """Remove a socket left by a dead daemon; refuse to replace a live one."""
+
+    try:
+        mode = socket_path.lstat().st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise RuntimeError(f"{socket_path} exists and is not a socket")
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(str(socket_path))
+    except ConnectionRefusedError:
+        socket_path.unlink()
+    else:
+        raise RuntimeError(f"A daemon is already listening on {socket_path}")
+    finally:
+        probe.close()
+
+
+def request_daemon(socket_path: Path, payload: Mapping[str, object]) -> Dict[str, object] | None:
+    """Send one request to a running daemon; ``None`` if none is listening."""
+
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(str(socket_path))
+    except (FileNotFoundError, ConnectionRefusedError):
+        client.close()
+        return None
+    with client, client.makefile("rwb") as stream:
+        stream.write(json.dumps(payload).encode() + b"\n")
+        stream.flush()
+        reply = stream.readline()
+    if not reply:
+        return _error_response("daemon closed the connection without replying", exit_code=1)
+    return json.loads(reply)
+
+
+def _print_timings(timings: Mapping[str, float], mode: str) -> None:
+    print(
+        f"{PROG}: import {timings.get('import_ms', 0.0):.1f} ms, "
+        f"command {timings.get('command_ms', 0.0):.1f} ms ({mode})",
+        file=sys.stderr,
+    )
+
+
+def parse_args(argv: Iterable[str] | None = None) -> argparse.Namespace:
+    epilog = "commands:\n" + "\n".join(
+        f"  {name:20} {description}" for name, (_, description) in COMMANDS.items()
+    )
+    epilog += "\n  serve                Run a warm daemon on --daemon SOCKET"
+    parser = argparse.ArgumentParser(
+        prog=PROG,
+        description="EvergreenOS image build tooling.",
+        epilog=epilog,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("--daemon", type=Path, metavar="SOCKET", default=os.environ.get(DAEMON_ENV))
+    parser.add_argument("--timings", action="store_true", help="report import and command latency")
+    parser.add_argument("command", choices=[*COMMANDS, "serve", "shutdown"], metavar="command")
+    parser.add_argument("args", nargs=argparse.REMAINDER)
+    return parser.parse_args(argv)
+
+
+def main(argv: Iterable[str] | None = None) -> int:
+    args = parse_args(argv)
+
+    if args.command in {"serve", "shutdown"}:
+        if args.daemon is None:
+            print(f"{PROG}: {args.command} requires --daemon SOCKET or ${DAEMON_ENV}", file=sys.stderr)
+            return 2
+        if args.command == "serve":
+            try:
+                serve(Path(args.daemon))
+            except RuntimeError as error:
+                print(f"{PROG} serve: error: {error}", file=sys.stderr)
+                return 1
+            return 0
+        return 0 if request_daemon(Path(args.daemon), {"shutdown": True}) is not None else 1
+
+    if args.daemon is not None:
+        response = request_daemon(
+            Path(args.daemon),
+            {
+                "command": args.command,
+                "args": args.args,
+                "cwd": os.getcwd(),
+                "env": {name: os.environ[name] for name in FORWARDED_ENV if name in os.environ},
+            },
+        )
+        if response is not None:
+            sys.stdout.write(str(response["stdout"]))
+            sys.stderr.write(str(response["stderr"]))
+            if args.timings:
+                _print_timings(response.get("timings", {}), "daemon")  # type: ignore[arg-type]
+            return int(response["exit_code"])  # type: ignore[arg-type]
+
+    exit_code, timings = run_command(args.command, args.args)
+    if args.timings:
+        _print_timings(timings, "in-process")
+    return exit_code
+
+
+__all__ = ["COMMANDS", "compliance_main", "main", "request_daemon", "run_command", "serve"]
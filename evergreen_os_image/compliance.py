@@ -2,7 +2,9 @@
 
 from __future__ import annotations
 
+import json
 from dataclasses import dataclass
+from pathlib import Path
 from typing import Tuple
 
 from .ci import GitHubWorkflow
@@ -14,6 +16,7 @@ from .configuration import (
     SecurityPolicies,
 )
 from .prd import EvergreenOSPRD
+from .profiles import LOW_MEMORY_PROFILE, ComposeProfiles
 
 
 @dataclass(frozen=True)
@@ -33,8 +36,13 @@ class PRDComplianceReport:
     statuses: Tuple[RequirementStatus, ...]
 
     @classmethod
-    def current_state(cls) -> "PRDComplianceReport":
-        """Return the compliance report for the current repository contents."""
+    def current_state(cls, low_memory_smoke: Path | None = None) -> "PRDComplianceReport":
+        """Return the compliance report for the current repository contents.
+
+        ``low_memory_smoke`` points at the smoke results that ``qemu_smoke.py
+        --profile chromebook-lowmem`` wrote.  Without it no constrained-RAM
+        boot counts as measured, so the report only depends on the repository.
+        """
 
         prd = EvergreenOSPRD.default()
 
@@ -46,6 +54,7 @@ class PRDComplianceReport:
         greeter_source = EnrollmentGreeterSource.load()
         greeter_service = services_dir / "evergreen-enrollment-greeter.service"
         workflow = GitHubWorkflow.load_default()
+        profiles = ComposeProfiles.load()
 
         base_image_composition = RequirementStatus(
             "base_image_composition",
@@ -147,13 +156,7 @@ class PRDComplianceReport:
                     )
                 ),
             ),
-            RequirementStatus(
-                "chromebook_support",
-                implemented=False,
-                details=(
-                    "Firmware flashing scripts or low-resource installation guidance are absent."
-                ),
-            ),
+            _chromebook_support(profiles, low_memory_smoke),
         )
 
         return cls(prd=prd, statuses=statuses)
@@ -180,4 +183,57 @@ class PRDComplianceReport:
         return tuple((status.identifier, status) for status in self.statuses)
 
 
+def _chromebook_support(profiles: ComposeProfiles, smoke_path: Path | None) -> RequirementStatus:
+    """Judge Chromebook support from a constrained-RAM boot of the low-memory profile."""
+
+    profile = profiles.profiles.get(LOW_MEMORY_PROFILE)
+    if profile is None:
+        return RequirementStatus(
+            "chromebook_support",
+            implemented=False,
+            details="No low-resource compose profile is defined for EOL Chromebooks.",
+        )
+
+    limits = f"{profile.smoke.memory_mb} MB RAM, {profile.smoke.cpus} vCPU"
+    try:
+        results = json.loads(smoke_path.read_text()) if smoke_path is not None else {}
+    except (OSError, json.JSONDecodeError):
+        results = {}
+    measurement = results.get("measurement") if results.get("profile") == LOW_MEMORY_PROFILE else None
+
+    if not measurement:
+        return RequirementStatus(
+            "chromebook_support",
+            implemented=False,
+            details=(
+                f"Low-memory profile {LOW_MEMORY_PROFILE!r} is defined ({limits}) but no"
+                " constrained-RAM smoke boot has been measured."
+            ),
+        )
+    if measurement.get("accelerator") != "kvm":
+        return RequirementStatus(
+            "chromebook_support",
+            implemented=False,
+            details="Low-memory smoke boot was not run under KVM, so its timing is not representative.",
+        )
+    if not measurement.get("within_limits"):
+        return RequirementStatus(
+            "chromebook_support",
+            implemented=False,
+            details=(
+                f"Low-memory profile did not reach the greeter within its limits ({limits},"
+                f" {profile.smoke.max_greeter_seconds:.0f}s, {profile.smoke.max_qemu_rss_mb} MB QEMU RSS)."
+            ),
+        )
+    return RequirementStatus(
+        "chromebook_support",
+        implemented=True,
+        details=(
+            f"Low-memory profile reached the greeter in"
+            f" {measurement['time_to_greeter_seconds']:.1f}s with {limits}"
+            f" and a QEMU peak RSS of {measurement['qemu_peak_rss_mb']:.0f} MB."
+        ),
+    )
+
+
 __all__ = ["RequirementStatus", "PRDComplianceReport"]
@@ -2,13 +2,61 @@
 
 from __future__ import annotations
 
+import functools
+import inspect
 import json
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Dict, Mapping, Tuple
+from typing import Callable, Dict, Mapping, Tuple, TypeVar
 
 REPO_ROOT = Path(__file__).resolve().parent.parent
 
+_Loaded = TypeVar("_Loaded")
+_LOAD_CACHE: Dict[Tuple[str, Path], Tuple[Tuple[int, int], object]] = {}
+_CACHE_ENABLED = False
+
+
+def enable_config_cache(enabled: bool = True) -> None:
+    """Reuse parsed configuration objects until their source file changes.
+
+    Long-running processes such as the ``evergreen-image`` daemon enable this
+    so that repeated commands do not re-parse unchanged configuration files.
+    """
+
+    global _CACHE_ENABLED
+    _CACHE_ENABLED = enabled
+    if not enabled:
+        _LOAD_CACHE.clear()
+
+
+def cached_loader(load: Callable[..., _Loaded]) -> Callable[..., _Loaded]:
+    """Memoise a ``load`` classmethod on the path and mtime of its source file.
+
+    The default source is the default of ``load``'s own ``path`` parameter,
+    which is also used when a caller passes ``path=None``.
+    """
+
+    default = inspect.signature(load).parameters["path"].default
+    if not isinstance(default, Path):
+        raise TypeError(f"{load.__qualname__} must declare a default path")
+
+    @functools.wraps(load)
+    def wrapper(cls, path: Path | None = None) -> _Loaded:
+        resolved = default if path is None else Path(path)
+        if not _CACHE_ENABLED:
+            return load(cls, resolved)
+        stat = resolved.stat()
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        key = (cls.__qualname__, resolved.resolve())
+        cached = _LOAD_CACHE.get(key)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]  # type: ignore[return-value]
+        loaded = load(cls, resolved)
+        _LOAD_CACHE[key] = (stamp, loaded)
+        return loaded
+
+    return wrapper
+
 
 @dataclass(frozen=True)
 class FlatpakRemote:
@@ -39,11 +87,11 @@ class ComposeManifest:
     default_kargs: Tuple[str, ...]
 
     @classmethod
-    def load(cls, path: Path | None = None) -> "ComposeManifest":
+    @cached_loader
+    def load(cls, path: Path = REPO_ROOT / "configs" / "manifest.yaml") -> "ComposeManifest":
         """Load the compose manifest from disk."""
 
-        manifest_path = path or REPO_ROOT / "configs" / "manifest.yaml"
-        data = json.loads(manifest_path.read_text())
+        data = json.loads(path.read_text())
 
         remotes = tuple(
             FlatpakRemote(
@@ -103,24 +151,33 @@ class SecurityPolicies:
     secure_boot_status: str
     auditing_enabled: bool
     auditing_profile: str | None
+    firewall_service_definitions: Mapping[str, Tuple[str, ...]] = field(default_factory=dict)
+    usbguard_policy_path: str = "/etc/usbguard/rules.conf"
+    usbguard_allowlist_package: str | None = None
 
     @classmethod
-    def load(cls, path: Path | None = None) -> "SecurityPolicies":
+    @cached_loader
+    def load(cls, path: Path = REPO_ROOT / "configs" / "security" / "policies.yaml") -> "SecurityPolicies":
         """Load security policy configuration from disk."""
 
-        policies_path = path or REPO_ROOT / "configs" / "security" / "policies.yaml"
-        data = json.loads(policies_path.read_text())
+        data = json.loads(path.read_text())
 
         return cls(
             selinux_mode=data["selinux"]["mode"],
             ssh_enabled=data["ssh"]["enabled"],
             usbguard_default_policy=data["usbguard"]["default_policy"],
+            usbguard_policy_path=data["usbguard"].get("policy_path", "/etc/usbguard/rules.conf"),
+            usbguard_allowlist_package=data["usbguard"].get("allowlist_package"),
             firewall_allowed_services=tuple(data["firewall"].get("allowed_services", ())),
             firewall_custom_rules=tuple(data["firewall"].get("custom_rules", ())),
             disk_encryption=data["disk_encryption"],
             secure_boot_status=data["secure_boot"]["status"],
             auditing_enabled=data.get("auditing", {}).get("enabled", False),
             auditing_profile=data.get("auditing", {}).get("profile"),
+            firewall_service_definitions={
+                name: tuple(ports)
+                for name, ports in data["firewall"].get("service_definitions", {}).items()
+            },
         )
 
 
@@ -131,10 +188,10 @@ class FlatpakRemoteConfig:
     remotes: Mapping[str, FlatpakRemote]
 
     @classmethod
-    def load(cls, path: Path | None = None) -> "FlatpakRemoteConfig":
+    @cached_loader
+    def load(cls, path: Path = REPO_ROOT / "configs" / "defaults" / "flatpak-remotes.conf") -> "FlatpakRemoteConfig":
         """Load the Flatpak remotes defaults file."""
 
-        config_path = path or REPO_ROOT / "configs" / "defaults" / "flatpak-remotes.conf"
         remotes: Dict[str, FlatpakRemote] = {}
         current_remote: FlatpakRemote | None = None
         current_section: str | None = None
@@ -144,7 +201,7 @@ class FlatpakRemoteConfig:
                 return
             remotes[remote.name] = remote
 
-        with config_path.open("r", encoding="utf-8") as handle:
+        with path.open("r", encoding="utf-8") as handle:
             for raw_line in handle:
                 line = raw_line.strip()
                 if not line:
@@ -200,6 +257,78 @@ class FlatpakRemoteConfig:
         return cls(remotes=remotes)
 
 
+@dataclass(frozen=True)
+class AgentDefaults:
+    """Default device agent configuration staged into the image."""
+
+    backend_url: str
+    tenant: str
+    update_channel: str
+    auto_reboot: bool
+    telemetry_enabled: bool
+    telemetry_endpoint: str | None
+
+    @classmethod
+    @cached_loader
+    def load(cls, path: Path = REPO_ROOT / "configs" / "defaults" / "evergreen-agent.yaml") -> "AgentDefaults":
+        """Load the device agent defaults file."""
+
+        data = _parse_simple_yaml(path.read_text())
+
+        backend = data.get("backend", {})
+        updates = data.get("updates", {})
+        telemetry = data.get("telemetry", {})
+
+        return cls(
+            backend_url=str(backend.get("url", "")),
+            tenant=str(backend.get("tenant", "")),
+            update_channel=str(updates.get("channel", "stable")),
+            auto_reboot=bool(updates.get("auto_reboot", False)),
+            telemetry_enabled=bool(telemetry.get("enabled", False)),
+            telemetry_endpoint=telemetry.get("endpoint"),
+        )
+
+
+def _parse_simple_yaml(text: str) -> Dict[str, object]:
+    """Parse the nested ``key: value`` YAML subset used by the agent defaults."""
+
+    root: Dict[str, object] = {}
+    stack: list[tuple[int, Dict[str, object]]] = [(-1, root)]
+
+    for raw_line in text.splitlines():
+        stripped = raw_line.split(" #", maxsplit=1)[0].rstrip()
+        if not stripped.strip() or stripped.lstrip().startswith("#"):
+            continue
+        indent = len(stripped) - len(stripped.lstrip())
+        key, _, value = stripped.strip().partition(":")
+        while indent <= stack[-1][0]:
+            stack.pop()
+        parent = stack[-1][1]
+        value = value.strip()
+        if not value:
+            child: Dict[str, object] = {}
+            parent[key] = child
+            stack.append((indent, child))
+            continue
+        parent[key] = _parse_yaml_scalar(value)
+
+    return root
+
+
+def _parse_yaml_scalar(value: str) -> object:
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in {"'", '"'}:
+        return value[1:-1]
+    lowered = value.lower()
+    if lowered in {"true", "yes", "on"}:
+        return True
+    if lowered in {"false", "no", "off"}:
+        return False
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+
 @dataclass(frozen=True)
 class EnrollmentGreeterSource:
     """Pointer to the out-of-tree GTK enrollment greeter implementation."""
@@ -208,11 +337,11 @@ class EnrollmentGreeterSource:
     description: str
 
     @classmethod
-    def load(cls, path: Path | None = None) -> "EnrollmentGreeterSource":
+    @cached_loader
+    def load(cls, path: Path = REPO_ROOT / "enrollment-ui" / "greeter" / "source.json") -> "EnrollmentGreeterSource":
         """Load metadata that references the external enrollment greeter."""
 
-        source_path = path or REPO_ROOT / "enrollment-ui" / "greeter" / "source.json"
-        data = json.loads(source_path.read_text())
+        data = json.loads(path.read_text())
 
         return cls(
             repository_url=data["repository"],
@@ -221,10 +350,13 @@ class EnrollmentGreeterSource:
 
 
 __all__ = [
+    "AgentDefaults",
     "FlatpakRemote",
     "ComposeManifest",
     "SecurityPolicies",
     "FlatpakRemoteConfig",
     "EnrollmentGreeterSource",
     "REPO_ROOT",
+    "cached_loader",
+    "enable_config_cache",
 ]
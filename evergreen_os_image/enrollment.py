@@ -0,0 +1,174 @@
+"""Enrollment payload handling shared by build tooling and test harnesses."""
+
+from __future__ import annotations
+
+import hashlib
+import hmac
+import json
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict
+
+SIGNATURE_SCHEME = "hmac-sha256"
+PRESEED_PAYLOAD_PATH = "usr/share/evergreen/enrollment.json"
+AGENT_CONFIG_PATH = "etc/evergreen/agent/agent.yaml"
+PRESEED_TMPFILES_PATH = "usr/lib/tmpfiles.d/evergreen-preseed.conf"
+IMAGE_ID_PATH = "usr/lib/evergreen/image-id"
+DEFAULT_PRESEED_LIFETIME = timedelta(days=90)
+_EXPIRY_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+
+@dataclass(frozen=True)
+class EnrollmentPayload:
+    """Backend details captured by the enrollment greeter."""
+
+    backend_url: str
+    tenant: str
+
+    @classmethod
+    def load(cls, path: Path) -> "EnrollmentPayload":
+        """Load a greeter payload, mirroring ``write_agent_config.sh``.
+
+        Missing, empty or unreadable payloads yield empty values rather than an
+        error, exactly like the ``jq -r '.key // empty'`` calls in the script.
+        """
+
+        try:
+            data = json.loads(path.read_text()) if path.stat().st_size else {}
+        except (OSError, json.JSONDecodeError):
+            data = {}
+        if not isinstance(data, dict):
+            data = {}
+
+        return cls(
+            backend_url=str(data.get("backend_url") or ""),
+            tenant=str(data.get("tenant") or ""),
+        )
+
+    def to_json(self) -> str:
+        """Serialise the payload in the format written by the greeter."""
+
+        return json.dumps({"backend_url": self.backend_url, "tenant": self.tenant})
+
+
+def _signed_fields(payload: EnrollmentPayload, image_id: str, expires: str) -> Dict[str, str]:
+    return {"backend_url": payload.backend_url, "tenant": payload.tenant, "image_id": image_id, "expires": expires}
+
+
+def _digest(key: bytes, fields: Dict[str, str]) -> str:
+    canonical = json.dumps(fields, sort_keys=True, separators=(",", ":")).encode()
+    return hmac.new(key, canonical, hashlib.sha256).hexdigest()
+
+
+def sign_payload(payload: EnrollmentPayload, key: bytes, image_id: str, expires: datetime) -> str:
+    """Return ``payload`` as a JSON document carrying an HMAC-SHA256 signature.
+
+    The signature also covers ``image_id`` and ``expires``, so a payload
+    lifted from one image is rejected by any other image and by every image
+    once it expires.
+    """
+
+    if not payload.backend_url or not payload.tenant:
+        raise ValueError("A preseeded enrollment payload needs both backend_url and tenant")
+    if not image_id:
+        raise ValueError("A preseeded enrollment payload must be bound to an image_id")
+    if expires.tzinfo is None:
+        raise ValueError("expires must be timezone-aware")
+    fields = _signed_fields(payload, image_id, expires.astimezone(timezone.utc).strftime(_EXPIRY_FORMAT))
+    document = {**fields, "signature": f"{SIGNATURE_SCHEME}:{_digest(key, fields)}"}
+    return json.dumps(document, indent=2, sort_keys=True)
+
+
+def verify_payload(document: str, key: bytes, image_id: str, now: datetime | None = None) -> EnrollmentPayload:
+    """Parse a document from :func:`sign_payload` for the image ``image_id``.
+
+    Raises ``ValueError`` if the document was tampered with, was signed for a
+    different image or has expired.
+    """
+
+    try:
+        data = json.loads(document)
+    except json.JSONDecodeError as error:
+        raise ValueError("Signed enrollment payload is not valid JSON") from error
+    if not isinstance(data, dict):
+        raise ValueError("Signed enrollment payload must be a JSON object")
+
+    payload = EnrollmentPayload(
+        backend_url=str(data.get("backend_url") or ""),
+        tenant=str(data.get("tenant") or ""),
+    )
+    fields = _signed_fields(payload, str(data.get("image_id") or ""), str(data.get("expires") or ""))
+    scheme, _, signature = str(data.get("signature", "")).partition(":")
+    if scheme != SIGNATURE_SCHEME or not hmac.compare_digest(signature, _digest(key, fields)):
+        raise ValueError("Signed enrollment payload failed verification")
+
+    if not hmac.compare_digest(fields["image_id"], image_id):
+        raise ValueError("Signed enrollment payload is bound to a different image")
+    try:
+        expires = datetime.strptime(fields["expires"], _EXPIRY_FORMAT).replace(tzinfo=timezone.utc)
+    except ValueError as error:
+        raise ValueError("Signed enrollment payload has no valid expiry") from error
+    if (now or datetime.now(timezone.utc)) >= expires:
+        raise ValueError(f"Signed enrollment payload expired at {fields['expires']}")
+    return payload
+
+
+def render_agent_config(payload: EnrollmentPayload, channel: str = "stable") -> str:
+    """Render ``/etc/evergreen/agent/agent.yaml`` for an enrollment payload.
+
+    The output is byte-for-byte what ``write_agent_config.sh`` produces for
+    the same payload.
+    """
+
+    return (
+        "apiVersion: evergreenos/v1\n"
+        "backend:\n"
+        f'  url: "{payload.backend_url}"\n'
+        f'  tenant: "{payload.tenant}"\n'
+        "updates:\n"
+        f'  channel: "{channel}"\n'
+        "telemetry:\n"
+        "  enabled: true\n"
+    )
+
+
+def preseed_files(
+    payload: EnrollmentPayload, key: bytes, image_id: str, expires: datetime, channel: str = "stable"
+) -> Dict[str, str]:
+    """Files, relative to the image root, that enroll a device at build time.
+
+    ``agent.yaml`` is rendered up front, and the signed payload is shipped
+    read-only under ``/usr`` next to the ``image_id`` it is bound to.  A
+    tmpfiles.d snippet copies the payload into ``/var/lib/evergreen`` and
+    creates ``enrollment.complete`` during early boot.  That happens before the
+    greeter unit's ``ConditionPathExists=!`` check, so the greeter and
+    ``write-agent-config.sh`` never run.
+    """
+
+    tmpfiles = (
+        "# Preseeded enrollment: skip the interactive greeter on first boot.\n"
+        "d /var/lib/evergreen 0750 root root -\n"
+        f"C /var/lib/evergreen/enrollment.json - - - - /{PRESEED_PAYLOAD_PATH}\n"
+        "f /var/lib/evergreen/enrollment.complete 0644 root root -\n"
+    )
+    return {
+        AGENT_CONFIG_PATH: render_agent_config(payload, channel),
+        PRESEED_PAYLOAD_PATH: sign_payload(payload, key, image_id, expires) + "\n",
+        PRESEED_TMPFILES_PATH: tmpfiles,
+        IMAGE_ID_PATH: image_id + "\n",
+    }
+
+
+__all__ = [
+    "AGENT_CONFIG_PATH",
+    "DEFAULT_PRESEED_LIFETIME",
+    "IMAGE_ID_PATH",
+    "PRESEED_PAYLOAD_PATH",
+    "PRESEED_TMPFILES_PATH",
+    "EnrollmentPayload",
+    "preseed_files",
+    "render_agent_config",
+    "sign_payload",
+    "verify_payload",
+]
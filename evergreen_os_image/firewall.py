@@ -0,0 +1,384 @@
+"""Compile EvergreenOS firewall policy into a single atomic ruleset.
+
+``SecurityPolicies`` carries firewall policy as a list of allowed services and
+raw iptables rule strings.  This module parses both into
+:class:`FirewallRule` objects, reports duplicate and shadowed rules, and
+renders the effective rules as one ``nft -f`` batch, or as matching
+``iptables-restore`` and ``ip6tables-restore`` batches, so the kernel receives
+the whole policy in a single transaction per family.  Only built-in chains and
+targets are accepted, since the batches declare no custom chains.
+"""
+
+from __future__ import annotations
+
+import ipaddress
+import shlex
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, List, Mapping, Sequence, Tuple
+
+from .configuration import SecurityPolicies
+
+PortRange = Tuple[int, int]
+
+BUILTIN_CHAINS = ("INPUT", "FORWARD", "OUTPUT")
+CHAIN_POLICIES: Mapping[str, str] = {"INPUT": "DROP", "FORWARD": "DROP", "OUTPUT": "ACCEPT"}
+TERMINAL_TARGETS = frozenset({"ACCEPT", "DROP", "REJECT", "RETURN"})
+SUPPORTED_TARGETS = TERMINAL_TARGETS | {"LOG"}
+
+# Port definitions for the firewalld services EvergreenOS references.  Policy
+# files may extend or override these through ``firewall.service_definitions``.
+SERVICE_DEFINITIONS: Mapping[str, Tuple[str, ...]] = {
+    "dhcpv6-client": ("udp/546",),
+    # The device agent is an outbound HTTPS client; it listens on no port.
+    "evergreen-device-agent": (),
+    "http": ("tcp/80",),
+    "https": ("tcp/443",),
+    "mdns": ("udp/5353",),
+    "ssh": ("tcp/22",),
+}
+
+_IPTABLES_OPTIONS = {
+    "-p": "protocol",
+    "--protocol": "protocol",
+    "-s": "source",
+    "--source": "source",
+    "-d": "destination",
+    "--destination": "destination",
+    "-i": "in_interface",
+    "--in-interface": "in_interface",
+    "-o": "out_interface",
+    "--out-interface": "out_interface",
+    "--sport": "source_port",
+    "--source-port": "source_port",
+    "--dport": "destination_port",
+    "--destination-port": "destination_port",
+    "--ctstate": "states",
+    "--state": "states",
+    "-j": "target",
+    "--jump": "target",
+}
+_SUPPORTED_MATCHES = frozenset({"conntrack", "state", "tcp", "udp"})
+
+
+@dataclass(frozen=True)
+class FirewallRule:
+    """Structured form of a single filter-table rule."""
+
+    chain: str
+    target: str
+    protocol: str | None = None
+    source: ipaddress.IPv4Network | ipaddress.IPv6Network | None = None
+    destination: ipaddress.IPv4Network | ipaddress.IPv6Network | None = None
+    in_interface: str | None = None
+    out_interface: str | None = None
+    source_port: PortRange | None = None
+    destination_port: PortRange | None = None
+    states: FrozenSet[str] | None = None
+    origin: str = ""
+
+    @property
+    def match_key(self) -> Tuple[object, ...]:
+        """Everything that decides whether a packet matches, minus the target."""
+
+        return (
+            self.chain,
+            self.protocol,
+            self.source,
+            self.destination,
+            self.in_interface,
+            self.out_interface,
+            self.source_port,
+            self.destination_port,
+            self.states,
+        )
+
+    def covers(self, other: "FirewallRule") -> bool:
+        """Whether every packet matched by ``other`` is also matched by this rule."""
+
+        if self.chain != other.chain:
+            return False
+        for mine, theirs in (
+            (self.protocol, other.protocol),
+            (self.in_interface, other.in_interface),
+            (self.out_interface, other.out_interface),
+        ):
+            if mine is not None and mine != theirs:
+                return False
+        for mine_net, their_net in ((self.source, other.source), (self.destination, other.destination)):
+            if mine_net is None:
+                continue
+            if their_net is None or mine_net.version != their_net.version:
+                return False
+            if not their_net.subnet_of(mine_net):  # type: ignore[arg-type]
+                return False
+        for mine_range, their_range in (
+            (self.source_port, other.source_port),
+            (self.destination_port, other.destination_port),
+        ):
+            if mine_range is None:
+                continue
+            if their_range is None or not (mine_range[0] <= their_range[0] and their_range[1] <= mine_range[1]):
+                return False
+        if self.states is not None and (other.states is None or not other.states <= self.states):
+            return False
+        return True
+
+
+@dataclass(frozen=True)
+class FirewallDiagnostic:
+    """A rule that can never take effect because of an earlier rule."""
+
+    kind: str
+    rule: FirewallRule
+    shadowed_by: FirewallRule
+
+    @property
+    def message(self) -> str:
+        """Human readable description of the problem."""
+
+        if self.kind == "duplicate":
+            return f"{self.rule.origin!r} duplicates {self.shadowed_by.origin!r}"
+        if self.rule.target == self.shadowed_by.target:
+            return f"{self.rule.origin!r} is redundant: {self.shadowed_by.origin!r} already matches it"
+        return (
+            f"{self.rule.origin!r} never matches: {self.shadowed_by.origin!r} "
+            f"matches first with {self.shadowed_by.target}"
+        )
+
+
+def _parse_port(value: str) -> PortRange:
+    low, separator, high = value.partition(":")
+    try:
+        start = int(low) if low else 0
+        end = int(high) if high else (65535 if separator else start)
+    except ValueError as error:
+        raise ValueError(f"Invalid port specification: {value!r}") from error
+    if not 0 <= start <= end <= 65535:
+        raise ValueError(f"Invalid port range: {value!r}")
+    return start, end
+
+
+def parse_iptables_rule(rule: str) -> FirewallRule:
+    """Parse an ``iptables`` rule specification into a :class:`FirewallRule`."""
+
+    tokens = shlex.split(rule)
+    if len(tokens) < 2 or tokens[0] not in {"-A", "--append"}:
+        raise ValueError(f"Only appended rules (-A CHAIN ...) are supported: {rule!r}")
+
+    fields: Dict[str, object] = {"chain": tokens[1]}
+    position = 2
+    while position < len(tokens):
+        option = tokens[position]
+        if option == "!":
+            raise ValueError(f"Negated matches are not supported: {rule!r}")
+        if position + 1 >= len(tokens):
+            raise ValueError(f"Option {option} is missing a value: {rule!r}")
+        value = tokens[position + 1]
+        position += 2
+
+        if option in {"-m", "--match"}:
+            if value not in _SUPPORTED_MATCHES:
+                raise ValueError(f"Unsupported match module {value!r}: {rule!r}")
+            continue
+        name = _IPTABLES_OPTIONS.get(option)
+        if name is None:
+            raise ValueError(f"Unsupported option {option!r}: {rule!r}")
+        if name in fields:
+            raise ValueError(f"Option {option} given twice: {rule!r}")
+
+        if name in {"source", "destination"}:
+            fields[name] = ipaddress.ip_network(value, strict=False)
+        elif name in {"source_port", "destination_port"}:
+            fields[name] = _parse_port(value)
+        elif name == "states":
+            fields[name] = frozenset(state.strip().upper() for state in value.split(","))
+        elif name == "protocol":
+            fields[name] = value.lower()
+        elif name == "target":
+            if value.upper() not in SUPPORTED_TARGETS:
+                raise ValueError(
+                    f"Unsupported target {value!r}, expected one of {', '.join(sorted(SUPPORTED_TARGETS))}: {rule!r}"
+                )
+            fields[name] = value.upper()
+        else:
+            fields[name] = value
+
+    if "target" not in fields:
+        raise ValueError(f"Rule has no target (-j): {rule!r}")
+    if ("source_port" in fields or "destination_port" in fields) and fields.get("protocol") not in {"tcp", "udp"}:
+        raise ValueError(f"Port matches require -p tcp or -p udp: {rule!r}")
+
+    return FirewallRule(origin=rule, **fields)  # type: ignore[arg-type]
+
+
+def service_rules(
+    services: Sequence[str], definitions: Mapping[str, Sequence[str]] | None = None
+) -> Tuple[FirewallRule, ...]:
+    """Expand allowed firewalld service names into INPUT accept rules."""
+
+    known = {**SERVICE_DEFINITIONS, **(definitions or {})}
+    rules: List[FirewallRule] = []
+    for service in services:
+        if service not in known:
+            raise ValueError(f"No port definition for firewall service {service!r}")
+        for spec in known[service]:
+            protocol, _, port = spec.partition("/")
+            rules.append(
+                FirewallRule(
+                    chain="INPUT",
+                    target="ACCEPT",
+                    protocol=protocol.lower(),
+                    destination_port=_parse_port(port),
+                    origin=f"service:{service}",
+                )
+            )
+    return tuple(rules)
+
+
+BASELINE_RULES: Tuple[FirewallRule, ...] = (
+    FirewallRule(chain="INPUT", target="ACCEPT", in_interface="lo", origin="baseline:loopback"),
+    FirewallRule(
+        chain="INPUT",
+        target="ACCEPT",
+        states=frozenset({"ESTABLISHED", "RELATED"}),
+        origin="baseline:established",
+    ),
+)
+
+
+@dataclass(frozen=True)
+class FirewallRuleset:
+    """Ordered, validated firewall rules ready to be emitted as one batch."""
+
+    rules: Tuple[FirewallRule, ...]
+    diagnostics: Tuple[FirewallDiagnostic, ...]
+
+    @classmethod
+    def from_rules(cls, rules: Sequence[FirewallRule]) -> "FirewallRuleset":
+        """Validate ``rules`` in order, dropping those that can never match."""
+
+        effective: List[FirewallRule] = []
+        diagnostics: List[FirewallDiagnostic] = []
+        for rule in rules:
+            if rule.chain not in BUILTIN_CHAINS:
+                raise ValueError(f"Unsupported chain {rule.chain!r} in {rule.origin!r}")
+            blocker = next(
+                (
+                    earlier
+                    for earlier in effective
+                    if earlier.target in TERMINAL_TARGETS and earlier.covers(rule)
+                ),
+                None,
+            )
+            if blocker is None:
+                effective.append(rule)
+                continue
+            duplicate = blocker.match_key == rule.match_key and blocker.target == rule.target
+            diagnostics.append(FirewallDiagnostic("duplicate" if duplicate else "shadowed", rule, blocker))
+        return cls(rules=tuple(effective), diagnostics=tuple(diagnostics))
+
+    @classmethod
+    def compile(cls, policies: SecurityPolicies | None = None) -> "FirewallRuleset":
+        """Compile the baseline, allowed services and custom rules of a policy."""
+
+        policies = policies or SecurityPolicies.load()
+        rules: List[FirewallRule] = list(BASELINE_RULES)
+        rules.extend(service_rules(policies.firewall_allowed_services, policies.firewall_service_definitions))
+        rules.extend(parse_iptables_rule(rule) for rule in policies.firewall_custom_rules)
+        return cls.from_rules(rules)
+
+    def to_iptables_restore(self, family: int = 4) -> str:
+        """Render the IPv``family`` rules in ``iptables-restore`` format.
+
+        Rules without addresses apply to both families.  ``family=6`` renders
+        the ``ip6tables-restore`` batch, so IPv6 rules are never dropped.
+        """
+
+        if family not in (4, 6):
+            raise ValueError(f"Unknown address family: {family}")
+        lines = ["*filter"]
+        lines.extend(f":{chain} {CHAIN_POLICIES[chain]} [0:0]" for chain in BUILTIN_CHAINS)
+        for rule in self.rules:
+            if any(network is not None and network.version != family for network in (rule.source, rule.destination)):
+                continue
+            lines.append(_render_iptables(rule))
+        lines.append("COMMIT")
+        return "\n".join(lines) + "\n"
+
+    def to_nftables(self, table: str = "evergreen") -> str:
+        """Render the ruleset as an atomic ``nft -f`` batch.
+
+        Only ``table`` is flushed and replaced, so tables owned by other
+        services (firewalld, container runtimes) survive a reload.  The empty
+        declaration makes the flush valid on the first load.
+        """
+
+        lines = [f"table inet {table}", f"flush table inet {table}", "", f"table inet {table} {{"]
+        for chain in BUILTIN_CHAINS:
+            hook = chain.lower()
+            lines.append(f"  chain {hook} {{")
+            lines.append(f"    type filter hook {hook} priority 0; policy {CHAIN_POLICIES[chain].lower()};")
+            lines.extend(f"    {_render_nft(rule)}" for rule in self.rules if rule.chain == chain)
+            lines.append("  }")
+        lines.append("}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_range(port_range: PortRange, separator: str) -> str:
+    start, end = port_range
+    return str(start) if start == end else f"{start}{separator}{end}"
+
+
+def _render_iptables(rule: FirewallRule) -> str:
+    parts = ["-A", rule.chain]
+    if rule.in_interface:
+        parts += ["-i", rule.in_interface]
+    if rule.out_interface:
+        parts += ["-o", rule.out_interface]
+    if rule.source:
+        parts += ["-s", str(rule.source)]
+    if rule.destination:
+        parts += ["-d", str(rule.destination)]
+    if rule.protocol:
+        parts += ["-p", rule.protocol]
+    if rule.source_port:
+        parts += ["--sport", _format_range(rule.source_port, ":")]
+    if rule.destination_port:
+        parts += ["--dport", _format_range(rule.destination_port, ":")]
+    if rule.states:
+        parts += ["-m", "conntrack", "--ctstate", ",".join(sorted(rule.states))]
+    parts += ["-j", rule.target]
+    return " ".join(parts)
+
+
+def _render_nft(rule: FirewallRule) -> str:
+    parts: List[str] = []
+    if rule.in_interface:
+        parts.append(f'iifname "{rule.in_interface}"')
+    if rule.out_interface:
+        parts.append(f'oifname "{rule.out_interface}"')
+    for keyword, network in (("saddr", rule.source), ("daddr", rule.destination)):
+        if network is not None:
+            family = "ip6" if network.version == 6 else "ip"
+            parts.append(f"{family} {keyword} {network}")
+    if rule.protocol and not (rule.source_port or rule.destination_port):
+        parts.append(f"meta l4proto {rule.protocol}")
+    if rule.source_port:
+        parts.append(f"{rule.protocol} sport {_format_range(rule.source_port, '-')}")
+    if rule.destination_port:
+        parts.append(f"{rule.protocol} dport {_format_range(rule.destination_port, '-')}")
+    if rule.states:
+        parts.append("ct state " + ",".join(sorted(state.lower() for state in rule.states)))
+    parts.append({"LOG": "log", "REJECT": "reject", "RETURN": "return"}.get(rule.target, rule.target.lower()))
+    return " ".join(parts)
+
+
+__all__ = [
+    "FirewallRule",
+    "FirewallDiagnostic",
+    "FirewallRuleset",
+    "SERVICE_DEFINITIONS",
+    "SUPPORTED_TARGETS",
+    "parse_iptables_rule",
+    "service_rules",
+]
@@ -0,0 +1,350 @@
+"""Fleet-scale validation of device telemetry against PRD success metrics.
+
+:meth:`EvergreenOSPRD.validate_success_metrics` checks a single mapping of
+observed values.  Fleet telemetry dumps contain one such mapping per device,
+so this module streams records in fixed-size chunks, converts each chunk into
+NumPy arrays and evaluates every threshold across the whole chunk at once.
+Only bounded per-metric state (a fixed-bin histogram and the current worst
+offenders) survives between chunks, which keeps memory proportional to the
+chunk size rather than the size of the fleet.
+
+NumPy is required by this module (see ``requirements.txt``); it is imported
+lazily by :meth:`EvergreenOSPRD.validate_fleet_metrics` so the rest of the
+package keeps working without it.
+"""
+
+from __future__ import annotations
+
+import json
+import numbers
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Mapping, Sequence, Tuple, Union
+
+import numpy as np
+
+DEFAULT_CHUNK_SIZE = 65_536
+HISTOGRAM_BINS = 4096
+HISTOGRAM_SPAN = 4.0
+WORST_OFFENDERS = 10
+
+DEVICE_KEY = "device_id"
+
+TelemetrySource = Union[Path, Mapping[str, Sequence[object]], Iterable[Mapping[str, object]]]
+
+
+@dataclass(frozen=True)
+class MetricSummary:
+    """Aggregated validation outcome for one success metric across a fleet."""
+
+    metric: str
+    threshold: object
+    observed: int
+    failures: int
+    p50: float | None
+    p95: float | None
+    p99: float | None
+    worst_offenders: Tuple[Tuple[str, object], ...]
+
+    @property
+    def failure_rate(self) -> float:
+        """Fraction of evaluated devices that missed the threshold."""
+
+        return self.failures / self.observed if self.observed else 0.0
+
+
+@dataclass(frozen=True)
+class FleetValidationReport:
+    """Per-metric validation results for a batch of device telemetry."""
+
+    devices: int
+    metrics: Mapping[str, MetricSummary]
+
+    def failed_metrics(self) -> Tuple[str, ...]:
+        """Return the metric identifiers that failed on at least one device."""
+
+        return tuple(name for name, summary in self.metrics.items() if summary.failures)
+
+
+class _NumericAccumulator:
+    """Streaming state for an upper-bound numeric threshold.
+
+    Percentiles are read from a fixed-bin histogram spanning
+    ``[0, HISTOGRAM_SPAN * threshold]``, so their resolution is
+    ``HISTOGRAM_SPAN * threshold / HISTOGRAM_BINS``.  Values beyond the span
+    are counted separately and reported as the observed maximum.
+    """
+
+    def __init__(self, threshold: float, top_n: int) -> None:
+        self.threshold = float(threshold)
+        self.top_n = top_n
+        self.edges = np.linspace(0.0, HISTOGRAM_SPAN * max(self.threshold, 1.0), HISTOGRAM_BINS + 1)
+        self.counts = np.zeros(HISTOGRAM_BINS, dtype=np.int64)
+        self.overflow = 0
+        self.maximum = -np.inf
+        self.observed = 0
+        self.failures = 0
+        self.worst_values = np.empty(0, dtype=np.float64)
+        self.worst_devices = np.empty(0, dtype=object)
+
+    def update(self, devices: np.ndarray, raw: Sequence[object]) -> None:
+        values = _as_float_array(raw)
+        finite = np.isfinite(values)
+        failing = ~finite | (values > self.threshold)
+
+        self.observed += values.size
+        self.failures += int(np.count_nonzero(failing))
+
+        measured = values[finite]
+        if measured.size:
+            self.maximum = max(self.maximum, float(measured.max()))
+            in_span = measured <= self.edges[-1]
+            self.overflow += int(measured.size - np.count_nonzero(in_span))
+            self.counts += np.histogram(np.clip(measured[in_span], 0.0, None), bins=self.edges)[0]
+
+        ranked = failing & finite
+        if np.any(ranked):
+            self._merge_worst(devices[ranked], values[ranked])
+
+    def _merge_worst(self, devices: np.ndarray, values: np.ndarray) -> None:
+        all_values = np.concatenate((self.worst_values, values))
+        all_devices = np.concatenate((self.worst_devices, devices))
+        if all_values.size > self.top_n:
+            keep = np.argpartition(all_values, -self.top_n)[-self.top_n:]
+            all_values, all_devices = all_values[keep], all_devices[keep]
+        self.worst_values, self.worst_devices = all_values, all_devices
+
+    def percentile(self, quantile: float) -> float | None:
+        measured = int(self.counts.sum()) + self.overflow
+        if not measured:
+            return None
+        rank = quantile * measured
+        cumulative = np.cumsum(self.counts)
+        index = int(np.searchsorted(cumulative, rank, side="left"))
+        if index >= HISTOGRAM_BINS:
+            return self.maximum
+        return float(min(self.edges[index + 1], self.maximum))
+
+    def summary(self, metric: str) -> MetricSummary:
+        order = np.argsort(-self.worst_values, kind="stable")
+        worst = tuple(
+            (str(self.worst_devices[i]), float(self.worst_values[i])) for i in order
+        )
+        return MetricSummary(
+            metric=metric,
+            threshold=self.threshold,
+            observed=self.observed,
+            failures=self.failures,
+            p50=self.percentile(0.50),
+            p95=self.percentile(0.95),
+            p99=self.percentile(0.99),
+            worst_offenders=worst,
+        )
+
+
+class _ExactAccumulator:
+    """Streaming state for boolean and equality thresholds."""
+
+    def __init__(self, threshold: object, top_n: int) -> None:
+        self.threshold = threshold
+        self.top_n = top_n
+        self.observed = 0
+        self.failures = 0
+        self.offenders: List[Tuple[str, object]] = []
+
+    def update(self, devices: np.ndarray, raw: Sequence[object]) -> None:
+        passing = _matches(raw, self.threshold)
+        failing = np.flatnonzero(~passing)
+
+        self.observed += passing.size
+        self.failures += failing.size
+
+        for index in failing[: max(self.top_n - len(self.offenders), 0)]:
+            self.offenders.append((str(devices[index]), _python_value(raw[index])))
+
+    def summary(self, metric: str) -> MetricSummary:
+        return MetricSummary(
+            metric=metric,
+            threshold=self.threshold,
+            observed=self.observed,
+            failures=self.failures,
+            p50=None,
+            p95=None,
+            p99=None,
+            worst_offenders=tuple(self.offenders),
+        )
+
+
+def _as_float_array(raw: Sequence[object]) -> np.ndarray:
+    """Convert a column to floats, mapping missing or non-numeric values to NaN.
+
+    Real numbers of any type, NumPy scalars included, keep their value.
+    """
+
+    if isinstance(raw, np.ndarray) and raw.dtype.kind in "iuf":
+        return raw.astype(np.float64, copy=False)
+    if all(isinstance(value, numbers.Real) for value in raw):
+        return np.asarray(raw, dtype=np.float64)
+    return np.fromiter(
+        (value if isinstance(value, numbers.Real) else np.nan for value in raw),
+        dtype=np.float64,
+        count=len(raw),
+    )
+
+
+def _matches(raw: Sequence[object], threshold: object) -> np.ndarray:
+    """Vectorised equivalent of the scalar checks in ``validate_success_metrics``."""
+
+    if isinstance(raw, np.ndarray) and raw.dtype.kind == "b" and isinstance(threshold, bool):
+        return raw == threshold
+    column = raw if isinstance(raw, np.ndarray) and raw.dtype == object else np.asarray(list(raw), dtype=object)
+    if isinstance(threshold, bool):
+        return np.fromiter((value is threshold for value in column), dtype=bool, count=column.size)
+    return np.asarray(column == threshold, dtype=bool)
+
+
+def _python_value(value: object) -> object:
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def iter_jsonl_chunks(
+    path: Path, metrics: Iterable[str], chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> Iterator[Tuple[np.ndarray, Dict[str, List[object]]]]:
+    """Stream a JSONL telemetry dump as ``(device_ids, columns)`` chunks."""
+
+    return _chunk_records(_read_jsonl(path), metrics, chunk_size)
+
+
+def iter_columnar_chunks(
+    columns: Mapping[str, Sequence[object]],
+    metrics: Iterable[str],
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Iterator[Tuple[np.ndarray, Dict[str, Sequence[object]]]]:
+    """Slice column-oriented telemetry into ``(device_ids, columns)`` chunks.
+
+    Columns may be lists, NumPy arrays or memory-mapped arrays; slices of the
+    latter are views, so large dumps are never materialised in full.
+    """
+
+    metrics = tuple(metrics)
+    lengths = {len(column) for column in columns.values()}
+    if len(lengths) > 1:
+        raise ValueError("Telemetry columns must all have the same length")
+    total = lengths.pop() if lengths else 0
+    device_column = columns.get(DEVICE_KEY)
+
+    for start in range(0, total, chunk_size):
+        stop = min(start + chunk_size, total)
+        if device_column is None:
+            devices = np.arange(start, stop).astype(str).astype(object)
+        else:
+            devices = np.asarray(device_column[start:stop], dtype=object)
+        chunk = {
+            metric: columns[metric][start:stop] if metric in columns else [None] * (stop - start)
+            for metric in metrics
+        }
+        yield devices, chunk
+
+
+def _read_jsonl(path: Path) -> Iterator[Mapping[str, object]]:
+    with path.open("r", encoding="utf-8") as handle:
+        for line_number, line in enumerate(handle, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as error:
+                raise ValueError(f"{path}:{line_number}: invalid telemetry record") from error
+
+
+def _chunk_records(
+    records: Iterable[Mapping[str, object]], metrics: Iterable[str], chunk_size: int
+) -> Iterator[Tuple[np.ndarray, Dict[str, List[object]]]]:
+    metrics = tuple(metrics)
+    devices: List[object] = []
+    columns: Dict[str, List[object]] = {metric: [] for metric in metrics}
+    offset = 0
+
+    for record in records:
+        devices.append(record.get(DEVICE_KEY, offset + len(devices)))
+        for metric in metrics:
+            columns[metric].append(record.get(metric))
+        if len(devices) == chunk_size:
+            yield np.asarray(devices, dtype=object), columns
+            offset += len(devices)
+            devices = []
+            columns = {metric: [] for metric in metrics}
+
+    if devices:
+        yield np.asarray(devices, dtype=object), columns
+
+
+def validate_fleet_metrics(
+    thresholds: Mapping[str, object],
+    source: TelemetrySource,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    top_n: int = WORST_OFFENDERS,
+) -> FleetValidationReport:
+    """Validate per-device telemetry against ``thresholds`` in bounded memory.
+
+    Parameters
+    ----------
+    thresholds:
+        Success metric thresholds, normally
+        ``EvergreenOSPRD.success_metric_thresholds``.
+    source:
+        A path to a JSONL dump (one record per device), a mapping of column
+        name to sequence, or any iterable of per-device mappings.  Records are
+        keyed by ``device_id`` when present and by position otherwise.
+    chunk_size:
+        Number of devices converted to arrays and evaluated at a time.
+    top_n:
+        Number of worst offending devices retained per metric; at least 1.
+
+    Returns
+    -------
+    FleetValidationReport
+        Failure counts, approximate p50/p95/p99 values for numeric metrics and
+        the worst offending devices for every metric.
+    """
+
+    if chunk_size <= 0:
+        raise ValueError("chunk_size must be positive")
+    if top_n < 1:
+        raise ValueError("top_n must be at least 1")
+
+    accumulators: Dict[str, Union[_NumericAccumulator, _ExactAccumulator]] = {}
+    for metric, threshold in thresholds.items():
+        if isinstance(threshold, (int, float)) and not isinstance(threshold, bool):
+            accumulators[metric] = _NumericAccumulator(threshold, top_n)
+        else:
+            accumulators[metric] = _ExactAccumulator(threshold, top_n)
+
+    if isinstance(source, Path):
+        chunks: Iterable = iter_jsonl_chunks(source, thresholds, chunk_size)
+    elif isinstance(source, Mapping):
+        chunks = iter_columnar_chunks(source, thresholds, chunk_size)
+    else:
+        chunks = _chunk_records(source, thresholds, chunk_size)
+
+    devices = 0
+    for device_ids, columns in chunks:
+        devices += len(device_ids)
+        for metric, accumulator in accumulators.items():
+            accumulator.update(device_ids, columns[metric])
+
+    return FleetValidationReport(
+        devices=devices,
+        metrics={metric: accumulator.summary(metric) for metric, accumulator in accumulators.items()},
+    )
+
+
+__all__ = [
+    "DEFAULT_CHUNK_SIZE",
+    "MetricSummary",
+    "FleetValidationReport",
+    "iter_jsonl_chunks",
+    "iter_columnar_chunks",
+    "validate_fleet_metrics",
+]
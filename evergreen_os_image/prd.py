@@ -8,8 +8,14 @@ reason about the expectations in code.  The data is distilled from the
 
 from __future__ import annotations
 
+import math
+import numbers
 from dataclasses import dataclass
-from typing import Dict, Mapping, Tuple
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Mapping, Tuple
+
+if TYPE_CHECKING:  # pragma: no cover - imported for annotations only
+    from .fleet_metrics import FleetValidationReport, TelemetrySource
 
 
 @dataclass(frozen=True)
@@ -114,7 +120,7 @@ class EvergreenOSPRD:
                 continue
 
             if isinstance(threshold, (int, float)):
-                if value is None or not isinstance(value, (int, float)) or value > threshold:
+                if not isinstance(value, numbers.Real) or not math.isfinite(value) or value > threshold:
                     failures.append(metric)
                 continue
 
@@ -122,3 +128,23 @@ class EvergreenOSPRD:
                 failures.append(metric)
 
         return tuple(failures)
+
+    def validate_fleet_metrics(
+        self, source: "TelemetrySource | Path", chunk_size: int | None = None
+    ) -> "FleetValidationReport":
+        """Validate per-device telemetry for a whole fleet in bounded memory.
+
+        This is the batch counterpart of :meth:`validate_success_metrics`.
+        ``source`` may be a JSONL dump, a mapping of columns or an iterable of
+        per-device mappings; see
+        :func:`evergreen_os_image.fleet_metrics.validate_fleet_metrics`.
+        NumPy is imported on first use.
+        """
+
+        from .fleet_metrics import DEFAULT_CHUNK_SIZE, validate_fleet_metrics
+
+        return validate_fleet_metrics(
+            self.success_metric_thresholds,
+            source,
+            chunk_size=DEFAULT_CHUNK_SIZE if chunk_size is None else chunk_size,
+        )
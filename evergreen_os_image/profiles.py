@@ -0,0 +1,140 @@
+"""Compose profiles that derive image variants from the base manifest."""
+
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import Dict, Mapping, Tuple
+
+from .configuration import REPO_ROOT, ComposeManifest, FlatpakRemote, cached_loader
+
+LOW_MEMORY_PROFILE = "chromebook-lowmem"
+SMOKE_RESULTS_DIR = REPO_ROOT / "artifacts" / "qemu"
+SMOKE_RESULTS_NAME = "smoke-results.json"
+
+
+def smoke_results_path(profile: str) -> Path:
+    """Default location of the QEMU smoke results for ``profile``.
+
+    ``qemu_smoke.py --profile`` writes here unless ``--output`` is given.
+    """
+
+    return SMOKE_RESULTS_DIR / profile / SMOKE_RESULTS_NAME
+
+
+@dataclass(frozen=True)
+class SmokeLimits:
+    """Resources a profile must boot within during the QEMU smoke test."""
+
+    memory_mb: int
+    cpus: int
+    max_greeter_seconds: float
+    max_qemu_rss_mb: int
+
+
+@dataclass(frozen=True)
+class ComposeProfile:
+    """Adjustments applied on top of :class:`ComposeManifest` for one variant."""
+
+    name: str
+    description: str
+    smoke: SmokeLimits
+    ref: str | None = None
+    packages_install: Tuple[str, ...] = ()
+    packages_drop: Tuple[str, ...] = ()
+    packages_remove: Tuple[str, ...] = ()
+    systemd_mask: Tuple[str, ...] = ()
+    default_kargs: Tuple[str, ...] = ()
+    flatpak_drop_refs: Tuple[str, ...] = ()
+
+    def apply(self, manifest: ComposeManifest) -> ComposeManifest:
+        """Return ``manifest`` with this profile's additions and removals applied.
+
+        Units masked by the profile are also dropped from ``systemd_enable``.
+        """
+
+        def merged(base: Tuple[str, ...], extra: Tuple[str, ...], drop: Tuple[str, ...] = ()) -> Tuple[str, ...]:
+            kept = tuple(item for item in base if item not in drop)
+            return kept + tuple(item for item in extra if item not in kept)
+
+        remotes = tuple(
+            FlatpakRemote(
+                name=remote.name,
+                url=remote.url,
+                collection_id=remote.collection_id,
+                gpg_key=remote.gpg_key,
+                enabled=remote.enabled,
+                default_refs=tuple(ref for ref in remote.default_refs if ref not in self.flatpak_drop_refs),
+            )
+            for remote in manifest.flatpak_remotes
+        )
+
+        return replace(
+            manifest,
+            ref=self.ref or manifest.ref,
+            packages_install=merged(manifest.packages_install, self.packages_install, self.packages_drop),
+            packages_remove=merged(manifest.packages_remove, self.packages_remove),
+            systemd_enable=tuple(unit for unit in manifest.systemd_enable if unit not in self.systemd_mask),
+            systemd_mask=merged(manifest.systemd_mask, self.systemd_mask),
+            default_kargs=merged(manifest.default_kargs, self.default_kargs),
+            flatpak_remotes=remotes,
+        )
+
+
+@dataclass(frozen=True)
+class ComposeProfiles:
+    """All compose profiles declared in ``configs/profiles.yaml``."""
+
+    profiles: Mapping[str, ComposeProfile]
+
+    @classmethod
+    @cached_loader
+    def load(cls, path: Path = REPO_ROOT / "configs" / "profiles.yaml") -> "ComposeProfiles":
+        """Load the compose profile definitions from disk."""
+
+        data = json.loads(path.read_text())
+
+        profiles: Dict[str, ComposeProfile] = {}
+        for name, entry in data.get("profiles", {}).items():
+            packages = entry.get("packages", {})
+            smoke = entry["smoke"]
+            profiles[name] = ComposeProfile(
+                name=name,
+                description=entry.get("description", ""),
+                smoke=SmokeLimits(
+                    memory_mb=int(smoke["memory_mb"]),
+                    cpus=int(smoke["cpus"]),
+                    max_greeter_seconds=float(smoke["max_greeter_seconds"]),
+                    max_qemu_rss_mb=int(smoke["max_qemu_rss_mb"]),
+                ),
+                ref=entry.get("ref"),
+                packages_install=tuple(packages.get("install", ())),
+                packages_drop=tuple(packages.get("drop", ())),
+                packages_remove=tuple(packages.get("remove", ())),
+                systemd_mask=tuple(entry.get("systemd", {}).get("mask", ())),
+                default_kargs=tuple(entry.get("default_kargs", ())),
+                flatpak_drop_refs=tuple(entry.get("flatpak", {}).get("drop_refs", ())),
+            )
+
+        return cls(profiles=profiles)
+
+    def get(self, name: str) -> ComposeProfile:
+        """Return the named profile, raising ``ValueError`` for unknown names."""
+
+        try:
+            return self.profiles[name]
+        except KeyError as error:
+            known = ", ".join(sorted(self.profiles))
+            raise ValueError(f"Unknown compose profile {name!r} (known: {known})") from error
+
+
+__all__ = [
+    "LOW_MEMORY_PROFILE",
+    "SMOKE_RESULTS_DIR",
+    "SMOKE_RESULTS_NAME",
+    "SmokeLimits",
+    "ComposeProfile",
+    "ComposeProfiles",
+    "smoke_results_path",
+]
@@ -0,0 +1,327 @@
+"""Project mirror egress, uplink load and rollback exposure of an update rollout.
+
+Every device in the fleet is simulated at once with NumPy arrays.  Each device
+is assigned a site (a school sharing one uplink), a link speed drawn from its
+site type's log-normal bandwidth distribution, a channel and a rollout bucket.
+A device becomes eligible once its channel's staged-rollout percentage covers
+its bucket.  It then downloads at its first periodic, jittered check-in after
+that point.
+
+Downloads are treated as constant-rate transfers.  Summed over the fleet,
+bytes transferred by time ``t`` is piecewise linear: the slope rises by a
+device's rate when it starts and falls when it finishes.  Binning those slope
+changes with :func:`numpy.bincount` and integrating them with
+:func:`numpy.cumsum` gives exact per-bin egress in a few array passes.  The
+same is done per site to find oversubscribed school uplinks.  Downloads that
+start while their uplink is oversubscribed are slowed by the oversubscription
+factor, applied once rather than solved to a fixed point.
+
+NumPy is required by this module; it is not imported by the package itself.
+"""
+
+from __future__ import annotations
+
+import json
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Mapping, Sequence, Tuple
+
+import numpy as np
+
+from .configuration import REPO_ROOT, ComposeManifest, cached_loader
+
+HOUR = 3600.0
+DEFAULT_BIN_SECONDS = 600.0
+
+
+@dataclass(frozen=True)
+class SiteType:
+    """A class of school sites sharing one uplink per site."""
+
+    name: str
+    weight: float
+    devices_per_site: int
+    uplink_mbps: float
+    bandwidth_median_mbps: float
+    bandwidth_sigma: float
+
+
+@dataclass(frozen=True)
+class ChannelRollout:
+    """Share of the fleet on a channel and its staged-rollout schedule.
+
+    ``stages`` holds ``(cumulative_percent, hours_after_start)`` pairs.
+    """
+
+    name: str
+    fraction: float
+    start_hours: float
+    stages: Tuple[Tuple[float, float], ...]
+
+
+@dataclass(frozen=True)
+class RolloutScenario:
+    """Inputs of a rollout simulation, as declared in ``configs/rollout.yaml``."""
+
+    devices: int
+    payload_mb: float
+    checkin_interval_hours: float
+    checkin_jitter_minutes: float
+    sites: Tuple[SiteType, ...]
+    channels: Tuple[ChannelRollout, ...]
+    mirror_capacity_gbps: float | None = None
+
+    @classmethod
+    @cached_loader
+    def load(cls, path: Path = REPO_ROOT / "configs" / "rollout.yaml") -> "RolloutScenario":
+        """Load and validate a rollout scenario."""
+
+        data = json.loads(path.read_text())
+
+        sites = tuple(
+            SiteType(
+                name=site["name"],
+                weight=float(site["weight"]),
+                devices_per_site=int(site["devices_per_site"]),
+                uplink_mbps=float(site["uplink_mbps"]),
+                bandwidth_median_mbps=float(site["device_bandwidth_mbps"]["median"]),
+                bandwidth_sigma=float(site["device_bandwidth_mbps"].get("sigma", 0.0)),
+            )
+            for site in data["sites"]
+        )
+        channels = tuple(
+            ChannelRollout(
+                name=name,
+                fraction=float(channel["fraction"]),
+                start_hours=float(channel.get("start_hours", 0.0)),
+                stages=tuple((float(percent), float(hours)) for percent, hours in channel["stages"]),
+            )
+            for name, channel in data["channels"].items()
+        )
+        capacity = data.get("mirror_capacity_gbps")
+        scenario = cls(
+            devices=int(data["devices"]),
+            payload_mb=float(data["payload_mb"]),
+            checkin_interval_hours=float(data["checkin"]["interval_hours"]),
+            checkin_jitter_minutes=float(data["checkin"].get("jitter_minutes", 0.0)),
+            sites=sites,
+            channels=channels,
+            mirror_capacity_gbps=float(capacity) if capacity is not None else None,
+        )
+        scenario.validate()
+        return scenario
+
+    def validate(self, update_channels: Sequence[str] | None = None) -> None:
+        """Raise ``ValueError`` for inconsistent scenarios."""
+
+        if self.devices < 1 or self.payload_mb <= 0 or self.checkin_interval_hours <= 0:
+            raise ValueError("Rollout scenario needs devices, a payload size and a check-in interval")
+        if not self.sites or abs(sum(site.weight for site in self.sites) - 1.0) > 1e-6:
+            raise ValueError("Site weights must sum to 1")
+        if abs(sum(channel.fraction for channel in self.channels) - 1.0) > 1e-6:
+            raise ValueError("Channel fractions must sum to 1")
+        known = set(update_channels or ComposeManifest.load().update_channels)
+        for channel in self.channels:
+            if channel.name not in known:
+                raise ValueError(f"Channel {channel.name!r} is not one of the manifest update channels")
+            percents = [percent for percent, _ in channel.stages]
+            if not percents or percents != sorted(percents) or percents[-1] != 100:
+                raise ValueError(f"Channel {channel.name!r} stages must rise to 100 percent")
+
+
+@dataclass(frozen=True)
+class StageExposure:
+    """Devices already updated when a rollout stage is superseded."""
+
+    channel: str
+    percent: float
+    ends_hours: float
+    devices_updated: int
+
+
+@dataclass(frozen=True)
+class RolloutProjection:
+    """Result of :func:`simulate_rollout`."""
+
+    devices: int
+    payload_bytes: int
+    bin_seconds: float
+    egress_gbps: np.ndarray
+    completion_hours: Mapping[str, float]
+    stage_exposure: Tuple[StageExposure, ...]
+    peak_uplink_oversubscription: float
+    oversubscribed_sites: int
+    sites: int
+    mirror_capacity_gbps: float | None
+    simulation_seconds: float
+
+    @property
+    def peak_egress_gbps(self) -> float:
+        return float(self.egress_gbps.max()) if self.egress_gbps.size else 0.0
+
+    @property
+    def peak_egress_hours(self) -> float:
+        return float(np.argmax(self.egress_gbps) * self.bin_seconds / HOUR) if self.egress_gbps.size else 0.0
+
+    def to_dict(self, resolution_hours: float = 1.0) -> Dict[str, object]:
+        """JSON-serialisable summary with egress resampled to ``resolution_hours``."""
+
+        per_bucket = max(1, int(round(resolution_hours * HOUR / self.bin_seconds)))
+        padded = np.pad(self.egress_gbps, (0, -len(self.egress_gbps) % per_bucket))
+        series = padded.reshape(-1, per_bucket).mean(axis=1)
+        return {
+            "devices": self.devices,
+            "payload_bytes": self.payload_bytes,
+            "peak_egress_gbps": self.peak_egress_gbps,
+            "peak_egress_hours": self.peak_egress_hours,
+            "mirror_capacity_gbps": self.mirror_capacity_gbps,
+            "mirror_overloaded": bool(
+                self.mirror_capacity_gbps is not None and self.peak_egress_gbps > self.mirror_capacity_gbps
+            ),
+            "completion_hours": dict(self.completion_hours),
+            "stage_exposure": [
+                {
+                    "channel": stage.channel,
+                    "percent": stage.percent,
+                    "ends_hours": stage.ends_hours,
+                    "devices_updated": stage.devices_updated,
+                }
+                for stage in self.stage_exposure
+            ],
+            "peak_uplink_oversubscription": self.peak_uplink_oversubscription,
+            "oversubscribed_sites": self.oversubscribed_sites,
+            "sites": self.sites,
+            "egress_gbps_series": {
+                "resolution_hours": resolution_hours,
+                "values": np.maximum(series, 0.0).round(4).tolist(),
+            },
+            "simulation_seconds": self.simulation_seconds,
+        }
+
+
+def _transferred_per_bin(
+    starts: np.ndarray, ends: np.ndarray, rates: np.ndarray, keys_offset: np.ndarray | None, bins: int, width: float
+) -> np.ndarray:
+    """Bytes moved per bin by constant-rate transfers, exactly.
+
+    Cumulative bytes at a bin edge ``e`` are ``sum(r * (e - t))`` over the slope
+    changes ``(t, r)`` before ``e``.  That is ``e * sum(r) - sum(r * t)``, and
+    both sums are running totals of per-bin ``bincount`` results.
+    """
+
+    times = np.concatenate([starts, ends])
+    slopes = np.concatenate([rates, -rates])
+    index = np.minimum((times // width).astype(np.int64), bins - 1)
+    groups = 1
+    if keys_offset is not None:
+        groups = int(keys_offset.max()) + 1
+        index = np.concatenate([keys_offset, keys_offset]) * bins + index
+    slope = np.bincount(index, weights=slopes, minlength=groups * bins).reshape(groups, bins)
+    moment = np.bincount(index, weights=slopes * times, minlength=groups * bins).reshape(groups, bins)
+    edges = np.arange(1, bins + 1) * width
+    cumulative = edges * np.cumsum(slope, axis=1) - np.cumsum(moment, axis=1)
+    return np.diff(cumulative, axis=1, prepend=0.0)
+
+
+def simulate_rollout(
+    scenario: RolloutScenario,
+    payload_bytes: int | None = None,
+    bin_seconds: float = DEFAULT_BIN_SECONDS,
+    seed: int = 0,
+) -> Tuple[RolloutProjection, np.ndarray]:
+    """Simulate the scenario; returns the projection and per-device completion times."""
+
+    started = time.perf_counter()
+    rng = np.random.default_rng(seed)
+    devices = scenario.devices
+    payload = int(payload_bytes if payload_bytes is not None else scenario.payload_mb * 1_000_000)
+    payload_bits = payload * 8.0
+
+    counts = np.floor(np.array([site.weight for site in scenario.sites]) * devices).astype(np.int64)
+    counts[np.argmax(counts)] += devices - counts.sum()
+    site_counts = [-(-int(count) // site.devices_per_site) for count, site in zip(counts, scenario.sites)]
+    site_offsets = np.concatenate([[0], np.cumsum(site_counts)[:-1]]).astype(np.int64)
+    site_type = np.repeat(np.arange(len(scenario.sites)), counts)
+    within_type = np.arange(devices) - np.repeat(np.concatenate([[0], np.cumsum(counts)[:-1]]), counts)
+    per_site = np.array([site.devices_per_site for site in scenario.sites])
+    site_of_device = site_offsets[site_type] + within_type // per_site[site_type]
+    uplink_bps = np.repeat([site.uplink_mbps * 1e6 for site in scenario.sites], site_counts)
+
+    medians = np.log([site.bandwidth_median_mbps * 1e6 for site in scenario.sites])
+    sigmas = np.array([site.bandwidth_sigma for site in scenario.sites])
+    link_bps = np.exp(medians[site_type] + sigmas[site_type] * rng.standard_normal(devices))
+
+    channel_of_device = rng.choice(
+        len(scenario.channels), size=devices, p=[channel.fraction for channel in scenario.channels]
+    )
+    bucket = rng.random(devices) * 100.0
+    eligible = np.empty(devices)
+    for number, channel in enumerate(scenario.channels):
+        members = channel_of_device == number
+        percents = np.array([percent for percent, _ in channel.stages])
+        offsets = np.array([hours for _, hours in channel.stages])
+        stage = np.minimum(np.searchsorted(percents, bucket[members], side="right"), len(percents) - 1)
+        eligible[members] = (channel.start_hours + offsets[stage]) * HOUR
+
+    interval = scenario.checkin_interval_hours * HOUR
+    jitter = scenario.checkin_jitter_minutes * 60.0
+    phase = rng.random(devices) * interval
+    periods = np.maximum(np.ceil((eligible - phase) / interval), 0.0)
+    checkin = np.maximum(phase + periods * interval + rng.uniform(-jitter, jitter, devices), eligible)
+
+    duration = payload_bits / link_bps
+    bins = int(np.ceil((checkin + duration).max() / bin_seconds)) + 1
+    site_bytes = _transferred_per_bin(
+        checkin, checkin + duration, link_bps / 8.0, site_of_device, bins, bin_seconds
+    )
+    oversubscription = np.maximum(site_bytes * 8.0 / bin_seconds / uplink_bps[:, None], 1.0)
+
+    start_bin = np.minimum((checkin // bin_seconds).astype(np.int64), bins - 1)
+    stretch = oversubscription[site_of_device, start_bin]
+    duration = duration * stretch
+    completion = checkin + duration
+    bins = int(np.ceil(completion.max() / bin_seconds)) + 1
+    egress_bytes = _transferred_per_bin(checkin, completion, payload / duration, None, bins, bin_seconds)[0]
+
+    quantiles = np.quantile(completion, [0.5, 0.95, 0.99, 1.0]) / HOUR
+    exposure = []
+    for number, channel in enumerate(scenario.channels):
+        members = completion[channel_of_device == number]
+        for (percent, hours), following in zip(channel.stages, [*channel.stages[1:], None]):
+            if following is None:
+                continue
+            ends = channel.start_hours + following[1]
+            exposure.append(
+                StageExposure(channel.name, percent, ends, int(np.count_nonzero(members <= ends * HOUR)))
+            )
+
+    projection = RolloutProjection(
+        devices=devices,
+        payload_bytes=payload,
+        bin_seconds=bin_seconds,
+        egress_gbps=egress_bytes * 8.0 / bin_seconds / 1e9,
+        completion_hours={
+            "p50": float(quantiles[0]),
+            "p95": float(quantiles[1]),
+            "p99": float(quantiles[2]),
+            "all": float(quantiles[3]),
+        },
+        stage_exposure=tuple(exposure),
+        peak_uplink_oversubscription=float(oversubscription.max()),
+        oversubscribed_sites=int(np.count_nonzero(oversubscription.max(axis=1) > 1.0)),
+        sites=int(sum(site_counts)),
+        mirror_capacity_gbps=scenario.mirror_capacity_gbps,
+        simulation_seconds=time.perf_counter() - started,
+    )
+    return projection, completion
+
+
+__all__ = [
+    "ChannelRollout",
+    "RolloutProjection",
+    "RolloutScenario",
+    "SiteType",
+    "StageExposure",
+    "simulate_rollout",
+]
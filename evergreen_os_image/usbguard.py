@@ -0,0 +1,353 @@
+"""Compile USBGuard allowlists into indexed device-matching tables.
+
+USBGuard evaluates its rules in order and applies the target of the first rule
+that matches a device.  With allowlists of thousands of approved peripherals
+that linear scan happens on every hotplug.  :class:`UsbGuardPolicy` parses the
+rule language once and files every rule under the most selective attribute a
+matching device must have: its ``vendor:product`` id, its hash, its vendor, or
+one of its interface classes.  A lookup then only evaluates the handful of
+rules filed under the device's own keys, in original rule order, so the first
+match (and therefore the decision) is identical to sequential evaluation.
+"""
+
+from __future__ import annotations
+
+import heapq
+import re
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Mapping, Sequence, Tuple
+
+from .configuration import SecurityPolicies
+
+TARGETS = frozenset({"allow", "block", "reject"})
+OPERATORS = frozenset({"all-of", "one-of", "none-of", "equals", "equals-ordered", "match-all"})
+ATTRIBUTES = frozenset(
+    {
+        "id",
+        "hash",
+        "parent-hash",
+        "name",
+        "serial",
+        "via-port",
+        "with-interface",
+        "with-connect-type",
+        "label",
+    }
+)
+
+_TOKEN = re.compile(r'"(?:[^"\\]|\\.)*"|[{}]|[^\s{}"]+')
+
+
+@dataclass(frozen=True)
+class UsbDevice:
+    """Attributes USBGuard exposes for a connected device."""
+
+    vendor_id: str
+    product_id: str
+    name: str = ""
+    serial: str = ""
+    hash: str = ""
+    parent_hash: str = ""
+    via_port: str = ""
+    interfaces: Tuple[str, ...] = ()
+    connect_type: str = ""
+
+    def attribute(self, name: str) -> Tuple[str, ...]:
+        """Return the device's values for a rule attribute."""
+
+        if name == "id":
+            return (f"{self.vendor_id}:{self.product_id}",)
+        if name == "with-interface":
+            return self.interfaces
+        value = {
+            "hash": self.hash,
+            "parent-hash": self.parent_hash,
+            "name": self.name,
+            "serial": self.serial,
+            "via-port": self.via_port,
+            "with-connect-type": self.connect_type,
+        }.get(name, "")
+        return (value,)
+
+
+@dataclass(frozen=True)
+class AttributeCondition:
+    """A rule attribute with its set operator and values."""
+
+    name: str
+    operator: str
+    values: Tuple[str, ...]
+
+    def matches(self, device: UsbDevice) -> bool:
+        """Evaluate the condition with USBGuard's set-operator semantics."""
+
+        if self.name == "label":
+            return True
+        actual = device.attribute(self.name)
+        match = _VALUE_MATCHERS.get(self.name, str.__eq__)
+
+        def contains(values: Sequence[str], item: str) -> bool:
+            return any(match(pattern, item) for pattern in values)
+
+        if self.operator == "all-of":
+            return all(any(match(value, item) for item in actual) for value in self.values)
+        if self.operator == "one-of":
+            return any(contains(self.values, item) for item in actual)
+        if self.operator == "none-of":
+            return not any(contains(self.values, item) for item in actual)
+        if self.operator == "match-all":
+            return all(contains(self.values, item) for item in actual)
+        if self.operator == "equals-ordered":
+            return len(actual) == len(self.values) and all(
+                match(value, item) for value, item in zip(self.values, actual)
+            )
+        return (
+            len(actual) == len(self.values)
+            and all(contains(self.values, item) for item in actual)
+            and all(any(match(value, item) for item in actual) for value in self.values)
+        )
+
+
+@dataclass(frozen=True)
+class UsbGuardRule:
+    """Parsed USBGuard rule."""
+
+    target: str
+    conditions: Tuple[AttributeCondition, ...]
+    line: int = 0
+    text: str = ""
+
+    def matches(self, device: UsbDevice) -> bool:
+        """Whether every condition of the rule holds for ``device``."""
+
+        return all(condition.matches(device) for condition in self.conditions)
+
+    def condition(self, name: str) -> AttributeCondition | None:
+        return next((condition for condition in self.conditions if condition.name == name), None)
+
+    def index_key(self) -> Tuple[str, str] | None:
+        """Most selective attribute value every matching device must carry."""
+
+        device_id = self.condition("id")
+        if device_id is not None and device_id.operator in {"equals", "one-of"} and len(device_id.values) == 1:
+            vendor, _, product = device_id.values[0].partition(":")
+            if vendor != "*" and product != "*":
+                return ("id", device_id.values[0])
+        device_hash = self.condition("hash")
+        if device_hash is not None and device_hash.operator in {"equals", "one-of"} and len(device_hash.values) == 1:
+            return ("hash", device_hash.values[0])
+        if device_id is not None and device_id.operator in {"equals", "one-of"} and len(device_id.values) == 1:
+            vendor = device_id.values[0].partition(":")[0]
+            if vendor != "*":
+                return ("vendor", vendor)
+        interfaces = self.condition("with-interface")
+        if interfaces is not None and interfaces.operator in {"equals", "equals-ordered", "all-of", "one-of"}:
+            classes = {value.partition(":")[0] for value in interfaces.values}
+            if len(classes) == 1 and "*" not in classes:
+                return ("class", classes.pop())
+        return None
+
+
+def _id_matches(pattern: str, value: str) -> bool:
+    pattern_vendor, _, pattern_product = pattern.partition(":")
+    vendor, _, product = value.partition(":")
+    return pattern_vendor in {"*", vendor} and pattern_product in {"*", product}
+
+
+def _interface_matches(pattern: str, value: str) -> bool:
+    return all(expected in {"*", actual} for expected, actual in zip(pattern.split(":"), value.split(":")))
+
+
+_VALUE_MATCHERS = {"id": _id_matches, "with-interface": _interface_matches}
+
+
+def _unquote(token: str) -> str:
+    if token.startswith('"') and token.endswith('"'):
+        return bytes(token[1:-1], "utf-8").decode("unicode_escape")
+    return token
+
+
+def parse_rule(text: str, line: int = 0) -> UsbGuardRule:
+    """Parse a single line of the USBGuard rule language."""
+
+    tokens = _TOKEN.findall(text)
+    if not tokens or tokens[0] not in TARGETS:
+        raise ValueError(f"line {line}: rule must start with allow, block or reject: {text!r}")
+
+    conditions: List[AttributeCondition] = []
+    position = 1
+    if position < len(tokens) and tokens[position] not in ATTRIBUTES and ":" in tokens[position]:
+        conditions.append(AttributeCondition("id", "equals", (tokens[position],)))
+        position += 1
+
+    while position < len(tokens):
+        name = tokens[position]
+        if name not in ATTRIBUTES:
+            raise ValueError(f"line {line}: unknown attribute {name!r}")
+        position += 1
+        operator = "equals"
+        if position < len(tokens) and tokens[position] in OPERATORS:
+            operator = tokens[position]
+            position += 1
+        if position >= len(tokens):
+            raise ValueError(f"line {line}: attribute {name!r} has no value")
+        if tokens[position] == "{":
+            try:
+                end = tokens.index("}", position)
+            except ValueError as error:
+                raise ValueError(f"line {line}: unterminated value set") from error
+            values = tuple(_unquote(token) for token in tokens[position + 1 : end])
+            position = end + 1
+        else:
+            values = (_unquote(tokens[position]),)
+            position += 1
+        if any(condition.name == name for condition in conditions):
+            raise ValueError(f"line {line}: attribute {name!r} given twice")
+        conditions.append(AttributeCondition(name, operator, values))
+
+    return UsbGuardRule(target=tokens[0], conditions=tuple(conditions), line=line, text=text)
+
+
+def parse_rules(text: str) -> Tuple[UsbGuardRule, ...]:
+    """Parse a ``rules.conf`` document, skipping blank lines and comments."""
+
+    rules = []
+    for number, raw_line in enumerate(text.splitlines(), start=1):
+        line = raw_line.strip()
+        if not line or line.startswith("#"):
+            continue
+        rules.append(parse_rule(line, number))
+    return tuple(rules)
+
+
+@dataclass(frozen=True)
+class UsbGuardPolicy:
+    """USBGuard rules compiled into per-attribute lookup tables."""
+
+    rules: Tuple[UsbGuardRule, ...]
+    default_target: str
+    index: Mapping[Tuple[str, str], Tuple[int, ...]]
+    unindexed: Tuple[int, ...]
+
+    @classmethod
+    def compile(cls, rules: Sequence[UsbGuardRule], default_target: str = "block") -> "UsbGuardPolicy":
+        """Build lookup tables for ``rules``; rule order is preserved."""
+
+        if default_target not in TARGETS:
+            raise ValueError(f"Unknown USBGuard default policy: {default_target}")
+        index: Dict[Tuple[str, str], List[int]] = {}
+        unindexed: List[int] = []
+        for position, rule in enumerate(rules):
+            key = rule.index_key()
+            if key is None:
+                unindexed.append(position)
+            else:
+                index.setdefault(key, []).append(position)
+        return cls(
+            rules=tuple(rules),
+            default_target=default_target,
+            index={key: tuple(positions) for key, positions in index.items()},
+            unindexed=tuple(unindexed),
+        )
+
+    @classmethod
+    def load(cls, path: Path, policies: SecurityPolicies | None = None) -> "UsbGuardPolicy":
+        """Compile a ``rules.conf`` allowlist using the configured default policy."""
+
+        policies = policies or SecurityPolicies.load()
+        return cls.compile(parse_rules(path.read_text()), policies.usbguard_default_policy)
+
+    def _candidates(self, device: UsbDevice) -> Iterable[int]:
+        keys = [
+            ("id", f"{device.vendor_id}:{device.product_id}"),
+            ("hash", device.hash),
+            ("vendor", device.vendor_id),
+        ]
+        keys.extend(("class", interface.partition(":")[0]) for interface in set(device.interfaces))
+        buckets = [self.index[key] for key in keys if key in self.index]
+        if self.unindexed:
+            buckets.append(self.unindexed)
+        if len(buckets) == 1:
+            return buckets[0]
+        return heapq.merge(*buckets)
+
+    def matching_rule(self, device: UsbDevice) -> UsbGuardRule | None:
+        """Return the first rule, in policy order, that applies to ``device``."""
+
+        for position in self._candidates(device):
+            rule = self.rules[position]
+            if rule.matches(device):
+                return rule
+        return None
+
+    def decide(self, device: UsbDevice) -> str:
+        """Return the target (allow, block or reject) USBGuard applies."""
+
+        rule = self.matching_rule(device)
+        return rule.target if rule is not None else self.default_target
+
+    def is_allowed(self, device: UsbDevice) -> bool:
+        """Whether USBGuard would authorise ``device``."""
+
+        return self.decide(device) == "allow"
+
+    def decide_sequentially(self, device: UsbDevice) -> str:
+        """Reference implementation: evaluate every rule in order."""
+
+        for rule in self.rules:
+            if rule.matches(device):
+                return rule.target
+        return self.default_target
+
+
+@dataclass(frozen=True)
+class MatchBenchmark:
+    """Timing comparison between indexed and sequential rule evaluation."""
+
+    rules: int
+    devices: int
+    sequential_seconds: float
+    indexed_seconds: float
+
+    @property
+    def speedup(self) -> float:
+        return self.sequential_seconds / self.indexed_seconds if self.indexed_seconds else float("inf")
+
+
+def benchmark_matching(policy: UsbGuardPolicy, devices: Sequence[UsbDevice], repeat: int = 3) -> MatchBenchmark:
+    """Time both evaluation strategies over ``devices`` and check they agree."""
+
+    def best_of(decide) -> Tuple[float, List[str]]:
+        best = float("inf")
+        decisions: List[str] = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            decisions = [decide(device) for device in devices]
+            best = min(best, time.perf_counter() - started)
+        return best, decisions
+
+    sequential_seconds, expected = best_of(policy.decide_sequentially)
+    indexed_seconds, actual = best_of(policy.decide)
+    if expected != actual:
+        raise RuntimeError("Indexed USBGuard decisions diverge from sequential evaluation")
+
+    return MatchBenchmark(
+        rules=len(policy.rules),
+        devices=len(devices),
+        sequential_seconds=sequential_seconds,
+        indexed_seconds=indexed_seconds,
+    )
+
+
+__all__ = [
+    "UsbDevice",
+    "AttributeCondition",
+    "UsbGuardRule",
+    "UsbGuardPolicy",
+    "MatchBenchmark",
+    "parse_rule",
+    "parse_rules",
+    "benchmark_matching",
+]
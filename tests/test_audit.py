@@ -0,0 +1,262 @@
+import sqlite3
+import struct
+from pathlib import Path
+
+import pytest
+
+from evergreen_os_image.audit import (
+    DirectoryIndex,
+    ImageIndex,
+    Iso9660Index,
+    audit_artifact,
+    audit_index,
+)
+from evergreen_os_image.configuration import REPO_ROOT, ComposeManifest
+
+SECTOR = 2048
+
+
+def _write_rpmdb(path: Path, packages) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE Name (key TEXT, hnum INTEGER, idx INTEGER)")
+    connection.executemany("INSERT INTO Name VALUES (?, ?, 0)", [(name, hnum) for hnum, name in enumerate(packages)])
+    connection.commit()
+    connection.close()
+
+
+def _image_files(tmp_path: Path, packages) -> dict:
+    """Files of a compliant image root: path -> bytes, or ("link", target)."""
+
+    rpmdb = tmp_path / "rpmdb.sqlite"
+    _write_rpmdb(rpmdb, packages)
+    manifest = ComposeManifest.load()
+    files = {
+        "usr/lib/sysimage/rpm/rpmdb.sqlite": rpmdb.read_bytes(),
+        "etc/selinux/config": b"SELINUX=enforcing\nSELINUXTYPE=targeted\n",
+        "etc/usbguard/rules.conf": b"allow id 1d6b:0002\n",
+        "etc/usbguard/usbguard-daemon.conf": b"RuleFile=/etc/usbguard/rules.conf\nImplicitPolicyTarget=block\n",
+        "etc/systemd/system/sshd.service": ("link", "/dev/null"),
+        "usr/lib/systemd/system-preset/80-evergreen.preset": "".join(
+            f"enable {unit}\n" for unit in manifest.systemd_enable
+        ).encode(),
+    }
+    for unit in (REPO_ROOT / "configs" / "services").glob("*.service"):
+        files[f"usr/lib/systemd/system/{unit.name}"] = unit.read_bytes()
+    return files
+
+
+def _build_tree(root: Path, files: dict) -> Path:
+    for relative, contents in files.items():
+        target = root / relative
+        target.parent.mkdir(parents=True, exist_ok=True)
+        if isinstance(contents, tuple):
+            target.symlink_to(contents[1])
+        else:
+            target.write_bytes(contents)
+    return root
+
+
+def _both(value: int, fmt: str) -> bytes:
+    return struct.pack("<" + fmt, value) + struct.pack(">" + fmt, value)
+
+
+def _record(name: bytes, extent: int, size: int, directory: bool, system_use: bytes = b"") -> bytes:
+    body = (
+        b"\x00"
+        + _both(extent, "I")
+        + _both(size, "I")
+        + bytes(7)
+        + bytes([2 if directory else 0, 0, 0])
+        + _both(1, "H")
+        + bytes([len(name)])
+        + name
+        + (b"\x00" if len(name) % 2 == 0 else b"")
+        + system_use
+    )
+    padding = (len(body) + 1) % 2
+    return bytes([len(body) + 1 + padding]) + body + bytes(padding)
+
+
+def _rock_ridge(name: str, link: str | None) -> bytes:
+    encoded = name.encode()
+    entry = b"NM" + bytes([5 + len(encoded), 1, 0]) + encoded
+    if link is not None:
+        components = b""
+        for part in link.split("/"):
+            components += bytes([0x08, 0]) if part == "" else bytes([0, len(part)]) + part.encode()
+        entry += b"SL" + bytes([5 + len(components), 1, 0]) + components
+    return entry
+
+
+def _build_iso(path: Path, files: dict) -> Path:
+    """Write a minimal ISO 9660 image with Rock Ridge names and symlinks."""
+
+    tree: dict = {}
+    for relative, contents in files.items():
+        node = tree
+        *parents, leaf = relative.split("/")
+        for part in parents:
+            node = node.setdefault(part, {})
+        node[leaf] = contents
+
+    sectors: list = []
+
+    def allocate(data: bytes) -> int:
+        start = 18 + sum(-(-len(chunk) // SECTOR) or 1 for chunk in sectors)
+        sectors.append(data)
+        return start
+
+    def directory(node: dict, parent_extent: int | None) -> int:
+        index = len(sectors)
+        extent = allocate(b"")
+        records = []
+        for number, (name, value) in enumerate(sorted(node.items())):
+            short = f"F{number}".encode()
+            if isinstance(value, dict):
+                child = directory(value, extent)
+                records.append(_record(short, child, SECTOR, True, _rock_ridge(name, None)))
+            elif isinstance(value, tuple):
+                records.append(_record(short + b";1", 0, 0, False, _rock_ridge(name, value[1])))
+            else:
+                records.append(_record(short + b";1", allocate(value), len(value), False, _rock_ridge(name, None)))
+        dots = _record(b"\x00", extent, SECTOR, True) + _record(b"\x01", parent_extent or extent, SECTOR, True)
+        sectors[index] = (dots + b"".join(records)).ljust(SECTOR, b"\x00")
+        return extent
+
+    root_extent = directory(tree, None)
+    primary = bytearray(SECTOR)
+    primary[0:6] = b"\x01CD001"
+    primary[156:190] = _record(b"\x00", root_extent, SECTOR, True)
+    terminator = b"\xffCD001".ljust(SECTOR, b"\x00")
+    body = b"".join(chunk.ljust((-(-len(chunk) // SECTOR) or 1) * SECTOR, b"\x00") for chunk in sectors)
+    path.write_bytes(bytes(16 * SECTOR) + bytes(primary) + terminator + body)
+    return path
+
+
+def test_directory_index_passes_for_compliant_tree(tmp_path: Path):
+    manifest = ComposeManifest.load()
+    tree = _build_tree(tmp_path / "tree", _image_files(tmp_path, manifest.packages_install))
+
+    report = audit_artifact(tree)
+
+    assert report.kind == "tree"
+    assert report.passed, report.failures()
+
+
+def test_tree_audit_flags_unmasked_sshd_and_leftover_packages(tmp_path: Path):
+    manifest = ComposeManifest.load()
+    files = _image_files(tmp_path, (*manifest.packages_install[1:], "firefox"))
+    del files["etc/systemd/system/sshd.service"]
+    files["usr/lib/systemd/system/evergreen-device-agent.service"] = b"[Unit]\n"
+
+    report = audit_index(DirectoryIndex(_build_tree(tmp_path / "tree", files)))
+
+    failed = {finding.check: finding.details for finding in report.failures()}
+    assert set(failed) == {
+        "packages_installed",
+        "packages_removed",
+        "unit:evergreen-device-agent.service",
+        "masked:sshd.service",
+    }
+    assert failed["packages_removed"] == "Still present: firefox"
+
+
+def test_tree_audit_follows_systemd_enablement_rules(tmp_path: Path):
+    manifest = ComposeManifest.load()
+    first, second, third, *rest = manifest.systemd_enable
+    files = _image_files(tmp_path, manifest.packages_install)
+    files["usr/lib/systemd/system-preset/80-evergreen.preset"] = "".join(
+        f"enable {unit}\n" for unit in rest
+    ).encode()
+    # Vendor wants link, and a glob ahead of the catch-all disable in name order.
+    files[f"usr/lib/systemd/system/multi-user.target.wants/{first}"] = ("link", f"../{first}")
+    files["usr/lib/systemd/system-preset/50-evergreen-glob.preset"] = f"# glob\nenable {second[:3]}*\n".encode()
+    files["usr/lib/systemd/system-preset/99-default-disable.preset"] = b"disable *\n"
+    # An earlier file disabling the third unit wins over the later enable.
+    files["usr/lib/systemd/system-preset/10-site.preset"] = f"disable {third}\n".encode()
+    files["usr/lib/systemd/system-preset/90-evergreen-extra.preset"] = f"enable {third}\n".encode()
+
+    report = audit_index(DirectoryIndex(_build_tree(tmp_path / "tree", files)))
+
+    findings = {finding.check: finding for finding in report.findings}
+    assert findings[f"enabled:{first}"].passed
+    assert findings[f"enabled:{second}"].passed
+    assert "50-evergreen-glob.preset" in findings[f"enabled:{second}"].details
+    assert {finding.check for finding in report.failures()} == {f"enabled:{third}"}
+    assert "10-site.preset" in findings[f"enabled:{third}"].details
+
+    # /etc overrides the vendor preset file of the same name.
+    files["etc/systemd/system-preset/10-site.preset"] = b"# local override\n"
+    assert audit_index(DirectoryIndex(_build_tree(tmp_path / "override", files))).passed
+
+
+def test_iso_index_reads_rock_ridge_tree_through_mmap(tmp_path: Path):
+    manifest = ComposeManifest.load()
+    iso = _build_iso(tmp_path / "evergreen.iso", _image_files(tmp_path, manifest.packages_install))
+
+    with Iso9660Index(iso) as index:
+        assert "entries" not in index.__dict__
+        assert index.get("/etc/systemd/system/sshd.service").symlink == "/dev/null"
+        assert index.read_text("/etc/selinux/config").startswith("SELINUX=enforcing")
+        report = audit_index(index, kind="iso")
+
+    assert report.passed, report.failures()
+    assert audit_artifact(iso).passed
+
+
+def test_installer_iso_checks_media_files_instead_of_os_root(tmp_path: Path):
+    files = {
+        "images/install.img": b"hsqs",
+        "ks.cfg": (REPO_ROOT / "build/iso/evergreen.ks").read_bytes(),
+        "configs/defaults/evergreen-agent.yaml": (REPO_ROOT / "configs/defaults/evergreen-agent.yaml").read_bytes(),
+        "build/scripts/write_agent_config.sh": b"#!/bin/sh\n",
+    }
+
+    report = audit_artifact(_build_iso(tmp_path / "boot.iso", files))
+
+    assert report.kind == "installer-iso"
+    assert [finding.check for finding in report.failures()] == ["media:/build/scripts/write_agent_config.sh"]
+    assert not any(finding.check.startswith(("packages", "unit:", "selinux")) for finding in report.findings)
+
+
+def test_truncated_iso_is_reported_as_a_finding(tmp_path: Path):
+    manifest = ComposeManifest.load()
+    data = _build_iso(tmp_path / "evergreen.iso", _image_files(tmp_path, manifest.packages_install)).read_bytes()
+
+    for cut in (16 * SECTOR + 100, len(data) - SECTOR):
+        truncated = tmp_path / f"truncated-{cut}.iso"
+        truncated.write_bytes(data[:cut])
+
+        report = audit_artifact(truncated)
+
+        assert [finding.check for finding in report.failures()] == ["iso_structure"]
+        assert "truncated" in report.findings[0].details
+
+
+def test_image_index_requires_scan_and_read(tmp_path: Path):
+    with pytest.raises(TypeError, match="abstract"):
+        ImageIndex(tmp_path)
+
+
+def test_qcow2_header_audit(tmp_path: Path):
+    image = tmp_path / "evergreenos.qcow2"
+    header = b"QFI\xfb" + struct.pack(">IQIIQI", 3, 0, 0, 16, 20 << 30, 0) + bytes(36) + struct.pack(">Q", 1)
+    image.write_bytes(header.ljust(512, b"\x00"))
+
+    report = audit_artifact(image)
+
+    assert report.kind == "qcow2"
+    assert {finding.check for finding in report.failures()} == {"qcow2_consistency"}
+
+
+def test_placeholder_artifact_is_rejected(tmp_path: Path):
+    placeholder = tmp_path / "EvergreenOS.iso"
+    placeholder.write_text("EvergreenOS ISO placeholder\n")
+
+    report = audit_artifact(placeholder)
+
+    assert report.passed is False
+    assert report.kind == "unknown"
+    with pytest.raises(FileNotFoundError):
+        audit_artifact(tmp_path / "missing.iso")
@@ -1,15 +1,41 @@
 from __future__ import annotations
 
+import asyncio
+import gzip
+import hashlib
 import importlib
 import json
+import shutil
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
 
 import pytest
 
+from evergreen_os_image import profiles as profiles_module
+from evergreen_os_image.compliance import PRDComplianceReport
+from evergreen_os_image.enrollment import EnrollmentPayload, sign_payload
+from evergreen_os_image.prd import EvergreenOSPRD
+from evergreen_os_image.usbguard import UsbGuardPolicy, parse_rules
+
 compose_module = importlib.import_module("build.scripts.compose")
 create_iso_module = importlib.import_module("build.scripts.create_iso")
 create_qemu_module = importlib.import_module("build.scripts.create_qemu_image")
 qemu_smoke_module = importlib.import_module("build.scripts.qemu_smoke")
+enrollment_load_module = importlib.import_module("build.scripts.enrollment_load")
+compile_firewall_module = importlib.import_module("build.scripts.compile_firewall")
+usbguard_benchmark_module = importlib.import_module("build.scripts.usbguard_benchmark")
+verify_reproducible_module = importlib.import_module("build.scripts.verify_reproducible")
+publish_module = importlib.import_module("build.scripts.publish_ostree")
+ostree_history_module = importlib.import_module("build.scripts.ostree_history")
+rollback_module = importlib.import_module("build.scripts.rollback_harness")
+prefetch_module = importlib.import_module("build.scripts.prefetch_rpms")
+reproducible_module = importlib.import_module("build.scripts.reproducible")
 
 
 @pytest.fixture
@@ -63,6 +89,235 @@ def test_create_qemu_image(tmp_path: Path, ostree_dir: Path) -> None:
     assert str(ostree_dir) in contents
 
 
+def test_publish_appends_channel_history(tmp_path: Path, ostree_dir: Path) -> None:
+    repo = tmp_path / "update-repo"
+    for version in ("1.0.0", "1.1.0", "1.1.0", "1.2.0"):
+        summary = publish_module.publish(ostree_dir, repo, version, retain=2)
+
+    head = ostree_history_module.read_head(repo, "stable")
+    assert head.current.version == "1.2.0"
+    assert head.previous.version == "1.1.0"
+    assert [entry.version for entry in ostree_history_module.history(repo, "stable")] == ["1.2.0", "1.1.0"]
+    assert sorted(path.name for path in (repo / "stable" / "history").iterdir()) == [
+        "00000002.json",
+        "00000003.json",
+    ]
+    assert json.loads(summary.read_text())["channels"]["beta"]["sequence"] == 3
+
+
+def test_publish_stores_commits_and_prunes_unreferenced_versions(
+    tmp_path: Path, ostree_dir: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setenv("SOURCE_DATE_EPOCH", "1700000000")
+    (ostree_dir / "repo" / "commit").write_bytes(b"x" * 16)
+    repo = tmp_path / "update-repo"
+    for version in ("1.0.0", "1.1.0", "1.2.0"):
+        publish_module.publish(ostree_dir, repo, version, retain=2)
+
+    head = ostree_history_module.read_head(repo, "stable")
+    stored = ostree_history_module.published_commit(repo, head.current)
+    assert stored == repo / "commits" / "1.2.0"
+    assert (stored / "repo" / "commit").read_bytes() == b"x" * 16
+    assert (stored / "repo" / "commit").stat().st_mtime == 1700000000
+    assert sorted(path.name for path in (repo / "commits").iterdir()) == ["1.1.0", "1.2.0"]
+    assert (repo / "stable" / "HEAD.json").stat().st_mtime != 1700000000
+    with pytest.raises(ValueError):
+        publish_module.publish(ostree_dir, repo, "../escape")
+
+
+def test_publish_discards_record_orphaned_by_crash(tmp_path: Path, ostree_dir: Path) -> None:
+    repo = tmp_path / "update-repo"
+    publish_module.publish(ostree_dir, repo, "1.0.0")
+    # A publish that died after linking its record but before updating HEAD.json.
+    orphan = repo / "stable" / "history" / "00000002.json"
+    orphan.write_text(json.dumps({"sequence": 2, "version": "1.0.1", "timestamp": "", "source": ""}))
+    (repo / "stable" / "history" / ".00000002.json.tmp").write_text("")
+
+    publish_module.publish(ostree_dir, repo, "1.1.0")
+
+    assert [entry.version for entry in ostree_history_module.history(repo, "stable")] == ["1.1.0", "1.0.0"]
+    assert json.loads(orphan.read_text())["version"] == "1.1.0"
+    assert not list((repo / "stable").rglob(".*"))
+
+
+def test_publish_rejects_changed_content_for_a_stored_version(tmp_path: Path, ostree_dir: Path) -> None:
+    (ostree_dir / "repo" / "commit").write_bytes(b"original")
+    repo = tmp_path / "update-repo"
+    publish_module.publish(ostree_dir, repo, "1.0.0")
+    publish_module.publish(ostree_dir, repo, "1.0.0")
+
+    (ostree_dir / "repo" / "commit").write_bytes(b"rebuilt")
+    with pytest.raises(ValueError, match="1.0.0 is already published with different content"):
+        publish_module.publish(ostree_dir, repo, "1.0.0")
+    assert (repo / "commits" / "1.0.0" / "repo" / "commit").read_bytes() == b"original"
+
+
+def test_publish_prunes_records_leaked_after_head_moved(tmp_path: Path, ostree_dir: Path) -> None:
+    repo = tmp_path / "update-repo"
+    for version in ("1.0.0", "1.1.0", "1.2.0"):
+        publish_module.publish(ostree_dir, repo, version, retain=2)
+    # A publish that died after replacing HEAD.json but before pruning.
+    leaked = repo / "stable" / "history" / "00000001.json"
+    leaked.write_text(json.dumps({"sequence": 1, "version": "1.0.0", "timestamp": "", "source": ""}))
+
+    publish_module.publish(ostree_dir, repo, "1.3.0", retain=2)
+
+    assert sorted(path.name for path in (repo / "stable" / "history").iterdir()) == [
+        "00000003.json",
+        "00000004.json",
+    ]
+
+
+def test_concurrent_publishes_serialise(tmp_path: Path, ostree_dir: Path) -> None:
+    repo = tmp_path / "update-repo"
+    versions = [f"2.0.{patch}" for patch in range(16)]
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda version: publish_module.publish(ostree_dir, repo, version), versions))
+
+    entries = ostree_history_module.history(repo, "dev")
+    assert [entry.sequence for entry in entries] == list(range(16, 0, -1))
+    assert sorted(entry.version for entry in entries) == sorted(versions)
+    assert json.loads((repo / "summary.json").read_text())["version"] in versions
+    assert not [path for path in (repo / "dev").rglob(".*")]
+
+
+def test_rollback_harness_times_fallback_from_published_commits(tmp_path: Path, ostree_dir: Path) -> None:
+    (ostree_dir / "repo" / "commit").write_bytes(b"x" * 4096)
+    repo = tmp_path / "update-repo"
+    publish_module.publish(ostree_dir, repo, "1.0.0")
+    publish_module.publish(ostree_dir, repo, "1.1.0")
+    shutil.rmtree(ostree_dir)
+
+    results = rollback_module.run_rollback_test(
+        repo,
+        tmp_path / "rollback",
+        storage=rollback_module.StorageModel(sync_latency_ms=20),
+        boot_seconds=0.01,
+        boot_attempts=2,
+    )
+
+    payload = json.loads(results.read_text())
+    assert payload["status"] == "passed"
+    assert payload["simulation_passed"] is True
+    assert (payload["from_version"], payload["to_version"]) == ("1.0.0", "1.1.0")
+    assert [boot["version"] for boot in payload["boots"]] == ["1.0.0", "1.1.0", "1.1.0", "1.0.0"]
+    assert payload["booted_version"] == "1.0.0"
+    assert payload["staged_bytes"] == 4096
+    assert payload["timing"] == "modelled"
+    assert payload["modelled_phases"]["staging_seconds"] >= 0.02
+    assert payload["modelled_phases"]["reboot_seconds"] >= 2 * 0.01
+    # The in-process bootloader is not evidence of a real rollback.
+    assert payload["rollback_evidence"] == "simulated"
+    assert "update_rollback_verified" in EvergreenOSPRD.default().validate_success_metrics(payload["metrics"])
+
+
+def test_rollback_harness_verifies_observed_rpm_ostree_rollback(tmp_path: Path, ostree_dir: Path) -> None:
+    repo = tmp_path / "update-repo"
+    publish_module.publish(ostree_dir, repo, "1.0.0")
+    publish_module.publish(ostree_dir, repo, "1.1.0")
+    status = tmp_path / "rpm-ostree-status.json"
+    pending = {"deployments": [{"version": "1.1.0", "staged": True}, {"version": "1.0.0", "booted": True}]}
+    status.write_text(json.dumps(pending))
+
+    payload = json.loads(
+        rollback_module.run_rollback_test(repo, tmp_path / "pending", rpm_ostree_status=status).read_text()
+    )
+    assert payload["metrics"]["update_rollback_verified"] is False
+
+    rolled_back = {"deployments": [{"version": "1.0.0", "booted": True}, {"version": "1.1.0"}]}
+    status.write_text(json.dumps(rolled_back))
+    payload = json.loads(
+        rollback_module.run_rollback_test(repo, tmp_path / "rolled-back", rpm_ostree_status=status).read_text()
+    )
+    assert payload["rollback_evidence"] == "rpm-ostree status"
+    assert "update_rollback_verified" not in EvergreenOSPRD.default().validate_success_metrics(payload["metrics"])
+
+
+def test_rollback_harness_needs_two_published_versions(tmp_path: Path, ostree_dir: Path) -> None:
+    repo = tmp_path / "update-repo"
+    publish_module.publish(ostree_dir, repo, "1.0.0")
+
+    with pytest.raises(ValueError, match="two published versions"):
+        rollback_module.run_rollback_test(repo, tmp_path / "rollback")
+
+
+def test_compose_applies_profile(tmp_path: Path) -> None:
+    manifest = Path(__file__).resolve().parent.parent / "configs" / "manifest.yaml"
+
+    artifact = compose_module.compose(manifest, tmp_path / "ostree", profile="chromebook-lowmem")
+
+    data = json.loads(artifact.read_text())
+    assert data["profile"] == "chromebook-lowmem"
+    assert "zram-generator-defaults" in data["packages"]
+    assert "packagekit.service" in data["systemd"]["mask"]
+    assert "zswap.enabled=0" in data["default_kargs"]
+
+
+def test_compose_embeds_preseeded_enrollment(tmp_path: Path) -> None:
+    manifest = Path(__file__).resolve().parent.parent / "configs" / "manifest.yaml"
+    payload = tmp_path / "enrollment.json"
+    payload.write_text('{"backend_url": "https://enroll.district.test", "tenant": "lincoln"}')
+    key = tmp_path / "preseed.key"
+    key.write_text("district-key\n")
+
+    artifact = compose_module.compose(manifest, tmp_path / "ostree", preseed=payload, preseed_key=key)
+
+    preseed = json.loads(artifact.read_text())["preseed"]
+    assert preseed["tenant"] == "lincoln"
+    rootfs = tmp_path / "ostree" / "rootfs"
+    assert (rootfs / "usr/lib/evergreen/image-id").read_text().strip() == preseed["image_id"]
+    signed = json.loads((rootfs / "usr/share/evergreen/enrollment.json").read_text())
+    assert (signed["image_id"], signed["expires"]) == (preseed["image_id"], preseed["expires"])
+    assert 'url: "https://enroll.district.test"' in (rootfs / "etc/evergreen/agent/agent.yaml").read_text()
+    assert set(preseed["files"]) == {
+        str(path.relative_to(rootfs)) for path in rootfs.rglob("*") if path.is_file()
+    }
+
+
+def test_preseed_image_id_changes_between_builds_of_one_manifest(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    manifest = Path(__file__).resolve().parent.parent / "configs" / "manifest.yaml"
+    payload = tmp_path / "enrollment.json"
+    payload.write_text('{"backend_url": "https://enroll.district.test", "tenant": "lincoln"}')
+    key = tmp_path / "preseed.key"
+    key.write_text("district-key\n")
+
+    def image_id(build: str, **options: object) -> str:
+        artifact = compose_module.compose(manifest, tmp_path / build, preseed=payload, preseed_key=key, **options)
+        return json.loads(artifact.read_text())["preseed"]["image_id"]
+
+    monkeypatch.setenv("SOURCE_DATE_EPOCH", "1700000000")
+    first, again = image_id("first"), image_id("again")
+    monkeypatch.setenv("SOURCE_DATE_EPOCH", "1700086400")
+    rebuilt = image_id("rebuilt")
+
+    # A reproducible rebuild is the same image; a later build of the same manifest is not.
+    assert first == again
+    assert rebuilt != first
+    assert image_id("pinned", build_id="ci-4821") == "evergreenos-base-ci-4821"
+
+
+def test_enrollment_load_reports_time_saved_by_preseeding(tmp_path: Path) -> None:
+    results = enrollment_load_module.run_load_test(
+        50, 25, tmp_path, compare=True, greeter_delay=0.05, backend_workers=8
+    )
+
+    payload = json.loads(results.read_text())
+    assert payload["mode"] == "interactive"
+    assert payload["preseeded"]["mode"] == "preseeded"
+    assert payload["error_count"] == 0
+    assert payload["preseeded"]["error_count"] == 0
+    saved = payload["enrollment_time_saved_seconds"]
+    assert saved["greeter_delay_input"] == 0.05
+    assert saved["agent_config_measured"]["p50"] > 0
+    assert saved["agent_config_measured"] == {
+        key: payload["latency"]["agent_config_seconds"][key] for key in ("p50", "p95", "p99")
+    }
+    assert saved["end_to_end"]["p50"] >= 0.04
+    assert "agent_config_seconds" not in payload["preseeded"]["latency"]
+
+
 def test_qemu_smoke(tmp_path: Path) -> None:
     image = tmp_path / "evergreenos.qcow2"
     image.write_text("placeholder")
@@ -71,5 +326,473 @@ def test_qemu_smoke(tmp_path: Path) -> None:
 
     assert results.exists()
     payload = json.loads(results.read_text())
-    assert payload["status"] == "passed"
+    assert payload["status"] == "skipped"
+    assert qemu_smoke_module.main(["--image", str(image), "--enroll-url", "https://ci.test/tenant"]) == 0
     assert payload["image"] == str(image)
+
+
+def test_enrollment_load_test_checks_prd_thresholds(tmp_path: Path) -> None:
+    results = enrollment_load_module.run_load_test(200, 50, tmp_path, backend_workers=8)
+
+    payload = json.loads(results.read_text())
+    assert payload["completed"] == 200
+    assert payload["error_count"] == 0
+    assert payload["threshold_failures"] == []
+    assert payload["status"] == "passed"
+    histogram = payload["latency"]["enrollment_completion_seconds"]["histogram"]
+    assert histogram[-1] == {"le": "+Inf", "count": 200}
+
+
+def test_enrollment_backend_rejects_malformed_body_and_keeps_serving() -> None:
+    async def scenario() -> list:
+        backend = enrollment_load_module.EnrollmentBackend("lincoln", {})
+        base_url = await backend.start()
+        reader, writer = await asyncio.open_connection(*base_url.removeprefix("http://").split(":"))
+        try:
+            statuses = []
+            for body in (b"{not json", b"[]", b'{"tenant": "lincoln", "device_id": "dev-1"}'):
+                writer.write(
+                    f"POST /v1/enroll HTTP/1.1\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body
+                )
+                await writer.drain()
+                start_line, _, _ = await enrollment_load_module._read_message(reader)
+                statuses.append(int(start_line.split(" ", 2)[1]))
+            return statuses
+        finally:
+            writer.close()
+            await backend.close()
+
+    assert asyncio.run(scenario()) == [400, 400, 200]
+
+
+def test_enrollment_time_includes_waiting_for_a_slot(tmp_path: Path) -> None:
+    async def scenario() -> list:
+        key = enrollment_load_module.PRESEED_KEY
+        backend = enrollment_load_module.EnrollmentBackend("lincoln", {}, preseed_key=key)
+        base_url = await backend.start()
+        limiter = asyncio.Semaphore(1)
+        expires = datetime.now(timezone.utc) + timedelta(days=1)
+        preseed = sign_payload(
+            EnrollmentPayload(base_url, "lincoln"), key, enrollment_load_module.PRESEED_IMAGE_ID, expires
+        )
+        try:
+            async with limiter:
+                device = asyncio.ensure_future(
+                    enrollment_load_module._simulate_device("dev-1", base_url, "lincoln", 0.0, limiter, preseed)
+                )
+                await asyncio.sleep(0.2)
+            return list(await device)
+        finally:
+            await backend.close()
+
+    enroll_seconds, _, _ = asyncio.run(scenario())
+    assert enroll_seconds >= 0.2
+
+
+def test_enrollment_latency_summary_percentiles() -> None:
+    summary = enrollment_load_module.summarise_latencies([0.2, 150.0, 1.0, 200.0])
+
+    assert summary["count"] == 4
+    assert summary["p50"] == 1.0
+    assert summary["p99"] == 200.0
+    assert {"le": 120.0, "count": 2} in summary["histogram"]
+
+
+def test_compile_firewall_writes_batch_file(tmp_path: Path) -> None:
+    policies = Path(__file__).resolve().parent.parent / "configs" / "security" / "policies.yaml"
+
+    rules_path = compile_firewall_module.compile_firewall(policies, tmp_path, "iptables")
+
+    assert rules_path.name == "evergreen-firewall.rules"
+    assert rules_path.read_text().startswith("*filter")
+    assert (tmp_path / "evergreen-firewall6.rules").read_text().startswith("*filter")
+    with pytest.raises(ValueError):
+        compile_firewall_module.compile_firewall(policies, tmp_path, strict=True)
+
+
+def test_usbguard_benchmark_indexed_and_sequential_decisions_agree(tmp_path: Path) -> None:
+    text, devices = usbguard_benchmark_module.synthetic_allowlist(200)
+    policy = UsbGuardPolicy.compile(parse_rules(text), "block")
+
+    decisions = [policy.decide(device) for device in devices]
+    assert decisions == [policy.decide_sequentially(device) for device in devices]
+    assert set(decisions) == {"allow", "block"}
+
+    payload = json.loads(usbguard_benchmark_module.run_benchmark(tmp_path, rules=200, devices=100).read_text())
+    assert payload["rules"] == 202
+    assert payload["devices"] == 100
+
+
+def test_qemu_smoke_stops_waiting_when_qemu_exits(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(profiles_module, "SMOKE_RESULTS_DIR", tmp_path / "artifacts")
+    image = tmp_path / "evergreenos.qcow2"
+    image.write_text("placeholder")
+    fake_qemu = tmp_path / "qemu-system-x86_64"
+    fake_qemu.write_text(f"#!{sys.executable}\nimport sys\nprint('qemu: could not open disk image')\nsys.exit(3)\n")
+    fake_qemu.chmod(0o755)
+
+    started = time.monotonic()
+    results = qemu_smoke_module.run_smoke_test(
+        image, "https://ci.test/tenant", profile="chromebook-lowmem", qemu_binary=str(fake_qemu)
+    )
+
+    assert time.monotonic() - started < 30
+    assert results == tmp_path / "artifacts" / "chromebook-lowmem" / "smoke-results.json"
+    payload = json.loads(results.read_text())
+    assert payload["status"] == "failed"
+    assert payload["measurement"]["greeter_reached"] is False
+    assert payload["measurement"]["qemu_exit_code"] == 3
+    assert "-nographic" not in payload["qemu_command"]
+    assert payload["qemu_command"][-4:] == ["-display", "none", "-serial", "stdio"]
+
+
+def test_qemu_smoke_boots_profile_within_limits(tmp_path: Path) -> None:
+    image = tmp_path / "evergreenos.qcow2"
+    image.write_text("placeholder")
+    fake_qemu = tmp_path / "qemu-system-x86_64"
+    fake_qemu.write_text(
+        f"#!{sys.executable}\n"
+        "import sys, time\n"
+        "print('args', *sys.argv[1:], flush=True)\n"
+        "print('         Starting evergreen-enrollment-greeter.service - "
+        "Evergreen Enrollment Greeter...', flush=True)\n"
+        "time.sleep(0.5)\n"
+        "print('[  OK  ] Started evergreen-enrollment-greeter.service - Evergreen Enrollment Greeter.', flush=True)\n"
+        "time.sleep(30)\n"
+    )
+    fake_qemu.chmod(0o755)
+
+    results = qemu_smoke_module.run_smoke_test(
+        image, "https://ci.test/tenant", tmp_path / "lowmem", "chromebook-lowmem", str(fake_qemu)
+    )
+
+    payload = json.loads(results.read_text())
+    assert payload["status"] == "passed"
+    assert payload["qemu_command"][1:9] == ["-m", "2048M", "-smp", "2", "-accel", "kvm", "-cpu", "host"]
+    measurement = payload["measurement"]
+    assert measurement["greeter_reached"] is True
+    assert 0.5 <= measurement["time_to_greeter_seconds"] < payload["limits"]["max_greeter_seconds"]
+    assert measurement["qemu_peak_rss_mb"] <= payload["limits"]["max_qemu_rss_mb"]
+    assert measurement["within_memory_limit"] is True
+
+
+def test_qemu_smoke_fails_when_qemu_exceeds_memory_limit(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    image = tmp_path / "evergreenos.qcow2"
+    image.write_text("placeholder")
+    fake_qemu = tmp_path / "qemu-system-x86_64"
+    fake_qemu.write_text(
+        f"#!{sys.executable}\nimport time\nprint('Started Evergreen Enrollment Greeter.', flush=True)\ntime.sleep(30)\n"
+    )
+    fake_qemu.chmod(0o755)
+    monkeypatch.setattr(qemu_smoke_module, "_peak_rss_mb", lambda pid: 4096.0)
+
+    results = qemu_smoke_module.run_smoke_test(
+        image, "https://ci.test/tenant", tmp_path / "lowmem", "chromebook-lowmem", str(fake_qemu)
+    )
+
+    payload = json.loads(results.read_text())
+    assert payload["status"] == "failed"
+    assert payload["measurement"]["within_time_limit"] is True
+    assert payload["measurement"]["within_memory_limit"] is False
+
+
+def test_compliance_reads_smoke_results_passed_explicitly(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(profiles_module, "SMOKE_RESULTS_DIR", tmp_path / "artifacts")
+    image = tmp_path / "evergreenos.qcow2"
+    image.write_text("placeholder")
+    fake_qemu = tmp_path / "qemu-system-x86_64"
+    fake_qemu.write_text(
+        f"#!{sys.executable}\nimport time\nprint('[  OK  ] Started Evergreen Enrollment Greeter.', flush=True)\n"
+        "time.sleep(30)\n"
+    )
+    fake_qemu.chmod(0o755)
+
+    qemu_smoke_module.run_smoke_test(
+        image, "https://ci.test/tenant", profile="chromebook-lowmem", qemu_binary=str(fake_qemu)
+    )
+
+    assert PRDComplianceReport.current_state().fully_compliant is False
+    smoke = tmp_path / "artifacts" / "chromebook-lowmem" / "smoke-results.json"
+    assert PRDComplianceReport.current_state(low_memory_smoke=smoke).fully_compliant is True
+
+
+def test_source_date_epoch_makes_artifacts_identical(
+    tmp_path: Path, kickstart_file: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setenv("SOURCE_DATE_EPOCH", "1700000000")
+    first = create_iso_module.create_iso(kickstart_file, tmp_path / "first")
+    second = create_iso_module.create_iso(kickstart_file, tmp_path / "second")
+
+    assert first.read_bytes() == second.read_bytes()
+    assert "Generated: 2023-11-14T22:13:20Z" in first.read_text()
+    assert first.stat().st_mtime == 1700000000
+
+
+def test_normalize_tree_keeps_executables_executable(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("SOURCE_DATE_EPOCH", "1700000000")
+    hook = tmp_path / "repo" / "hook.sh"
+    hook.parent.mkdir()
+    hook.write_text("#!/bin/sh\n")
+    hook.chmod(0o700)
+    data = tmp_path / "repo" / "config"
+    data.write_text("x\n")
+    data.chmod(0o600)
+
+    reproducible_module.normalize_tree(tmp_path)
+
+    assert (hook.stat().st_mode & 0o777, data.stat().st_mode & 0o777) == (0o755, 0o644)
+    assert hook.parent.stat().st_mode & 0o777 == 0o755
+    assert hook.stat().st_mtime == 1700000000
+
+
+def test_verify_reproducible_reports_no_differences(tmp_path: Path, kickstart_file: Path) -> None:
+    manifest = Path(__file__).resolve().parent.parent / "configs" / "manifest.yaml"
+
+    report_path = verify_reproducible_module.verify_reproducible(
+        manifest, kickstart_file, "1.0.0", tmp_path / "report", epoch=1700000000, workdir=tmp_path
+    )
+
+    report = json.loads(report_path.read_text())
+    assert report == {"source_date_epoch": 1700000000, "reproducible": True, "differences": []}
+
+
+def test_unpinned_builds_differ(
+    tmp_path: Path, kickstart_file: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.delenv("SOURCE_DATE_EPOCH", raising=False)
+    manifest = Path(__file__).resolve().parent.parent / "configs" / "manifest.yaml"
+    for name in ("first", "second"):
+        (tmp_path / name).mkdir()
+        verify_reproducible_module.build_all(tmp_path / name, manifest, kickstart_file, "1.0.0", None)
+
+    differences = verify_reproducible_module.compare_trees(
+        tmp_path / "first" / "artifacts", tmp_path / "second" / "artifacts"
+    )
+
+    changed = {difference["path"] for difference in differences if difference["reason"] == "content differs"}
+    assert "iso/EvergreenOS.iso" in changed
+
+
+class _RangeMirror:
+    """Keep-alive HTTP mirror serving files with ``Range`` support.
+
+    ``faults`` is consumed one entry per request: an HTTP status to fail with,
+    or ``"full-range"`` to answer a range request with the whole file labelled
+    as a ``206`` from offset 0.
+    """
+
+    def __init__(self, root: Path) -> None:
+        mirror = self
+        self.requests: list[tuple[str, str | None]] = []
+        self.faults: list[int | str] = []
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self) -> None:
+                mirror.requests.append((self.path, self.headers.get("Range")))
+                fault = mirror.faults.pop(0) if mirror.faults else None
+                if isinstance(fault, int):
+                    self.send_error(fault)
+                    return
+                path = root / self.path.lstrip("/")
+                if not path.is_file():
+                    self.send_error(404)
+                    return
+                data = path.read_bytes()
+                status, start = 200, 0
+                if self.headers.get("Range"):
+                    status, start = 206, int(self.headers["Range"].split("=")[1].split("-")[0])
+                    if fault == "full-range":
+                        start = 0
+                self.send_response(status)
+                self.send_header("Content-Length", str(len(data) - start))
+                if status == 206:
+                    self.send_header("Content-Range", f"bytes {start}-{len(data) - 1}/{len(data)}")
+                self.end_headers()
+                self.wfile.write(data[start:])
+
+            def log_message(self, *args: object) -> None:
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def rpm_mirror(tmp_path: Path):
+    root = tmp_path / "mirror"
+    (root / "Packages").mkdir(parents=True)
+    (root / "repodata").mkdir()
+    curl = '<rpm:provides><rpm:entry name="libcurl.so.4()(64bit)"/></rpm:provides>'
+    packages = (
+        ("flatpak", "1.14.4", ""),
+        ("flatpak", "1.15.0", "<file>/usr/bin/flatpak</file>"),
+        ("jq", "1.7", ""),
+        ("usbguard", "1.1.2", ""),
+        ("libcurl", "8.2.1", curl),
+        ("libcurl-minimal", "8.2.1", curl),
+        (
+            "evergreen-device-agent",
+            "0.4.0",
+            '<rpm:requires><rpm:entry name="jq" flags="GE" epoch="0" ver="1.6"/>'
+            '<rpm:entry name="libcurl.so.4()(64bit)"/><rpm:entry name="/usr/bin/flatpak"/>'
+            '<rpm:entry name="/usr/share/usbguard/rules.conf"/>'
+            '<rpm:entry name="rpmlib(PayloadIsZstd)" flags="LE" epoch="0" ver="5.4.18" rel="1"/>'
+            "</rpm:requires>",
+        ),
+        ("stale-agent", "0.1.0", '<rpm:requires><rpm:entry name="jq" flags="GE" epoch="0" ver="2.0"/></rpm:requires>'),
+    )
+    entries, filelists = [], []
+    for name, version, format_xml in packages:
+        filename = f"{name}-{version}-1.fc39.x86_64.rpm"
+        data = f"{name} {version} ".encode() * 5000
+        (root / "Packages" / filename).write_bytes(data)
+        checksum = hashlib.sha256(data).hexdigest()
+        entries.append(
+            f'<package type="rpm"><name>{name}</name><arch>x86_64</arch>'
+            f'<version epoch="0" ver="{version}" rel="1.fc39"/>'
+            f'<checksum type="sha256" pkgid="YES">{checksum}</checksum>'
+            f'<size package="{len(data)}"/><location href="Packages/{filename}"/>'
+            f"<format>{format_xml}</format></package>"
+        )
+        files = "<file>/usr/share/usbguard/rules.conf</file>" if name == "usbguard" else ""
+        filelists.append(f'<package pkgid="{checksum}" name="{name}" arch="x86_64">{files}</package>')
+    primary = (
+        '<metadata xmlns="http://linux.duke.edu/metadata/common" '
+        f'xmlns:rpm="http://linux.duke.edu/metadata/rpm" packages="{len(entries)}">' + "".join(entries) + "</metadata>"
+    )
+    (root / "repodata" / "primary.xml.gz").write_bytes(gzip.compress(primary.encode()))
+    (root / "repodata" / "filelists.xml.gz").write_bytes(
+        gzip.compress(
+            f'<filelists xmlns="http://linux.duke.edu/metadata/filelists">{"".join(filelists)}</filelists>'.encode()
+        )
+    )
+    (root / "repodata" / "repomd.xml").write_text(
+        '<repomd xmlns="http://linux.duke.edu/metadata/repo">'
+        '<data type="primary"><location href="repodata/primary.xml.gz"/></data>'
+        '<data type="filelists"><location href="repodata/filelists.xml.gz"/></data></repomd>'
+    )
+    mirror = _RangeMirror(root)
+    yield root, mirror
+    mirror.close()
+
+
+def test_prefetch_resolves_newest_packages_and_reuses_cache(tmp_path: Path, rpm_mirror) -> None:
+    root, mirror = rpm_mirror
+    packages = prefetch_module.resolve_packages(["flatpak", "jq", "usbguard"], root / "repodata")
+    assert [package.nevra for package in packages][0] == "flatpak-1.15.0-1.fc39.x86_64"
+
+    cache = tmp_path / "cache"
+    first = prefetch_module.prefetch(packages, mirror.url, cache, concurrency=2)
+    second = prefetch_module.prefetch(packages, mirror.url, cache, concurrency=2)
+
+    assert (first["fetched"], first["reused"]) == (3, 0)
+    assert first["connections_opened"] <= 2
+    assert (second["fetched"], second["reused"], second["bytes_downloaded"]) == (0, 3, 0)
+    for package in packages:
+        assert prefetch_module.cache_path(cache, package).read_bytes() == (root / package.location).read_bytes()
+    assert not list((cache / "partial").glob("*.lock"))
+
+
+def test_prefetch_resolves_dependency_closure(rpm_mirror) -> None:
+    root, _ = rpm_mirror
+    packages = prefetch_module.resolve_packages(["evergreen-device-agent"], root / "repodata")
+
+    # jq by name, libcurl by its soname over libcurl-minimal, flatpak by a file
+    # in primary metadata and usbguard by a file only listed in filelists.
+    assert [package.name for package in packages] == ["evergreen-device-agent", "jq", "libcurl", "flatpak", "usbguard"]
+    assert packages[3].version == "1.15.0"
+    with pytest.raises(ValueError, match=r"stale-agent-0.1.0-1.fc39.x86_64: nothing provides jq GE 2.0"):
+        prefetch_module.resolve_packages(["stale-agent"], root / "repodata")
+
+
+def test_prefetch_resumes_partial_download_and_rejects_bad_checksum(tmp_path: Path, rpm_mirror) -> None:
+    root, mirror = rpm_mirror
+    [package] = prefetch_module.resolve_packages(["jq"], root / "repodata")
+    cache = tmp_path / "cache"
+    partial = cache / "partial" / f"{package.checksum}.rpm.part"
+    partial.parent.mkdir(parents=True)
+    partial.write_bytes((root / package.location).read_bytes()[:10000])
+
+    summary = prefetch_module.prefetch([package], mirror.url, cache)
+
+    assert summary["resumed"] == 1
+    assert summary["bytes_downloaded"] == package.size - 10000
+    assert mirror.requests[-1] == (f"/{package.location}", "bytes=10000-")
+    assert not partial.exists()
+
+    corrupt = replace(package, checksum="0" * 64)
+    with pytest.raises(ValueError, match="sha256 mismatch"):
+        prefetch_module.prefetch([corrupt], mirror.url, cache)
+    assert not prefetch_module.cache_path(cache, corrupt).exists()
+
+
+def test_compose_installs_from_verified_prefetch_cache(tmp_path: Path, rpm_mirror) -> None:
+    root, mirror = rpm_mirror
+    cache = tmp_path / "cache"
+    manifest = tmp_path / "manifest.yaml"
+    manifest.write_text(json.dumps({"ref": "a", "base_image": {}, "packages": {"install": ["evergreen-device-agent"]}}))
+    other = tmp_path / "other.yaml"
+    other.write_text(json.dumps({"ref": "b", "base_image": {}, "packages": {"install": ["libcurl-minimal"]}}))
+
+    record = prefetch_module.prefetch_manifest(manifest, root / "repodata", mirror.url, cache)
+    prefetch_module.prefetch_manifest(other, root / "repodata", mirror.url, cache)
+    artifact = compose_module.compose(manifest, tmp_path / "ostree", rpm_cache=cache)
+
+    assert record == prefetch_module.record_path(cache, hashlib.sha256(manifest.read_bytes()).hexdigest())
+    assert not [path for path in record.parent.iterdir() if path.name.startswith(".")]
+    packages = prefetch_module.resolve_packages(["evergreen-device-agent"], root / "repodata")
+    recorded = json.loads(artifact.read_text())["rpm_cache"]
+    assert recorded["cachedir"] == str(cache)
+    # Dependencies are installed from the cache too; the other manifest's record does not leak in.
+    assert recorded["rpms"] == {package.name: str(prefetch_module.cache_path(cache, package)) for package in packages}
+
+    jq = packages[1]
+    prefetch_module.cache_path(cache, jq).write_bytes(b"tampered")
+    with pytest.raises(ValueError, match="jq: cached RPM .* does not match its checksum"):
+        compose_module.compose(manifest, tmp_path / "ostree", rpm_cache=cache)
+    with pytest.raises(FileNotFoundError, match="No prefetch record"):
+        compose_module.compose(manifest, tmp_path / "ostree", rpm_cache=tmp_path / "empty")
+    data = json.loads(record.read_text())
+    data["packages"].pop("evergreen-device-agent")
+    record.write_text(json.dumps(data))
+    with pytest.raises(ValueError, match="not prefetched into .*: evergreen-device-agent"):
+        compose_module.compose(manifest, tmp_path / "ostree", rpm_cache=cache)
+
+
+def test_prefetch_retries_server_errors_within_bound(tmp_path: Path, rpm_mirror) -> None:
+    root, mirror = rpm_mirror
+    [package] = prefetch_module.resolve_packages(["jq"], root / "repodata")
+
+    mirror.faults = [503, 502]
+    summary = prefetch_module.prefetch([package], mirror.url, tmp_path / "cache", attempts=3)
+    assert summary["fetched"] == 1
+    assert len(mirror.requests) == 3
+
+    [usbguard] = prefetch_module.resolve_packages(["usbguard"], root / "repodata")
+    mirror.faults = [503, 503, 503]
+    with pytest.raises(RuntimeError, match="HTTP 503 after 3 attempts"):
+        prefetch_module.prefetch([usbguard], mirror.url, tmp_path / "cache", attempts=3)
+    assert not prefetch_module.cache_path(tmp_path / "cache", usbguard).exists()
+
+
+def test_prefetch_discards_partial_when_content_range_does_not_match(tmp_path: Path, rpm_mirror) -> None:
+    root, mirror = rpm_mirror
+    [package] = prefetch_module.resolve_packages(["jq"], root / "repodata")
+    cache = tmp_path / "cache"
+    partial = cache / "partial" / f"{package.checksum}.rpm.part"
+    partial.parent.mkdir(parents=True)
+    partial.write_bytes((root / package.location).read_bytes()[:10000])
+
+    mirror.faults = ["full-range"]
+    summary = prefetch_module.prefetch([package], mirror.url, cache)
+
+    assert [request[1] for request in mirror.requests] == ["bytes=10000-", None]
+    assert (summary["resumed"], summary["bytes_downloaded"]) == (0, package.size)
+    assert prefetch_module.cache_path(cache, package).read_bytes() == (root / package.location).read_bytes()
@@ -0,0 +1,96 @@
+import socket
+import stat
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from evergreen_os_image import cli
+from evergreen_os_image.configuration import REPO_ROOT, enable_config_cache
+
+
+def test_package_import_is_lazy():
+    code = (
+        "import sys, evergreen_os_image as e;"
+        "assert 'evergreen_os_image.compliance' not in sys.modules;"
+        "e.PRDComplianceReport;"
+        "assert 'evergreen_os_image.compliance' in sys.modules"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True, cwd=REPO_ROOT)
+
+
+def test_run_command_reports_timings_and_errors(tmp_path: Path, capsys):
+    exit_code, timings = cli.run_command(
+        "compose", ["--manifest", str(REPO_ROOT / "configs" / "manifest.yaml"), "--output", str(tmp_path)]
+    )
+
+    assert exit_code == 0
+    assert (tmp_path / "compose.json").exists()
+    assert set(timings) == {"import_ms", "command_ms"}
+
+    exit_code, _ = cli.run_command("iso", ["--kickstart", str(tmp_path / "missing.ks"), "--output", str(tmp_path)])
+    assert exit_code == 1
+    assert "Kickstart file not found" in capsys.readouterr().err
+
+
+def test_daemon_serves_commands_until_shutdown(tmp_path: Path, capsys):
+    socket_path = tmp_path / "daemon.sock"
+    server = threading.Thread(target=cli.serve, args=(socket_path,), daemon=True)
+    server.start()
+    try:
+        deadline = time.monotonic() + 10
+        while not socket_path.exists() and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        exit_code = cli.main(["--daemon", str(socket_path), "--timings", "compliance"])
+        captured = capsys.readouterr()
+        assert exit_code == 0
+        assert "missing  chromebook_support" in captured.out
+        assert "(daemon)" in captured.err
+
+        response = cli.request_daemon(socket_path, {"command": "bogus", "cwd": str(tmp_path)})
+        assert response is not None and response["exit_code"] == 2
+
+        assert stat.S_IMODE(socket_path.stat().st_mode) == 0o600
+        with pytest.raises(RuntimeError, match="already listening"):
+            cli.serve(socket_path)
+
+        for payload in ({"args": []}, {"command": "compose", "cwd": str(tmp_path / "absent")}):
+            response = cli.request_daemon(socket_path, payload)
+            assert response is not None and response["exit_code"] != 0
+            assert response["stderr"].startswith("evergreen-image: ")
+
+        assert cli.main(["--daemon", str(socket_path), "shutdown"]) == 0
+        server.join(timeout=10)
+        assert not server.is_alive()
+        assert not socket_path.exists()
+    finally:
+        enable_config_cache(False)
+
+
+def test_missing_daemon_falls_back_to_in_process(tmp_path: Path, capsys):
+    exit_code = cli.main(["--daemon", str(tmp_path / "absent.sock"), "--timings", "compliance"])
+
+    assert exit_code == 0
+    assert "(in-process)" in capsys.readouterr().err
+
+
+def test_serve_replaces_stale_socket(tmp_path: Path):
+    socket_path = tmp_path / "daemon.sock"
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(str(socket_path))
+    stale.close()
+
+    server = threading.Thread(target=cli.serve, args=(socket_path,), daemon=True)
+    server.start()
+    try:
+        deadline = time.monotonic() + 10
+        while cli.request_daemon(socket_path, {"shutdown": True}) is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        server.join(timeout=10)
+        assert not server.is_alive()
+    finally:
+        enable_config_cache(False)
@@ -1,3 +1,6 @@
+import json
+from pathlib import Path
+
 from evergreen_os_image.compliance import PRDComplianceReport
 
 
@@ -38,3 +41,30 @@ def test_implemented_requirements_list_progress():
         "security_hardening",
         "update_channels",
     }
+
+
+def test_chromebook_support_requires_measured_low_memory_boot(tmp_path: Path):
+    smoke = tmp_path / "smoke-results.json"
+    smoke.write_text(
+        json.dumps(
+            {
+                "profile": "chromebook-lowmem",
+                "status": "passed",
+                "measurement": {
+                    "accelerator": "kvm",
+                    "within_limits": True,
+                    "time_to_greeter_seconds": 41.5,
+                    "qemu_peak_rss_mb": 2210.0,
+                },
+            }
+        )
+    )
+
+    report = PRDComplianceReport.current_state(low_memory_smoke=smoke)
+
+    assert report.fully_compliant is True
+    chromebook = dict(report.requirement_map())["chromebook_support"]
+    assert "41.5s" in chromebook.details
+
+    smoke.write_text(json.dumps({"profile": "chromebook-lowmem", "measurement": {"within_limits": True}}))
+    assert PRDComplianceReport.current_state(low_memory_smoke=smoke).fully_compliant is False
@@ -1,10 +1,13 @@
+import inspect
 from pathlib import Path
 
 from evergreen_os_image.configuration import (
+    AgentDefaults,
     ComposeManifest,
     EnrollmentGreeterSource,
     FlatpakRemoteConfig,
     SecurityPolicies,
+    enable_config_cache,
 )
 
 
@@ -26,6 +29,7 @@ def test_security_policies_capture_hardening_defaults():
     assert policies.ssh_enabled is False
     assert policies.usbguard_default_policy == "block"
     assert "evergreen-device-agent" in policies.firewall_allowed_services
+    assert "evergreen-device-agent" not in policies.firewall_service_definitions
     assert policies.disk_encryption["tpm_auto_unlock"] is True
     assert policies.secure_boot_status == "planned"
 
@@ -65,3 +69,48 @@ def test_enrollment_greeter_source_points_to_external_repo():
 
     assert source.repository_url == "https://github.com/evergreen-os/enrollment-greeter"
     assert "GTK enrollment greeter" in source.description
+
+
+def test_agent_defaults_parse_backend_and_updates(tmp_path: Path):
+    defaults = AgentDefaults.load()
+
+    assert defaults.backend_url == "https://enroll.evergreen-os.dev"
+    assert defaults.tenant == "default"
+    assert defaults.update_channel == "stable"
+    assert defaults.auto_reboot is True
+
+    config_path = tmp_path / "agent.yaml"
+    config_path.write_text('backend:\n  url: "https://school.test"  # district\n  tenant: lincoln\n')
+    parsed = AgentDefaults.load(path=config_path)
+
+    assert parsed.backend_url == "https://school.test"
+    assert parsed.tenant == "lincoln"
+    assert parsed.telemetry_enabled is False
+
+
+def test_config_cache_reuses_objects_until_file_changes(tmp_path: Path):
+    source_path = tmp_path / "source.json"
+    source_path.write_text('{"repository": "https://example.test/a"}')
+
+    enable_config_cache()
+    try:
+        first = EnrollmentGreeterSource.load(path=source_path)
+        assert EnrollmentGreeterSource.load(path=source_path) is first
+
+        source_path.write_text('{"repository": "https://example.test/bb"}')
+        assert EnrollmentGreeterSource.load(path=source_path).repository_url == "https://example.test/bb"
+    finally:
+        enable_config_cache(False)
+
+    assert EnrollmentGreeterSource.load(path=source_path) is not EnrollmentGreeterSource.load(path=source_path)
+
+
+def test_cached_loader_uses_the_loader_default_path():
+    default = inspect.signature(ComposeManifest.load.__wrapped__).parameters["path"].default
+
+    enable_config_cache()
+    try:
+        assert ComposeManifest.load() is ComposeManifest.load(None)
+        assert ComposeManifest.load(default) is ComposeManifest.load()
+    finally:
+        enable_config_cache(False)
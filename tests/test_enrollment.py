@@ -0,0 +1,87 @@
+import json
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+
+from evergreen_os_image.configuration import REPO_ROOT
+from evergreen_os_image.enrollment import (
+    EnrollmentPayload,
+    preseed_files,
+    render_agent_config,
+    sign_payload,
+    verify_payload,
+)
+
+
+def test_payload_load_tolerates_missing_keys(tmp_path: Path):
+    payload_path = tmp_path / "enrollment.json"
+    payload_path.write_text('{"backend_url": "https://enroll.test"}')
+
+    payload = EnrollmentPayload.load(payload_path)
+
+    assert payload == EnrollmentPayload(backend_url="https://enroll.test", tenant="")
+    assert EnrollmentPayload.load(tmp_path / "missing.json") == EnrollmentPayload("", "")
+
+
+def test_render_agent_config_matches_shell_template():
+    rendered = render_agent_config(EnrollmentPayload("https://enroll.test", "lincoln"))
+
+    assert rendered == (
+        "apiVersion: evergreenos/v1\n"
+        "backend:\n"
+        '  url: "https://enroll.test"\n'
+        '  tenant: "lincoln"\n'
+        "updates:\n"
+        '  channel: "stable"\n'
+        "telemetry:\n"
+        "  enabled: true\n"
+    )
+
+
+BUILT = datetime(2024, 1, 1, tzinfo=timezone.utc)
+EXPIRES = BUILT + timedelta(days=90)
+
+
+def test_signed_payload_round_trips_and_rejects_tampering():
+    payload = EnrollmentPayload("https://enroll.test", "lincoln")
+    document = sign_payload(payload, b"district-key", "evergreenos-base-1234", EXPIRES)
+
+    assert verify_payload(document, b"district-key", "evergreenos-base-1234", now=BUILT) == payload
+
+    forgeries = {"tenant": "jefferson", "image_id": "evergreenos-base-5678", "expires": "2099-01-01T00:00:00Z"}
+    for field, value in forgeries.items():
+        tampered = json.loads(document)
+        tampered[field] = value
+        with pytest.raises(ValueError, match="failed verification"):
+            verify_payload(json.dumps(tampered), b"district-key", str(tampered["image_id"]), now=BUILT)
+    with pytest.raises(ValueError, match="failed verification"):
+        verify_payload(document, b"other-key", "evergreenos-base-1234", now=BUILT)
+
+
+def test_signed_payload_is_bound_to_image_and_expires():
+    document = sign_payload(EnrollmentPayload("https://enroll.test", "lincoln"), b"k", "evergreenos-base-1234", EXPIRES)
+
+    assert json.loads(document)["expires"] == "2024-03-31T00:00:00Z"
+    with pytest.raises(ValueError, match="different image"):
+        verify_payload(document, b"k", "evergreenos-chromebook-lowmem-9999", now=BUILT)
+    with pytest.raises(ValueError, match="expired at 2024-03-31T00:00:00Z"):
+        verify_payload(document, b"k", "evergreenos-base-1234", now=EXPIRES)
+    with pytest.raises(ValueError, match="timezone-aware"):
+        sign_payload(EnrollmentPayload("https://enroll.test", "lincoln"), b"k", "id", datetime(2024, 1, 1))
+
+
+def test_preseed_files_satisfy_greeter_condition():
+    files = preseed_files(EnrollmentPayload("https://enroll.test", "lincoln"), b"district-key", "image-1", EXPIRES)
+    greeter_unit = (REPO_ROOT / "configs" / "services" / "evergreen-enrollment-greeter.service").read_text()
+    condition = next(line for line in greeter_unit.splitlines() if line.startswith("ConditionPathExists="))
+    marker = condition.partition("=!")[2]
+
+    tmpfiles = files["usr/lib/tmpfiles.d/evergreen-preseed.conf"].splitlines()
+    assert f"f {marker} 0644 root root -" in tmpfiles
+    assert files["etc/evergreen/agent/agent.yaml"] == render_agent_config(
+        EnrollmentPayload("https://enroll.test", "lincoln")
+    )
+    assert files["usr/lib/evergreen/image-id"] == "image-1\n"
+    signed = files["usr/share/evergreen/enrollment.json"]
+    assert verify_payload(signed, b"district-key", "image-1", now=BUILT).tenant == "lincoln"
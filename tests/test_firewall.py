@@ -0,0 +1,86 @@
+import pytest
+
+from evergreen_os_image.configuration import SecurityPolicies
+from evergreen_os_image.firewall import FirewallRuleset, parse_iptables_rule, service_rules
+
+
+def test_parse_iptables_rule_builds_structured_model():
+    rule = parse_iptables_rule(
+        "-A INPUT -s 10.0.0.0/8 -p tcp --dport 8000:8080 -m conntrack --ctstate NEW -j ACCEPT"
+    )
+
+    assert rule.chain == "INPUT"
+    assert str(rule.source) == "10.0.0.0/8"
+    assert rule.protocol == "tcp"
+    assert rule.destination_port == (8000, 8080)
+    assert rule.states == frozenset({"NEW"})
+    assert rule.target == "ACCEPT"
+
+
+@pytest.mark.parametrize(
+    "rule",
+    [
+        "-I INPUT -j ACCEPT",
+        "-A INPUT -p tcp --dport 22",
+        "-A INPUT --dport 22 -j ACCEPT",
+        "-A INPUT ! -s 10.0.0.0/8 -j DROP",
+        "-A INPUT -m recent --set -j DROP",
+        "-A INPUT -p tcp --dport 22 -j evergreen-custom",
+        "-A INPUT -j MASQUERADE",
+    ],
+)
+def test_parse_iptables_rule_rejects_unsupported_rules(rule):
+    with pytest.raises(ValueError):
+        parse_iptables_rule(rule)
+
+
+def test_ruleset_reports_duplicate_and_shadowed_rules():
+    rules = [
+        *service_rules(["https"]),
+        parse_iptables_rule("-A INPUT -p tcp --dport 443 -j ACCEPT"),
+        parse_iptables_rule("-A INPUT -s 192.168.0.0/16 -p tcp --dport 1000:2000 -j DROP"),
+        parse_iptables_rule("-A INPUT -s 192.168.1.0/24 -p tcp --dport 1500 -j ACCEPT"),
+        parse_iptables_rule("-A INPUT -s 192.168.1.0/24 -p udp --dport 1500 -j ACCEPT"),
+    ]
+
+    ruleset = FirewallRuleset.from_rules(rules)
+
+    assert [diagnostic.kind for diagnostic in ruleset.diagnostics] == ["duplicate", "shadowed"]
+    assert "never matches" in ruleset.diagnostics[1].message
+    assert len(ruleset.rules) == 3
+
+
+def test_default_policy_compiles_to_single_batch():
+    ruleset = FirewallRuleset.compile(SecurityPolicies.load())
+
+    restore = ruleset.to_iptables_restore()
+    assert restore.startswith("*filter\n:INPUT DROP [0:0]")
+    assert restore.rstrip().endswith("COMMIT")
+    assert "-A INPUT -p udp --dport 5353 -j ACCEPT" in restore
+
+    nft = ruleset.to_nftables()
+    assert nft.startswith("table inet evergreen\nflush table inet evergreen\n")
+    assert "flush ruleset" not in nft
+    assert "udp dport 546 accept" in nft
+    assert "8443" not in nft and "8443" not in restore
+
+    # The shipped custom rule only admits established traffic, which the
+    # baseline conntrack rule already accepts.
+    assert [diagnostic.kind for diagnostic in ruleset.diagnostics] == ["shadowed"]
+
+
+def test_iptables_batches_split_rules_by_address_family():
+    ruleset = FirewallRuleset.from_rules(
+        [
+            parse_iptables_rule("-A INPUT -p tcp --dport 9000 -j LOG"),
+            parse_iptables_rule("-A INPUT -s 10.0.0.0/8 -p tcp --dport 9000 -j ACCEPT"),
+            parse_iptables_rule("-A INPUT -s fd00::/8 -p tcp --dport 9000 -j ACCEPT"),
+        ]
+    )
+
+    ipv4 = ruleset.to_iptables_restore()
+    ipv6 = ruleset.to_iptables_restore(family=6)
+    assert "-A INPUT -p tcp --dport 9000 -j LOG" in ipv4 and "-A INPUT -p tcp --dport 9000 -j LOG" in ipv6
+    assert "10.0.0.0/8" in ipv4 and "10.0.0.0/8" not in ipv6
+    assert "fd00::/8" in ipv6 and "fd00::/8" not in ipv4
+    assert "tcp dport 9000 log" in ruleset.to_nftables()
@@ -0,0 +1,112 @@
+import json
+from pathlib import Path
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from evergreen_os_image.fleet_metrics import validate_fleet_metrics
+from evergreen_os_image.prd import EvergreenOSPRD
+
+
+def _record(device_id, boot=45, rollback=True, signatures="verified"):
+    return {
+        "device_id": device_id,
+        "fresh_install_boot_seconds": boot,
+        "enrollment_completion_seconds": 90,
+        "policy_application_seconds": 240,
+        "ci_pipeline_artifacts": True,
+        "update_rollback_verified": rollback,
+        "artifact_signatures_status": signatures,
+    }
+
+
+def test_fleet_validation_matches_scalar_validation(tmp_path: Path):
+    prd = EvergreenOSPRD.default()
+    records = [_record(f"dev-{i}") for i in range(10)]
+    records[3] = _record("dev-3", boot=75)
+    records[7] = _record("dev-7", rollback=False, signatures="missing")
+    del records[8]["policy_application_seconds"]
+
+    dump = tmp_path / "telemetry.jsonl"
+    dump.write_text("\n".join(json.dumps(record) for record in records))
+
+    report = prd.validate_fleet_metrics(dump, chunk_size=3)
+
+    assert report.devices == 10
+    expected = {
+        metric
+        for record in records
+        for metric in prd.validate_success_metrics(record)
+    }
+    assert set(report.failed_metrics()) == expected
+
+    boot = report.metrics["fresh_install_boot_seconds"]
+    assert boot.failures == 1
+    assert boot.worst_offenders == (("dev-3", 75.0),)
+
+    assert report.metrics["policy_application_seconds"].failures == 1
+    assert report.metrics["update_rollback_verified"].worst_offenders == (("dev-7", False),)
+    assert report.metrics["artifact_signatures_status"].worst_offenders == (("dev-7", "missing"),)
+
+
+def test_columnar_input_reports_percentiles_and_worst_devices():
+    thresholds = {"fresh_install_boot_seconds": 60}
+    boot = np.arange(1, 1001, dtype=np.float64) / 10.0
+    columns = {
+        "device_id": [f"dev-{i}" for i in range(boot.size)],
+        "fresh_install_boot_seconds": boot,
+    }
+
+    report = validate_fleet_metrics(thresholds, columns, chunk_size=128, top_n=3)
+    summary = report.metrics["fresh_install_boot_seconds"]
+
+    assert summary.observed == 1000
+    assert summary.failures == int(np.count_nonzero(boot > 60))
+    resolution = 4.0 * 60 / 4096
+    assert summary.p50 == pytest.approx(np.percentile(boot, 50), abs=2 * resolution)
+    assert summary.p95 == pytest.approx(np.percentile(boot, 95), abs=2 * resolution)
+    assert summary.p99 == pytest.approx(np.percentile(boot, 99), abs=2 * resolution)
+    assert [device for device, _ in summary.worst_offenders] == ["dev-999", "dev-998", "dev-997"]
+
+
+def test_columnar_input_rejects_ragged_columns():
+    with pytest.raises(ValueError):
+        validate_fleet_metrics({"fresh_install_boot_seconds": 60}, {"a": [1, 2], "b": [1]})
+
+
+def test_non_finite_samples_fail_in_scalar_and_fleet_validation():
+    prd = EvergreenOSPRD.default()
+    records = [_record("dev-0"), _record("dev-1", boot=float("nan")), _record("dev-2", boot=float("-inf"))]
+
+    report = prd.validate_fleet_metrics(records)
+
+    assert [prd.validate_success_metrics(record) for record in records] == [
+        (),
+        ("fresh_install_boot_seconds",),
+        ("fresh_install_boot_seconds",),
+    ]
+    assert report.metrics["fresh_install_boot_seconds"].failures == 2
+
+
+def test_fleet_validation_rejects_non_positive_chunk_size():
+    with pytest.raises(ValueError, match="chunk_size"):
+        EvergreenOSPRD.default().validate_fleet_metrics([_record("dev-0")], chunk_size=0)
+
+
+def test_fleet_validation_rejects_top_n_below_one():
+    with pytest.raises(ValueError, match="top_n"):
+        validate_fleet_metrics({"fresh_install_boot_seconds": 60}, [_record("dev-0")], top_n=0)
+
+
+def test_numpy_integers_in_object_columns_keep_their_value():
+    prd = EvergreenOSPRD.default()
+    records = [_record("dev-0", boot=np.int64(45)), _record("dev-1", boot=np.int32(75))]
+    columns = {"fresh_install_boot_seconds": np.array([np.int64(45), np.int32(75), None], dtype=object)}
+
+    report = validate_fleet_metrics({"fresh_install_boot_seconds": 60}, columns)
+
+    assert [prd.validate_success_metrics(record) for record in records] == [(), ("fresh_install_boot_seconds",)]
+    assert prd.validate_fleet_metrics(records).metrics["fresh_install_boot_seconds"].failures == 1
+    assert report.metrics["fresh_install_boot_seconds"].failures == 2
+    assert report.metrics["fresh_install_boot_seconds"].worst_offenders[-1] == ("1", 75)
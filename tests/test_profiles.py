@@ -0,0 +1,36 @@
+import pytest
+
+from evergreen_os_image.configuration import ComposeManifest
+from evergreen_os_image.profiles import LOW_MEMORY_PROFILE, ComposeProfiles
+
+
+def test_standard_profile_leaves_manifest_unchanged():
+    manifest = ComposeManifest.load()
+    profiles = ComposeProfiles.load()
+
+    assert profiles.get("standard").apply(manifest) == manifest
+
+
+def test_low_memory_profile_derives_lighter_manifest():
+    manifest = ComposeManifest.load()
+    profile = ComposeProfiles.load().get(LOW_MEMORY_PROFILE)
+
+    derived = profile.apply(manifest)
+
+    assert derived.ref != manifest.ref
+    assert "zram-generator-defaults" in derived.packages_install
+    assert "plymouth-theme-script" not in derived.packages_install
+    assert set(manifest.packages_remove) < set(derived.packages_remove)
+    # gnome-shell and Files search depend on these.
+    assert not {"evolution-data-server", "tracker-miners"} & set(derived.packages_remove)
+    assert "packagekit.service" in derived.systemd_mask
+    assert "zswap.enabled=0" in derived.default_kargs
+    assert set(manifest.default_kargs) <= set(derived.default_kargs)
+    refs = {ref for remote in derived.flatpak_remotes for ref in remote.default_refs}
+    assert "dev.evergreen.Catalog/x86_64/stable" not in refs
+    assert profile.smoke.memory_mb <= 2048
+
+
+def test_unknown_profile_is_rejected():
+    with pytest.raises(ValueError, match="chromebook-lowmem"):
+        ComposeProfiles.load().get("tablet")
@@ -0,0 +1,87 @@
+import json
+from dataclasses import replace
+from pathlib import Path
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from build.scripts.publish_ostree import publish
+from build.scripts.simulate_rollout import RESULT_NAME, main
+from evergreen_os_image.configuration import REPO_ROOT
+from evergreen_os_image.rollout import RolloutScenario, simulate_rollout
+
+
+@pytest.fixture
+def scenario() -> RolloutScenario:
+    return replace(RolloutScenario.load(), devices=20_000)
+
+
+def test_egress_accounts_for_every_payload_byte(scenario: RolloutScenario):
+    projection, completion = simulate_rollout(scenario, payload_bytes=500_000_000)
+
+    delivered = projection.egress_gbps.sum() * projection.bin_seconds * 1e9 / 8
+    assert delivered == pytest.approx(20_000 * 500_000_000, rel=1e-9)
+    assert projection.completion_hours["all"] == pytest.approx(completion.max() / 3600)
+    assert projection.completion_hours["p50"] <= projection.completion_hours["p95"]
+
+
+def test_stage_exposure_grows_with_each_stable_stage(scenario: RolloutScenario):
+    projection, _ = simulate_rollout(scenario)
+
+    stable = [stage for stage in projection.stage_exposure if stage.channel == "stable"]
+    assert [stage.percent for stage in stable] == [1.0, 10.0, 50.0]
+    updated = [stage.devices_updated for stage in stable]
+    assert updated == sorted(updated)
+    assert updated[-1] <= 0.5 * 0.9 * 20_000 * 1.05
+
+
+def test_narrow_uplinks_slow_the_rollout(scenario: RolloutScenario):
+    narrow = replace(scenario, sites=tuple(replace(site, uplink_mbps=5.0) for site in scenario.sites))
+
+    baseline, _ = simulate_rollout(scenario)
+    constrained, _ = simulate_rollout(narrow)
+
+    assert constrained.oversubscribed_sites > baseline.oversubscribed_sites
+    assert constrained.completion_hours["p99"] > baseline.completion_hours["p99"]
+
+
+def test_million_devices_simulate_quickly():
+    projection, _ = simulate_rollout(RolloutScenario.load())
+
+    assert projection.devices == 1_000_000
+    assert projection.simulation_seconds < 10
+    assert json.dumps(projection.to_dict())
+
+
+def test_channels_must_be_manifest_update_channels(tmp_path: Path):
+    data = json.loads((Path(__file__).resolve().parent.parent / "configs" / "rollout.yaml").read_text())
+    data["channels"]["nightly"] = data["channels"].pop("dev")
+    path = tmp_path / "rollout.yaml"
+    path.write_text(json.dumps(data))
+
+    with pytest.raises(ValueError, match="nightly"):
+        RolloutScenario.load(path)
+
+
+def test_simulate_rollout_script_sizes_payload_from_published_commit(tmp_path: Path):
+    tree = tmp_path / "ostree"
+    tree.mkdir()
+    (tree / "commit").write_bytes(b"\x00" * 4096)
+    updates = tmp_path / "updates"
+    publish(tree, updates, "1.0.0")
+    (tree / "commit").write_bytes(b"\x00" * 100)
+
+    assert main(["--update-repo", str(updates), "--devices", "5000", "--output", str(tmp_path / "out")]) == 0
+    results = json.loads((tmp_path / "out" / RESULT_NAME).read_text())
+    assert results["payload_bytes"] == 4096
+    assert min(results["egress_gbps_series"]["values"]) >= 0.0
+
+
+def test_scenario_coerces_mirror_capacity_to_float(tmp_path: Path):
+    data = json.loads((REPO_ROOT / "configs" / "rollout.yaml").read_text())
+    data["mirror_capacity_gbps"] = "40"
+    path = tmp_path / "rollout.yaml"
+    path.write_text(json.dumps(data))
+
+    assert RolloutScenario.load(path).mirror_capacity_gbps == 40.0
@@ -0,0 +1,98 @@
+import random
+
+import pytest
+
+from evergreen_os_image.usbguard import (
+    UsbDevice,
+    UsbGuardPolicy,
+    benchmark_matching,
+    parse_rule,
+    parse_rules,
+)
+
+ALLOWLIST = """
+# Approved district peripherals
+allow id 046d:c52b name "Unifying Receiver" with-interface { 03:01:01 03:01:02 03:00:00 }
+allow hash "abc123"
+block id 0781:* serial "BLOCKED"
+allow id 0781:*
+reject with-interface all-of { 08:*:* 03:*:* }
+allow with-interface one-of { 03:01:01 03:01:02 }
+"""
+
+
+def test_parse_rule_reads_attributes_and_operators():
+    rule = parse_rule('allow id 1d6b:0002 serial "0000:00:14.0" with-interface one-of { 09:00:* }')
+
+    assert rule.target == "allow"
+    assert [(c.name, c.operator, c.values) for c in rule.conditions] == [
+        ("id", "equals", ("1d6b:0002",)),
+        ("serial", "equals", ("0000:00:14.0",)),
+        ("with-interface", "one-of", ("09:00:*",)),
+    ]
+    assert rule.index_key() == ("id", "1d6b:0002")
+
+    with pytest.raises(ValueError):
+        parse_rule("permit id 1d6b:0002")
+    with pytest.raises(ValueError):
+        parse_rule("allow colour blue")
+
+
+def test_compiled_policy_indexes_rules_and_keeps_first_match_order():
+    policy = UsbGuardPolicy.compile(parse_rules(ALLOWLIST), "block")
+
+    assert ("id", "046d:c52b") in policy.index
+    assert ("hash", "abc123") in policy.index
+    assert ("vendor", "0781") in policy.index
+    assert ("class", "03") in policy.index
+
+    receiver = UsbDevice("046d", "c52b", name="Unifying Receiver", interfaces=("03:01:01", "03:01:02", "03:00:00"))
+    blocked_stick = UsbDevice("0781", "5581", serial="BLOCKED", interfaces=("08:06:50",))
+    sandisk = UsbDevice("0781", "5581", serial="OK", interfaces=("08:06:50",))
+    rubber_ducky = UsbDevice("1234", "0001", interfaces=("08:06:50", "03:01:01"))
+    keyboard = UsbDevice("04d9", "1603", interfaces=("03:01:01",))
+    webcam = UsbDevice("0c45", "6366", hash="abc123", interfaces=("0e:01:00",))
+    unknown = UsbDevice("ffff", "ffff", interfaces=("ff:00:00",))
+
+    assert policy.is_allowed(receiver)
+    assert policy.decide(blocked_stick) == "block"
+    assert policy.is_allowed(sandisk)
+    assert policy.decide(rubber_ducky) == "reject"
+    assert policy.is_allowed(keyboard)
+    assert policy.is_allowed(webcam)
+    assert policy.decide(unknown) == "block"
+
+
+def test_indexed_decisions_match_sequential_evaluation():
+    generator = random.Random(7)
+    vendors = ["046d", "0781", "1234", "04d9"]
+    classes = ["03", "08", "09", "0e"]
+    lines = []
+    for index in range(200):
+        vendor = generator.choice(vendors)
+        choice = index % 4
+        if choice == 0:
+            lines.append(f"allow id {vendor}:{index:04x}")
+        elif choice == 1:
+            lines.append(f"block id {vendor}:* with-interface {generator.choice(classes)}:*:*")
+        elif choice == 2:
+            lines.append(f'allow hash "h{index % 17}"')
+        else:
+            lines.append(f"reject with-interface one-of {{ {generator.choice(classes)}:01:* }}")
+    policy = UsbGuardPolicy.compile(parse_rules("\n".join(lines)))
+
+    devices = [
+        UsbDevice(
+            generator.choice(vendors),
+            f"{generator.randrange(220):04x}",
+            hash=f"h{generator.randrange(20)}",
+            interfaces=tuple(f"{generator.choice(classes)}:{generator.choice(['00', '01'])}:00" for _ in range(2)),
+        )
+        for _ in range(300)
+    ]
+
+    result = benchmark_matching(policy, devices, repeat=1)
+
+    assert result.rules == 200
+    assert result.devices == 300
+    assert result.indexed_seconds > 0